@@ -17,6 +17,18 @@ from dotenv import load_dotenv
 import story_engine
 import diversity_tracker
 import script_parser
+import audio_utils
+import render_orchestrator
+import assembly
+import episode_audio
+import webhooks
+import provider_clients
+import provider_loop
+import rate_limiter
+import telemetry
+import tracing
+import model_router
+import batch_mode
 import script_breakdown
 
 load_dotenv()
@@ -33,9 +45,15 @@ else:
     PROJECTS_DIR = Path(__file__).parent / "projects"
     
 PROJECTS_DIR.mkdir(parents=True, exist_ok=True)
+telemetry.configure(PROJECTS_DIR)
+tracing.configure(PROJECTS_DIR)
 
 # SSE progress streams (per project)
 _progress_streams = {}
+# Parallel segment requests all update audio/manifest.json
+_audio_manifest_lock = threading.Lock()
+# Background entity extractions started at upload: project_id -> Event set when it ends
+_entity_extractions = {}
 
 
 # =============================================================================
@@ -77,6 +95,45 @@ def progress_callback_factory(project_id):
     return callback
 
 
+@app.before_request
+def _tag_telemetry():
+    """Tag provider calls made for this request (and the jobs it starts) with project + pipeline stage."""
+    endpoint = request.endpoint or ""
+    stage = endpoint[4:] if endpoint.startswith("api_") else endpoint
+    telemetry.set_context(project=(request.view_args or {}).get("project_id"), stage=stage or None)
+
+
+def _batch_requested():
+    """True when a bulk route was asked to run through the Gemini Batch API ("batch": true), else None (process default)."""
+    body = request.get_json(silent=True) or {}
+    flag = body.get("batch", request.args.get("batch"))
+    return True if str(flag).lower() in ("1", "true", "on") else None
+
+
+def _count_in_flight(wsgi_app):
+    """Track requests a worker thread is busy with, until the response body is closed.
+
+    Counted at the WSGI layer rather than in before/teardown_request so SSE
+    streams (which hold their thread for the whole job) count for as long as
+    they are open. Exported as http_requests_in_flight{kind="request"|"stream"}.
+    """
+    from werkzeug.wsgi import ClosingIterator
+
+    def counted(environ, start_response):
+        kind = "stream" if environ.get("PATH_INFO", "").endswith("/progress") else "request"
+        telemetry.gauge_add("http_requests_in_flight", 1, kind=kind)
+        done = lambda: telemetry.gauge_add("http_requests_in_flight", -1, kind=kind)
+        try:
+            return ClosingIterator(wsgi_app(environ, start_response), [done])
+        except BaseException:
+            done()
+            raise
+    return counted
+
+
+app.wsgi_app = _count_in_flight(app.wsgi_app)
+
+
 # =============================================================================
 # ROUTES — Pages
 # =============================================================================
@@ -169,10 +226,11 @@ def create_project():
         with open(project_dir / "script_raw.md", "w") as f:
             f.write(raw_content)
         
-        # Parse script
-        parsed = script_parser.parse_script(raw_content)
+        # Parse script — entity extraction runs in the background
+        parsed = script_parser.parse_script(raw_content, extract_entities=False)
         with open(project_dir / "script.json", "w") as f:
             json.dump(parsed, f, indent=2, ensure_ascii=False)
+        _start_entity_extraction(project_id, parsed)
         
         # Update metadata
         metadata["status"] = "script_uploaded"
@@ -181,7 +239,8 @@ def create_project():
             metadata["duration"] = parsed["total_duration"]
         save_project_metadata(project_id, metadata)
     
-    return jsonify({"project_id": project_id, "metadata": metadata})
+    return jsonify({"project_id": project_id, "metadata": metadata,
+                    "entities_pending": bool(script_file and script_file.filename)})
 
 
 @app.route("/api/project/<project_id>")
@@ -288,10 +347,20 @@ def api_upload_script(project_id):
     with open(project_dir / "script_raw.md", "w") as f:
         f.write(raw_content)
     
-    # Parse script
-    parsed = script_parser.parse_script(raw_content)
-    with open(project_dir / "script.json", "w") as f:
+    # Parse script — unchanged sections reuse cached entities, changed ones
+    # are extracted in the background
+    script_path = project_dir / "script.json"
+    previous = None
+    if script_path.exists():
+        try:
+            with open(script_path) as f:
+                previous = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            previous = None
+    parsed = script_parser.parse_script(raw_content, previous=previous, extract_entities=False)
+    with open(script_path, "w") as f:
         json.dump(parsed, f, indent=2, ensure_ascii=False)
+    _start_entity_extraction(project_id, parsed, previous)
     
     # Update metadata
     meta["status"] = "script_uploaded"
@@ -301,7 +370,85 @@ def api_upload_script(project_id):
         meta["duration"] = parsed["total_duration"]
     save_project_metadata(project_id, meta)
     
-    return jsonify({"status": "ok", "script": parsed})
+    return jsonify({"status": "ok", "script": parsed, "entities_pending": parsed.get("entities_pending", False)})
+
+
+def _start_entity_extraction(project_id, parsed, previous=None):
+    """
+    Run character/object extraction for changed script sections off the request thread.
+    
+    Results are written back to script.json unless a newer upload replaced it meanwhile
+    (detected by comparing section hashes).
+    """
+    if not parsed.get("entities_pending"):
+        return
+    
+    _progress_streams[project_id] = []
+    callback = progress_callback_factory(project_id)
+    section_ids = [s["hash"] for s in parsed.get("sections", [])]
+    done = _entity_extractions[project_id] = threading.Event()
+    
+    def run():
+        try:
+            script_parser.update_entities(parsed, previous, progress_callback=callback)
+            
+            script_path = get_project_dir(project_id) / "script.json"
+            with open(script_path) as f:
+                current = json.load(f)
+            if [s.get("hash") for s in current.get("sections", [])] != section_ids:
+                print(f"[Parser] Script for {project_id} changed during extraction — discarding stale entities")
+                callback("Script changed during extraction — skipped", "complete")
+                return
+            with open(script_path, "w") as f:
+                json.dump(parsed, f, indent=2, ensure_ascii=False)
+            callback("Script entities ready", "complete")
+        except Exception as e:
+            callback(f"❌ Entity extraction error: {str(e)}", "error")
+        finally:
+            done.set()
+            if _entity_extractions.get(project_id) is done:
+                del _entity_extractions[project_id]
+    
+    # New projects get their ID inside the request, after telemetry tagged it
+    with telemetry.context(project=project_id):
+        thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
+    thread.start()
+
+
+def _load_script_entities(project_id, script_path, callback):
+    """
+    script.json with characters/objects filled in, for the elements job.
+    
+    Waits for the upload's background extraction if one is still running
+    rather than starting a second one over the same sections, then extracts
+    only what is still missing (uncached sections) and saves it back.
+    """
+    running = _entity_extractions.get(project_id)
+    if running is not None and not running.is_set():
+        callback("⏳ Waiting for script character/object extraction to finish...", "info")
+        running.wait()
+    
+    with open(script_path) as f:
+        script_data = json.load(f)
+    if script_data.get("characters") and script_data.get("objects") and not script_data.get("entities_pending"):
+        return script_data
+    
+    # AUTO-REPAIR: characters/objects missing, or the extraction never finished
+    try:
+        print(f"[Elements] Auto-repairing script_data: extracting characters/objects...")
+        section_ids = [s.get("hash") for s in script_data.get("sections", [])]
+        script_parser.update_entities(script_data, progress_callback=callback)
+        
+        # Save back so this repair is permanent (unless a newer upload replaced the script)
+        with open(script_path) as f:
+            current = json.load(f)
+        if [s.get("hash") for s in current.get("sections", [])] == section_ids:
+            with open(script_path, "w") as f:
+                json.dump(script_data, f, indent=2, ensure_ascii=False)
+        print(f"[Elements] Auto-repair complete: {len(script_data['characters'])} chars, {len(script_data['objects'])} objects saved")
+    except Exception as repair_err:
+        print(f"[Elements] Auto-repair failed: {repair_err}")
+    return script_data
 
 
 @app.route("/api/project/<project_id>/element/<filename>")
@@ -325,6 +472,26 @@ def serve_audio(project_id, filename):
     return send_from_directory(audio_dir, filename)
 
 
+@app.route("/api/project/<project_id>/audio/<filename>/peaks")
+def serve_audio_peaks(project_id, filename):
+    """
+    Waveform envelope of a generated MP3 (binary .peaks file).
+    
+    12-byte header (magic "TLSP", version, reserved, pairs per second uint16,
+    pair count uint32, little-endian), then (peak, rms) uint8 pairs.
+    Computed on first request for audio generated before peaks existed.
+    """
+    mp3_path = get_project_dir(project_id) / "audio" / secure_filename(filename)
+    if not mp3_path.exists():
+        return jsonify({"error": "Audio not found"}), 404
+    info = audio_utils.ensure_peaks(str(mp3_path))
+    if not info:
+        return jsonify({"error": "Waveform unavailable (ffmpeg missing?)"}), 503
+    response = send_from_directory(mp3_path.parent, info["file"], mimetype="application/octet-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 @app.route("/api/project/<project_id>/audio_zip")
 def serve_audio_zip(project_id):
     """Download all generated audio files as a ZIP."""
@@ -335,7 +502,7 @@ def serve_audio_zip(project_id):
     if not audio_dir.exists():
         return jsonify({"error": "No audio files"}), 404
 
-    mp3_files = sorted(audio_dir.glob("*.mp3"))
+    mp3_files = sorted(f for f in audio_dir.glob("*.mp3") if f.name != episode_audio.EPISODE_TRACK_FILE)
     if not mp3_files:
         return jsonify({"error": "No audio files"}), 404
 
@@ -356,10 +523,56 @@ def serve_audio_zip(project_id):
                      download_name=f"{clean_title}_audio.zip")
 
 
+@app.route("/api/project/<project_id>/episode-audio", methods=["POST"])
+def api_build_episode_audio(project_id):
+    """Join all narration segments into one episode track with a cue sheet."""
+    meta = load_project_metadata(project_id)
+    if not meta:
+        return jsonify({"error": "Project not found"}), 404
+    
+    project_dir = get_project_dir(project_id)
+    narration_path = project_dir / "narration.json"
+    if not narration_path.exists():
+        return jsonify({"error": "Narration not found"}), 404
+    with open(narration_path) as f:
+        narration = json.load(f)
+    
+    data = request.get_json(silent=True) or {}
+    
+    _progress_streams[project_id] = []
+    callback = progress_callback_factory(project_id)
+    
+    def run():
+        try:
+            result = episode_audio.build_episode_track(
+                narration, str(project_dir / "audio"), title=meta.get("title", ""),
+                gap_seconds=data.get("gap_seconds"), gaps=data.get("gaps"),
+                force=bool(data.get("force", False)), progress_callback=callback
+            )
+            callback(f"✅ Episode track ready: {result['file']}" + (" (cached)" if result["cached"] else ""), "complete")
+        except Exception as e:
+            callback(f"❌ Episode track error: {str(e)}", "error")
+    
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
+    thread.start()
+    
+    return jsonify({"status": "building", "message": "Building episode narration track"})
+
+
+@app.route("/api/project/<project_id>/episode-audio", methods=["GET"])
+def api_episode_audio_info(project_id):
+    """Cue list and loudness of the episode track ({} if never built)."""
+    meta_path = get_project_dir(project_id) / "audio" / episode_audio.EPISODE_META_FILE
+    if not meta_path.exists():
+        return jsonify({})
+    with open(meta_path) as f:
+        return jsonify(json.load(f))
+
+
 @app.route("/api/project/<project_id>/generate_audio_segment", methods=["POST"])
 def api_generate_audio_segment(project_id):
     """Generate TTS audio for a single narration segment."""
-    from voice_engine import enhance_narration_for_tts, generate_audio_segment
+    from voice_engine import enhance_narration_cached, generate_audio_segment_cached
     
     project_dir = get_project_dir(project_id)
     data = request.json
@@ -370,6 +583,7 @@ def api_generate_audio_segment(project_id):
     model = data.get("model", "eleven_v3")
     speed = data.get("speed", 0.70)
     stability = data.get("stability", 0.5)
+    force = bool(data.get("force", False))  # skip the audio cache (new take of the same text)
     
     if not voice_id:
         return jsonify({"error": "voice_id is required"}), 400
@@ -416,52 +630,63 @@ def api_generate_audio_segment(project_id):
         elif segment_type == "close":
             tension = 40
         
-        enhanced_text = enhance_narration_for_tts(text, segment_type=segment_type, tension_level=tension)
-        
-        # Step 2: Generate audio
         audio_dir = project_dir / "audio"
         audio_dir.mkdir(exist_ok=True)
         
+        enhanced_text, _ = enhance_narration_cached(text, segment_type, tension, str(audio_dir), force=force)
+        
+        # Step 2: Generate audio (served from audio/cache/ when nothing changed)
+        
         filename = f"{segment_id}.mp3"
         output_path = audio_dir / filename
         
-        # Load previous request IDs for continuity
         manifest_path = audio_dir / "manifest.json"
-        manifest = {}
-        if manifest_path.exists():
-            with open(manifest_path) as f:
-                manifest = json.load(f)
         
         previous_ids = []
         # Find the previous segment's request IDs for continuity
         # (segments are ordered: intro, chapter_0, break_0, chapter_1, break_1, ...)
         
-        result = generate_audio_segment(
+        result = generate_audio_segment_cached(
             text=enhanced_text,
             voice_id=voice_id,
             output_path=str(output_path),
+            audio_dir=str(audio_dir),
             previous_request_ids=previous_ids if previous_ids else None,
-            speed=speed
+            speed=speed,
+            model=model,
+            stability=stability,
+            force=force
         )
         
-        # Update manifest
-        manifest[segment_id] = {
-            "filename": filename,
-            "duration_seconds": result.get("duration_seconds"),
-            "file_size": result.get("file_size"),
-            "request_id": result.get("request_id"),
-            "segment_type": segment_type,
-            "enhanced_text": enhanced_text[:500]  # Store first 500 chars for reference
-        }
-        
-        with open(manifest_path, "w") as f:
-            json.dump(manifest, f, indent=2)
+        # Update manifest — re-read under the lock, other segments may have
+        # finished while this one was synthesizing
+        with _audio_manifest_lock:
+            manifest = {}
+            if manifest_path.exists():
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+            manifest[segment_id] = {
+                "filename": filename,
+                "duration_seconds": result.get("duration_seconds"),
+                "file_size": result.get("file_size"),
+                "request_id": result.get("request_id"),
+                "silences": result.get("silences", []),
+                "peaks": result.get("peaks"),
+                "segment_type": segment_type,
+                "enhanced_text": enhanced_text[:500]  # Store first 500 chars for reference
+            }
+            
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=2)
         
         return jsonify({
             "filename": filename,
             "duration_seconds": result.get("duration_seconds"),
             "file_size": result.get("file_size"),
-            "segment_id": segment_id
+            "segment_id": segment_id,
+            "silences": result.get("silences", []),
+            "peaks": result.get("peaks"),
+            "cached": result.get("cached", False)
         })
     
     except Exception as e:
@@ -585,7 +810,7 @@ def api_generate_breakdown(project_id):
         except Exception as e:
             callback(f"❌ Breakdown failed: {str(e)}", "error")
     
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({"status": "generating", "message": "Breakdown started"})
@@ -638,7 +863,7 @@ def api_generate_story(project_id):
         except Exception as e:
             callback(f"❌ Error: {str(e)}", "error")
     
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({"status": "generating", "message": "Story generation started"})
@@ -688,7 +913,7 @@ def api_audit_knowledge(project_id):
             traceback.print_exc()
             callback(f"❌ Audit failed: {str(e)}", "error")
             
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({"status": "auditing", "message": "Knowledge audit started"})
@@ -736,7 +961,7 @@ def api_auto_research(project_id):
         except Exception as e:
             callback(f"❌ Auto-research failed: {str(e)}", "error")
             
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({"status": "researching", "message": "Auto-research started"})
@@ -765,38 +990,15 @@ def api_generate_elements(project_id):
         story = json.load(f)
     with open(narration_path) as f:
         narration = json.load(f)
-    with open(script_path) as f:
-        script_data = json.load(f)
-    
-    # AUTO-REPAIR: If script_data is missing characters/objects,
-    # re-extract them using the LLM and save back to script.json
-    if not script_data.get("characters") or not script_data.get("objects"):
-        from script_parser import _extract_entities_with_llm
-        
-        # Build full script text from sections
-        full_text = "\n\n".join(
-            s.get("clean_text", "") for s in script_data.get("sections", []) if s.get("clean_text")
-        )
-        
-        if full_text:
-            try:
-                print(f"[Elements] Auto-repairing script_data: extracting characters/objects...")
-                extracted = _extract_entities_with_llm(full_text)
-                script_data["characters"] = extracted.get("characters", [])
-                script_data["objects"] = extracted.get("objects", [])
-                
-                # Save back so this repair is permanent
-                with open(script_path, "w") as f:
-                    json.dump(script_data, f, indent=2, ensure_ascii=False)
-                print(f"[Elements] Auto-repair complete: {len(script_data['characters'])} chars, {len(script_data['objects'])} objects saved")
-            except Exception as repair_err:
-                print(f"[Elements] Auto-repair failed: {repair_err}")
     
     _progress_streams[project_id] = []
     callback = progress_callback_factory(project_id)
     
     def run():
         try:
+            # Step 0: characters/objects from the script (waits for the upload's extraction)
+            script_data = _load_script_entities(project_id, script_path, callback)
+            
             # Step 1: Analyze elements needed using the pre-extracted characters from the script
             elements_list = story_engine.analyze_elements(story, narration, script_data, callback)
             
@@ -865,7 +1067,9 @@ def api_generate_elements(project_id):
         except Exception as e:
             callback(f"❌ Error: {str(e)}", "error")
     
-    thread = threading.Thread(target=run)
+    # Jobs copy the request's context when propagated — batch mode is set before the thread exists
+    with batch_mode.enabled(_batch_requested()):
+        thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({"status": "generating", "message": "Element generation started"})
@@ -1032,8 +1236,14 @@ def api_generate_scene_prompts(project_id):
     
     def run():
         try:
+            # Exact per-phase durations from the generated MP3s (if any)
+            audio_durations = audio_utils.narration_audio_durations(narration, project_dir / "audio")
+            if audio_durations:
+                callback(f"🔊 Using exact audio durations for {len(audio_durations)} phases", "info")
+            
             scene_prompts = story_engine.generate_scene_prompts(
-                story, narration, elements, progress_callback=callback
+                story, narration, elements, audio_durations=audio_durations or None,
+                progress_callback=callback
             )
             
             # Generate Frame A images for each scene
@@ -1054,12 +1264,33 @@ def api_generate_scene_prompts(project_id):
         except Exception as e:
             callback(f"\u274c Error: {str(e)}", "error")
     
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({"status": "generating", "message": "Scene prompt generation started"})
 
 
+def _generate_scene_images(image_jobs, images_dir, img_config, total, callback, failure_level="error"):
+    """
+    Render storyboard scene images concurrently on the provider loop.
+
+    image_jobs: (scene, scene_num, prompt, ref_path) tuples. Each scene dict gets
+    scene_image set to its filename, or None if its image failed.
+    """
+    async def render(scene, scene_num, img_prompt, ref_path):
+        img_filename = f"scene_{scene_num:02d}.png"
+        try:
+            callback(f"  🖼️ Scene {scene_num}/{total}: generating image{'  (with ref)' if ref_path else ''}...", "info")
+            await story_engine.generate_image_async(img_prompt, str(images_dir / img_filename), ref_image_path=ref_path, config=img_config)
+            scene["scene_image"] = img_filename
+            callback(f"  ✅ Scene {scene_num}: image saved", "info")
+        except Exception as img_err:
+            callback(f"  ⚠️ Scene {scene_num}: image failed — {str(img_err)[:100]}", failure_level)
+            scene["scene_image"] = None
+
+    provider_loop.run_all((render(*job) for job in image_jobs), return_exceptions=False)
+
+
 # =============================================================================
 # ROUTES — Chapter Production Pipeline (NEW)
 # =============================================================================
@@ -1151,8 +1382,7 @@ USER INSTRUCTION: {instruction}
 
 Apply the user's instruction to modify this scene. Return ONLY the updated JSON object with the same structure (scene_number, type, duration, visual_description, camera, narration, elements, etc.). Keep fields the user didn't mention. Return valid JSON only, no markdown."""
 
-            client = story_engine.init_client()
-            response = client.models.generate_content(
+            response = provider_clients.gemini_generate(
                 model="gemini-2.5-flash",
                 contents=[edit_prompt]
             )
@@ -1230,7 +1460,7 @@ Apply the user's instruction to modify this scene. Return ONLY the updated JSON
         except Exception as e:
             callback(f"❌ Edit failed: {str(e)[:200]}", "error")
 
-    threading.Thread(target=edit_worker, daemon=True).start()
+    threading.Thread(target=telemetry.propagate(tracing.job(edit_worker)), daemon=True).start()
     return jsonify({"status": "editing", "message": f"Editing scene {scene_index + 1}..."})
 
 
@@ -1352,7 +1582,7 @@ CAMERA: [camera angle and movement, e.g. "plano medio, ligero push-in, a la altu
         except Exception as e:
             callback(f"❌ Update failed: {str(e)[:200]}", "error")
 
-    threading.Thread(target=update_worker, daemon=True).start()
+    threading.Thread(target=telemetry.propagate(tracing.job(update_worker)), daemon=True).start()
     return jsonify({"status": "updating", "message": f"Updating scene {scene_index + 1}..."})
 
 
@@ -1519,7 +1749,9 @@ IMPORTANT: Use @Image, @Image1, @Image2 etc. in the PROMPT text to reference whi
 ===END==="""
 
             try:
-                gen_result = story_engine.generate_text(batch_prompt, max_tokens=30000)
+                with tracing.span("write_prompts", scenes=len(scenes), prompt_chars=len(batch_prompt)) as sp:
+                    gen_result = story_engine.generate_text(batch_prompt, max_tokens=30000)
+                    sp.set(response_chars=len(gen_result or ""))
                 callback("✅ Prompts generated by AI", "info")
             except Exception as gen_err:
                 callback(f"❌ AI generation failed: {str(gen_err)[:150]}", "error")
@@ -1624,6 +1856,7 @@ IMPORTANT: Use @Image, @Image1, @Image2 etc. in the PROMPT text to reference whi
             img_config = {"image_generation": {"aspect_ratio": "16:9"}}
 
             generated_locations = {}  # location_id -> filename
+            pending_locations = {}    # location_id -> (scene_num, prompt, [loc dicts waiting on it])
 
             for scene_num, prompt_data in sorted(prompts_by_scene.items()):
                 for loc in prompt_data.get("locations", []):
@@ -1635,6 +1868,10 @@ IMPORTANT: Use @Image, @Image1, @Image2 etc. in the PROMPT text to reference whi
                         loc["image"] = generated_locations[loc_id]
                         callback(f"♻️ Scene {scene_num}: reusing location '{loc_id}'", "info")
                         continue
+                    if loc_id in pending_locations:
+                        pending_locations[loc_id][2].append(loc)
+                        callback(f"♻️ Scene {scene_num}: reusing location '{loc_id}'", "info")
+                        continue
 
                     loc_filename = f"loc_{loc_id}.png"
                     loc_path = images_dir / loc_filename
@@ -1651,15 +1888,26 @@ IMPORTANT: Use @Image, @Image1, @Image2 etc. in the PROMPT text to reference whi
                         loc_prompt_text = f"Empty environment, {loc_id.replace('_', ' ')}, no people, cinematic lighting"
 
                     img_prompt = f"Real photography, Canon EOS R5. Setting: {story_context_loc}. {loc_prompt_text} NO people in frame. 16:9 landscape format. Photorealistic, NOT CGI."
+                    pending_locations[loc_id] = (scene_num, img_prompt, [loc])
 
-                    callback(f"🖼️ Scene {scene_num}: generating location '{loc_id}'...", "info")
-                    try:
-                        story_engine.generate_image(img_prompt, str(loc_path), config=img_config)
-                        generated_locations[loc_id] = loc_filename
+            # Every new location renders at once on the provider loop
+            async def render_location(loc_id, scene_num, img_prompt, waiting):
+                loc_filename = f"loc_{loc_id}.png"
+                callback(f"🖼️ Scene {scene_num}: generating location '{loc_id}'...", "info")
+                try:
+                    with tracing.span("location_image", scene_num=scene_num, location_id=loc_id):
+                        await story_engine.generate_image_async(img_prompt, str(images_dir / loc_filename), config=img_config)
+                    generated_locations[loc_id] = loc_filename
+                    for loc in waiting:
                         loc["image"] = loc_filename
-                        callback(f"✅ Location '{loc_id}' generated", "info")
-                    except Exception as img_err:
-                        callback(f"⚠️ Location image failed for '{loc_id}': {str(img_err)[:80]}", "info")
+                    callback(f"✅ Location '{loc_id}' generated", "info")
+                except Exception as img_err:
+                    callback(f"⚠️ Location image failed for '{loc_id}': {str(img_err)[:80]}", "info")
+
+            provider_loop.run_all(
+                (render_location(loc_id, *pending) for loc_id, pending in pending_locations.items()),
+                return_exceptions=False,
+            )
 
             # Save prompts into storyboard.json scenes
             for scene in scenes:
@@ -1676,7 +1924,9 @@ IMPORTANT: Use @Image, @Image1, @Image2 etc. in the PROMPT text to reference whi
         except Exception as e:
             callback(f"❌ Prompt generation failed: {str(e)[:200]}", "error")
 
-    threading.Thread(target=prompts_worker, daemon=True).start()
+    with batch_mode.enabled(_batch_requested()):
+        worker = telemetry.propagate(tracing.job(prompts_worker))
+    threading.Thread(target=worker, daemon=True).start()
     return jsonify({"status": "generating", "message": f"Generating prompts for {block_folder}..."})
 
 
@@ -2001,9 +2251,25 @@ CAMERA: [camera angle and movement, e.g. "plano medio, ligero push-in, a la altu
         except Exception as e:
             callback(f"❌ Insert failed: {str(e)[:200]}", "error")
 
-    threading.Thread(target=insert_worker, daemon=True).start()
+    threading.Thread(target=telemetry.propagate(tracing.job(insert_worker)), daemon=True).start()
     return jsonify({"status": "inserting", "message": f"Inserting scene at position {insert_index + 1}..."})
 
+# The intro prompt asks for 10-14 scenes
+MIN_INTRO_SCENES = 10
+
+
+def _intro_storyboard_check(storyboard):
+    """model_router check: a list of at least MIN_INTRO_SCENES scenes, each with a visual description."""
+    if not isinstance(storyboard, list):
+        return False, f"response is {type(storyboard).__name__}, expected a list"
+    if len(storyboard) < MIN_INTRO_SCENES:
+        return False, f"{len(storyboard)} scenes (need {MIN_INTRO_SCENES}+)"
+    missing = [i + 1 for i, scene in enumerate(storyboard) if not isinstance(scene, dict) or not scene.get("visual_description")]
+    if missing:
+        return False, f"scene(s) {missing} missing visual_description"
+    return True, "complete"
+
+
 @app.route("/api/project/<project_id>/analyze-intro", methods=["POST"])
 def api_analyze_intro(project_id):
     """Generate intro storyboard scenes via Gemini."""
@@ -2159,11 +2425,11 @@ Return ONLY the JSON array. No other text."""
 
             callback("📡 Calling Gemini for intro analysis...", "info")
 
-            storyboard = story_engine.generate_json(
-                prompt, 
-                temperature=0.3, 
-                max_tokens=8000, 
-                model="gemini-2.5-flash"
+            # Flash first; Pro only if the storyboard comes back short or incomplete
+            storyboard = model_router.route(
+                "intro_storyboard",
+                lambda model: story_engine.generate_json(prompt, temperature=0.3, max_tokens=8000, model=model),
+                _intro_storyboard_check,
             )
 
             callback(f"✅ Generated {len(storyboard)} intro scenes", "info")
@@ -2185,10 +2451,9 @@ Return ONLY the JSON array. No other text."""
             show_settings = json.loads((Path("config/show_settings.json")).read_text())
             presenter_img = Path("config/presenter") / show_settings.get("presenter", {}).get("turnaround_image", "")
             
+            image_jobs = []
             for i, scene in enumerate(storyboard):
                 scene_num = scene.get("scene_number", i + 1)
-                img_filename = f"scene_{scene_num:02d}.png"
-                img_path = images_dir / img_filename
 
                 vis_desc = scene.get("visual_description", "")
                 scene_type = scene.get("type", "bridge")
@@ -2214,17 +2479,9 @@ Return ONLY the JSON array. No other text."""
                             ref_path = str(elem_path)
                             break
                 
-                try:
-                    callback(f"  🖼️ Scene {scene_num}/{len(storyboard)}: generating image{'  (with ref)' if ref_path else ''}...", "info")
-                    if ref_path:
-                        story_engine.generate_image_with_ref(img_prompt, str(img_path), ref_path, config=img_config)
-                    else:
-                        story_engine.generate_image(img_prompt, str(img_path), config=img_config)
-                    scene["scene_image"] = img_filename
-                    callback(f"  ✅ Scene {scene_num}: image saved", "info")
-                except Exception as img_err:
-                    callback(f"  ⚠️ Scene {scene_num}: image failed — {str(img_err)[:100]}", "error")
-                    scene["scene_image"] = None
+                image_jobs.append((scene, scene_num, img_prompt, ref_path))
+
+            _generate_scene_images(image_jobs, images_dir, img_config, len(storyboard), callback)
 
             # Save with image references
             result = {
@@ -2243,7 +2500,7 @@ Return ONLY the JSON array. No other text."""
         except Exception as e:
             callback(f"❌ Intro analysis failed: {str(e)}", "error")
 
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
 
     return jsonify({"status": "analyzing", "block_type": "intro"})
@@ -2289,7 +2546,7 @@ def api_analyze_break(project_id):
         # breaks based on original un-flattened chapters. This causes the frontend to request
         # breaks that don't exist in the JSON.
         # Fallback: Generate a generic but unique break on the fly for this index.
-        from story_engine import init_client, GEMINI_MODEL_FLASH
+        from story_engine import GEMINI_MODEL_FLASH
         
         char_name = story.get("character", {}).get("name", "He")
         
@@ -2322,8 +2579,7 @@ RULES:
 Return ONLY the raw spoken text. No formatting, no JSON, no quotes."""
 
         try:
-            client = init_client()
-            response = client.models.generate_content(
+            response = provider_clients.gemini_generate(
                 model=GEMINI_MODEL_FLASH,
                 contents=[fallback_prompt]
             )
@@ -2456,10 +2712,9 @@ Return ONLY the JSON array. No other text."""
             show_settings = json.loads((Path("config/show_settings.json")).read_text())
             presenter_img = Path("config/presenter") / show_settings.get("presenter", {}).get("turnaround_image", "")
             
+            image_jobs = []
             for i, scene in enumerate(storyboard):
                 scene_num = scene.get("scene_number", i + 1)
-                img_filename = f"scene_{scene_num:02d}.png"
-                img_path = images_dir / img_filename
                 vis_desc = scene.get("visual_description", "")
                 scene_type = scene.get("type", "bridge")
                 
@@ -2481,17 +2736,9 @@ Return ONLY the JSON array. No other text."""
                             ref_path = str(elem_path)
                             break
                 
-                try:
-                    callback(f"  🖼️ Scene {scene_num}/{len(storyboard)}: generating image{'  (with ref)' if ref_path else ''}...", "info")
-                    if ref_path:
-                        story_engine.generate_image_with_ref(img_prompt, str(img_path), ref_path, config=img_config)
-                    else:
-                        story_engine.generate_image(img_prompt, str(img_path), config=img_config)
-                    scene["scene_image"] = img_filename
-                    callback(f"  ✅ Scene {scene_num}: image saved", "info")
-                except Exception as img_err:
-                    callback(f"  ⚠️ Scene {scene_num}: image failed — {str(img_err)[:100]}", "error")
-                    scene["scene_image"] = None
+                image_jobs.append((scene, scene_num, img_prompt, ref_path))
+
+            _generate_scene_images(image_jobs, images_dir, img_config, len(storyboard), callback)
 
             result = {
                 "storyboard": storyboard,
@@ -2509,7 +2756,7 @@ Return ONLY the JSON array. No other text."""
         except Exception as e:
             callback(f"❌ Break analysis failed: {str(e)}", "error")
 
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
 
     return jsonify({"status": "analyzing", "block_type": "break"})
@@ -2658,10 +2905,9 @@ Return ONLY the JSON array. No other text."""
             show_settings = json.loads((Path("config/show_settings.json")).read_text())
             presenter_img = Path("config/presenter") / show_settings.get("presenter", {}).get("turnaround_image", "")
             
+            image_jobs = []
             for i, scene in enumerate(storyboard):
                 scene_num = scene.get("scene_number", i + 1)
-                img_filename = f"scene_{scene_num:02d}.png"
-                img_path = images_dir / img_filename
                 vis_desc = scene.get("visual_description", "")
                 scene_type = scene.get("type", "bridge")
                 
@@ -2683,17 +2929,9 @@ Return ONLY the JSON array. No other text."""
                             ref_path = str(elem_path)
                             break
                 
-                try:
-                    callback(f"  🖼️ Scene {scene_num}/{len(storyboard)}: generating image{'  (with ref)' if ref_path else ''}...", "info")
-                    if ref_path:
-                        story_engine.generate_image_with_ref(img_prompt, str(img_path), ref_path, config=img_config)
-                    else:
-                        story_engine.generate_image(img_prompt, str(img_path), config=img_config)
-                    scene["scene_image"] = img_filename
-                    callback(f"  ✅ Scene {scene_num}: image saved", "info")
-                except Exception as img_err:
-                    callback(f"  ⚠️ Scene {scene_num}: image failed — {str(img_err)[:100]}", "error")
-                    scene["scene_image"] = None
+                image_jobs.append((scene, scene_num, img_prompt, ref_path))
+
+            _generate_scene_images(image_jobs, images_dir, img_config, len(storyboard), callback)
 
             result = {
                 "storyboard": storyboard,
@@ -2711,7 +2949,7 @@ Return ONLY the JSON array. No other text."""
         except Exception as e:
             callback(f"❌ Close analysis failed: {str(e)}", "error")
 
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
 
     return jsonify({"status": "analyzing", "block_type": "close"})
@@ -2839,10 +3077,9 @@ def api_analyze_chapter(project_id):
             # Build character reference map
             elements_dir = project_dir / "elements"
 
+            image_jobs = []
             for i, scene in enumerate(storyboard):
                 scene_num = scene.get("scene_number", i + 1)
-                img_filename = f"scene_{scene_num:02d}.png"
-                img_path = images_dir / img_filename
 
                 vis_desc = scene.get("visual_description", scene.get("action", ""))
                 if not vis_desc:
@@ -2884,32 +3121,10 @@ def api_analyze_chapter(project_id):
                         ref_path = str(elem_path)
                         break
 
-                max_retries = 3
-                for attempt in range(max_retries + 1):
-                    try:
-                        if attempt == 0:
-                            callback(f"  🖼️ Scene {scene_num}/{len(storyboard)}: generating image{'  (with ref)' if ref_path else ''}...", "info")
-                        else:
-                            callback(f"  🔄 Scene {scene_num}: retry {attempt}/{max_retries}...", "info")
-                        if ref_path:
-                            story_engine.generate_image_with_ref(img_prompt, str(img_path), ref_path, config=img_config)
-                        else:
-                            story_engine.generate_image(img_prompt, str(img_path), config=img_config)
-                        scene["scene_image"] = img_filename
-                        callback(f"  ✅ Scene {scene_num}: image saved", "info")
-                        break
-                    except Exception as img_err:
-                        err_str = str(img_err)
-                        if "429" in err_str or "RESOURCE_EXHAUSTED" in err_str:
-                            if attempt < max_retries:
-                                wait = 30 * (attempt + 1)
-                                callback(f"  ⏳ Scene {scene_num}: rate limited, waiting {wait}s...", "info")
-                                import time as _time
-                                _time.sleep(wait)
-                                continue
-                        callback(f"  ⚠️ Scene {scene_num}: image failed — {err_str[:100]}", "info")
-                        scene["scene_image"] = None
-                        break
+                image_jobs.append((scene, scene_num, img_prompt, ref_path))
+
+            # 429s and transient errors are retried by the image model's rate limiter
+            _generate_scene_images(image_jobs, images_dir, img_config, len(storyboard), callback, failure_level="info")
 
             # Save final result
             generated_count = sum(1 for s in storyboard if s.get("scene_image"))
@@ -2924,7 +3139,7 @@ def api_analyze_chapter(project_id):
         except Exception as e:
             callback(f"❌ Cinematic analysis failed: {str(e)}", "error")
     
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({
@@ -3083,7 +3298,8 @@ def api_generate_chapter_production(project_id):
         except Exception as e:
             callback(f"\u274c Production failed: {str(e)}", "error")
     
-    thread = threading.Thread(target=run)
+    with batch_mode.enabled(_batch_requested()):
+        thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({
@@ -3100,6 +3316,159 @@ def serve_location(project_id, filename):
     return send_from_directory(project_dir / "locations", filename)
 
 
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: provider call latency histograms, retries, tokens, estimated cost."""
+    return Response(telemetry.prometheus_text(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/telemetry")
+def api_telemetry():
+    """Rolling p50/p95 latency per provider + pipeline function, current rate limits, HTTP requests in flight and model escalation rates."""
+    return jsonify({**telemetry.rolling_summary(), "rate_limits": rate_limiter.snapshot(),
+                    "gauges": telemetry.gauges(), "model_router": model_router.stats(),
+                    "threads": threading.active_count()})
+
+
+@app.route("/api/project/<project_id>/costs")
+def api_project_costs(project_id):
+    """Estimated provider spend of a project, by stage, function and provider."""
+    if not load_project_metadata(project_id):
+        return jsonify({"error": "Project not found"}), 404
+    return jsonify(telemetry.project_costs(get_project_dir(project_id)))
+
+
+@app.route("/api/project/<project_id>/jobs")
+def api_project_jobs(project_id):
+    """Background jobs with a stored trace, newest first (duration, spans, provider time)."""
+    if not load_project_metadata(project_id):
+        return jsonify({"error": "Project not found"}), 404
+    return jsonify({"jobs": tracing.list_jobs(project_id)})
+
+
+@app.route("/api/project/<project_id>/jobs/<job_id>/trace")
+def api_job_trace(project_id, job_id):
+    """Chrome trace-event JSON of one job ("latest" for the newest) — open in chrome://tracing or Perfetto."""
+    path = tracing.trace_path(project_id, job_id)
+    if path is None:
+        return jsonify({"error": "Trace not found"}), 404
+    return send_file(str(path), mimetype="application/json",
+                     as_attachment=request.args.get("download") == "1", download_name=path.name)
+
+
+@app.route("/api/fal/webhook", methods=["POST"])
+def api_fal_webhook():
+    """Receive fal.ai completion callbacks and hand them to whoever waits on the request ID."""
+    body = request.get_data()
+    if not webhooks.verify_request(request.headers, body):
+        return jsonify({"error": "Invalid signature"}), 401
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError:
+        return jsonify({"error": "Invalid JSON"}), 400
+    request_id = webhooks.deliver(payload)
+    if not request_id:
+        return jsonify({"error": "Missing request_id"}), 400
+    return jsonify({"status": "ok", "request_id": request_id})
+
+
+@app.route("/api/project/<project_id>/render/<block_folder>", methods=["POST"])
+def api_render_block(project_id, block_folder):
+    """Render every clip of a production block with Kling (fal.ai), resuming a previous run."""
+    meta = load_project_metadata(project_id)
+    if not meta:
+        return jsonify({"error": "Project not found"}), 404
+    
+    block_dir = get_project_dir(project_id) / "production" / secure_filename(block_folder)
+    if not (block_dir / "storyboard.json").exists():
+        return jsonify({"error": f"{block_folder} storyboard not generated yet"}), 404
+    
+    data = request.get_json(silent=True) or {}
+    scene_numbers = data.get("scene_numbers")
+    max_concurrent = data.get("max_concurrent")
+    force = bool(data.get("force", False))
+    
+    _progress_streams[project_id] = []
+    callback = progress_callback_factory(project_id)
+    
+    def run():
+        try:
+            result = render_orchestrator.render_block(
+                block_dir, scene_numbers=scene_numbers, max_concurrent=max_concurrent,
+                force=force, progress_callback=callback
+            )
+            failed = result["counts"].get(render_orchestrator.FAILED, 0)
+            callback(f"✅ {block_folder} render complete" + (f" ({failed} failed)" if failed else ""), "complete")
+        except Exception as e:
+            callback(f"❌ Render error: {str(e)}", "error")
+    
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
+    thread.start()
+    
+    return jsonify({"status": "rendering", "message": f"Rendering {block_folder} clips"})
+
+
+@app.route("/api/project/<project_id>/render/<block_folder>", methods=["GET"])
+def api_render_state(project_id, block_folder):
+    """Per-clip render state for a production block."""
+    block_dir = get_project_dir(project_id) / "production" / secure_filename(block_folder)
+    return jsonify(render_orchestrator.load_render_state(block_dir))
+
+
+@app.route("/api/project/<project_id>/clip/<block_folder>/<filename>")
+def serve_clip(project_id, block_folder, filename):
+    """Serve a rendered video clip."""
+    clips_dir = get_project_dir(project_id) / "production" / secure_filename(block_folder) / "clips"
+    return send_from_directory(clips_dir, filename)
+
+
+@app.route("/api/project/<project_id>/rough-cut/<block_folder>", methods=["POST"])
+def api_assemble_rough_cut(project_id, block_folder):
+    """Concatenate a block's rendered clips over its narration (cached while inputs are unchanged)."""
+    meta = load_project_metadata(project_id)
+    if not meta:
+        return jsonify({"error": "Project not found"}), 404
+    
+    project_dir = get_project_dir(project_id)
+    block_folder = secure_filename(block_folder)
+    if not (project_dir / "production" / block_folder / "storyboard.json").exists():
+        return jsonify({"error": f"{block_folder} storyboard not generated yet"}), 404
+    
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get("force", False))
+    
+    _progress_streams[project_id] = []
+    callback = progress_callback_factory(project_id)
+    
+    def run():
+        try:
+            result = assembly.assemble_block(project_dir, block_folder, force=force, progress_callback=callback)
+            callback(f"✅ {block_folder} rough cut ready" + (" (cached)" if result["cached"] else ""), "complete")
+        except Exception as e:
+            callback(f"❌ Assembly error: {str(e)}", "error")
+    
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
+    thread.start()
+    
+    return jsonify({"status": "assembling", "message": f"Assembling {block_folder} rough cut"})
+
+
+@app.route("/api/project/<project_id>/rough-cut/<block_folder>", methods=["GET"])
+def api_rough_cut_info(project_id, block_folder):
+    """rough_cut.json for a production block ({} if never assembled)."""
+    block_dir = get_project_dir(project_id) / "production" / secure_filename(block_folder)
+    return jsonify(assembly.load_rough_cut(block_dir))
+
+
+@app.route("/api/project/<project_id>/rough-cut/<block_folder>/video")
+def serve_rough_cut(project_id, block_folder):
+    """Serve a block's assembled rough cut."""
+    block_dir = get_project_dir(project_id) / "production" / secure_filename(block_folder)
+    if not (block_dir / assembly.ROUGH_CUT_FILE).exists():
+        return jsonify({"error": "Rough cut not assembled yet"}), 404
+    return send_from_directory(block_dir, assembly.ROUGH_CUT_FILE)
+
+
 @app.route("/api/project/<project_id>/production/<int:chapter_index>/<filename>")
 def serve_production_file(project_id, chapter_index, filename):
     """Serve a production package file (prompts.json, storyboard.json, etc.)."""
@@ -3147,7 +3516,7 @@ def api_generate_narration(project_id):
         except Exception as e:
             callback(f"❌ Error: {str(e)}", "error")
     
-    thread = threading.Thread(target=run)
+    thread = threading.Thread(target=telemetry.propagate(tracing.job(run)))
     thread.start()
     
     return jsonify({"status": "generating", "message": "Narration generation started"})
@@ -0,0 +1,349 @@
+"""
+The Last Shelter — Rough-Cut Assembly
+
+Turns a production block's rendered clips and its narration into one
+reviewable MP4 with the local ffmpeg binary:
+
+1. Clips are concatenated in storyboard order (production/<block>/clips/scene_XX.mp4)
+2. The block's narration (audio/<segment>.mp3) is laid under them, with the
+   Kling clip sound kept as a quiet bed
+3. When every clip has the same codec/size/frame rate (the normal Kling case)
+   the video is stream-copied, so a chapter assembles in seconds; otherwise
+   it is conformed to the first clip in a single encode pass
+
+The result is cached: production/<block>/rough_cut.json records a key over
+the inputs, and an unchanged block returns the existing rough_cut.mp4.
+
+Layout:
+    production/<block>/
+    ├── clips/scene_XX.mp4
+    ├── rough_cut.mp4
+    └── rough_cut.json
+
+Requires ffmpeg + ffprobe on PATH (or FFMPEG_BIN / FFPROBE_BIN).
+"""
+import os
+import json
+import time
+import hashlib
+import subprocess
+from pathlib import Path
+
+import episode_audio
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+
+ROUGH_CUT_FILE = "rough_cut.mp4"
+ROUGH_CUT_META = "rough_cut.json"
+
+# Kling clip sound (SFX/ambience) level under the narration
+CLIP_AUDIO_VOLUME = 0.35
+
+# Only used when the clips can't be stream-copied
+ENCODE_VIDEO_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-pix_fmt", "yuv420p"]
+ENCODE_AUDIO_ARGS = ["-c:a", "aac", "-b:a", "192k"]
+ENCODE_SAMPLE_RATE = 48000
+
+# Bump to invalidate every cached rough cut (e.g. after changing the mix)
+ASSEMBLY_VERSION = 1
+
+
+class AssemblyError(Exception):
+    """ffmpeg missing, failed, or nothing to assemble."""
+
+
+# =============================================================================
+# FFMPEG HELPERS
+# =============================================================================
+
+def _run(args):
+    try:
+        result = subprocess.run(args, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise AssemblyError(f"'{args[0]}' not found — install ffmpeg or set FFMPEG_BIN / FFPROBE_BIN")
+    if result.returncode != 0:
+        raise AssemblyError(f"{Path(args[0]).name} failed: {result.stderr.strip()[-500:]}")
+    return result.stdout
+
+
+def probe(path):
+    """
+    Stream layout of a media file.
+
+    Returns:
+        dict with 'video' and 'audio' (first stream of each, or None) and 'duration'
+    """
+    output = _run([
+        FFPROBE_BIN, "-v", "error",
+        "-show_entries",
+        "stream=codec_type,codec_name,profile,width,height,pix_fmt,r_frame_rate,sample_rate,channels"
+        ":format=duration",
+        "-of", "json", str(path),
+    ])
+    data = json.loads(output or "{}")
+    info = {"video": None, "audio": None, "duration": float((data.get("format") or {}).get("duration") or 0)}
+    for stream in data.get("streams", []):
+        kind = stream.get("codec_type")
+        if kind in ("video", "audio") and info[kind] is None:
+            info[kind] = stream
+    return info
+
+
+def _copy_signature(info):
+    """Everything that has to match for the concat demuxer to stream-copy."""
+    video = info["video"] or {}
+    audio = info["audio"]
+    return (
+        tuple(video.get(k) for k in ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate")),
+        tuple(audio.get(k) for k in ("codec_name", "sample_rate", "channels")) if audio else None,
+    )
+
+
+# =============================================================================
+# INPUTS
+# =============================================================================
+
+def block_narration_path(project_dir, block_folder):
+    """
+    Narration MP3 for a production block, or None.
+
+    Resolved through episode_audio so the Voice tab (chapter_0.mp3) and
+    generate_all_audio (phase_1.mp3, break_1.mp3) namings both work. Intro
+    and close are spoken on camera in their Kling clips, so they get no
+    separate narration.
+    """
+    if block_folder in ("intro", "close"):
+        return None
+    narration_path = Path(project_dir) / "narration.json"
+    if not narration_path.exists():
+        return None
+    with open(narration_path) as f:
+        narration = json.load(f)
+    path = episode_audio.segment_audio_path(narration, str(Path(project_dir) / "audio"), block_folder)
+    return Path(path) if path else None
+
+
+def block_clips(block_dir):
+    """
+    Rendered clips of a block in storyboard order.
+
+    Returns:
+        (list of clip paths, list of scene numbers without a clip yet)
+    """
+    block_dir = Path(block_dir)
+    with open(block_dir / "storyboard.json") as f:
+        storyboard = json.load(f)
+    if isinstance(storyboard, dict):   # chapter packages save a bare list
+        storyboard = storyboard.get("storyboard") or storyboard.get("scenes") or []
+
+    clips, missing = [], []
+    for index, scene in enumerate(storyboard):
+        # Same numbering as render_orchestrator.plan_block (chapter rows carry scene_num)
+        number = int(scene.get("scene_number") or scene.get("scene_num") or index + 1)
+        path = block_dir / "clips" / f"scene_{number:02d}.mp4"
+        if path.exists() and path.stat().st_size > 0:
+            clips.append(path)
+        else:
+            missing.append(number)
+    return clips, missing
+
+
+def _cache_key(clips, narration):
+    """Fingerprint of the inputs (name, size, mtime) — cheap enough to check on every request."""
+    digest = hashlib.sha256(f"v{ASSEMBLY_VERSION}|{CLIP_AUDIO_VOLUME}".encode("utf-8"))
+    for path in list(clips) + ([narration] if narration else []):
+        stat = os.stat(path)
+        digest.update(f"|{Path(path).name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_rough_cut(block_dir):
+    """rough_cut.json of a block, or {} if it was never assembled."""
+    path = Path(block_dir) / ROUGH_CUT_META
+    if not path.exists():
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+# =============================================================================
+# ASSEMBLY
+# =============================================================================
+
+def _audio_plan(clip_audio, narration_index, narration):
+    """
+    ffmpeg audio args: narration over a quiet clip bed, narration alone, or clip sound alone.
+
+    Args:
+        clip_audio: Clip sound as a stream spec ('0:a:0'), a filter label ('[acat]'), or None
+        narration_index: ffmpeg input index of the narration
+
+    Returns:
+        (filter_complex parts, output args, mixed?)
+    """
+    if narration and clip_audio:
+        bed = clip_audio if clip_audio.startswith("[") else f"[{clip_audio}]"
+        graph = [
+            f"{bed}volume={CLIP_AUDIO_VOLUME}[bed]",
+            f"[bed][{narration_index}:a:0]amix=inputs=2:duration=longest:normalize=0[aout]",
+        ]
+        return graph, ["-map", "[aout]"] + ENCODE_AUDIO_ARGS, True
+    if narration:
+        return [], ["-map", f"{narration_index}:a:0", "-c:a", "copy"], False
+    if clip_audio and clip_audio.startswith("["):
+        return [], ["-map", clip_audio] + ENCODE_AUDIO_ARGS, False
+    if clip_audio:
+        return [], ["-map", clip_audio, "-c:a", "copy"], False
+    return [], [], False
+
+
+def _concat_copy_command(list_path, clips_have_audio, narration, output):
+    args = [FFMPEG_BIN, "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", str(list_path)]
+    if narration:
+        args += ["-i", str(narration)]
+    graph, audio_args, mixed = _audio_plan("0:a:0" if clips_have_audio else None, 1, narration)
+    if graph:
+        args += ["-filter_complex", ";".join(graph)]
+    args += ["-map", "0:v:0", "-c:v", "copy"] + audio_args
+    return args + ["-movflags", "+faststart", str(output)], mixed
+
+
+def _concat_encode_command(clips, infos, clips_have_audio, narration, output):
+    """Conform every clip to the first one's size and frame rate, then concat — one encode pass."""
+    reference = infos[0]["video"]
+    width, height = reference["width"], reference["height"]
+    fps = reference.get("r_frame_rate") or "24/1"
+
+    args = [FFMPEG_BIN, "-y", "-hide_banner", "-loglevel", "error"]
+    for clip in clips:
+        args += ["-i", str(clip)]
+    if narration:
+        args += ["-i", str(narration)]
+
+    graph, concat_inputs = [], ""
+    for i in range(len(clips)):
+        graph.append(
+            f"[{i}:v:0]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p[v{i}]"
+        )
+        concat_inputs += f"[v{i}]"
+        if clips_have_audio:
+            graph.append(f"[{i}:a:0]aformat=sample_rates={ENCODE_SAMPLE_RATE}:channel_layouts=stereo[a{i}]")
+            concat_inputs += f"[a{i}]"
+    graph.append(f"{concat_inputs}concat=n={len(clips)}:v=1:a={int(clips_have_audio)}"
+                 + ("[vout][acat]" if clips_have_audio else "[vout]"))
+
+    audio_graph, audio_args, mixed = _audio_plan("[acat]" if clips_have_audio else None, len(clips), narration)
+    graph += audio_graph
+
+    args += ["-filter_complex", ";".join(graph), "-map", "[vout]"] + ENCODE_VIDEO_ARGS + audio_args
+    return args + ["-movflags", "+faststart", str(output)], mixed
+
+
+def assemble_block(project_dir, block_folder, force=False, progress_callback=None):
+    """
+    Build (or reuse) the rough cut of a production block.
+
+    Args:
+        project_dir: projects/<id>
+        block_folder: intro, chapter_N, break_N or close
+        force: Rebuild even if the inputs are unchanged
+        progress_callback: Optional callback(message, type)
+
+    Returns:
+        rough_cut.json contents, plus 'cached': True when nothing was rebuilt
+    """
+    project_dir = Path(project_dir)
+    block_dir = project_dir / "production" / block_folder
+
+    def log(message, msg_type="info"):
+        print(f"[Assembly] {message}")
+        if progress_callback:
+            progress_callback(message, msg_type)
+
+    clips, missing = block_clips(block_dir)
+    if not clips:
+        raise AssemblyError(f"{block_folder} has no rendered clips yet")
+    narration = block_narration_path(project_dir, block_folder)
+
+    cache_key = _cache_key(clips, narration)
+    output = block_dir / ROUGH_CUT_FILE
+    previous = load_rough_cut(block_dir)
+    if (not force and previous.get("cache_key") == cache_key
+            and output.exists() and output.stat().st_size == previous.get("file_size")):
+        log(f"♻️ {block_folder} rough cut unchanged — reusing it", "success")
+        return dict(previous, cached=True)
+
+    start = time.time()
+    if missing:
+        log(f"⚠️ {len(missing)} scene(s) not rendered yet, leaving them out: {missing}", "warning")
+
+    infos = [probe(clip) for clip in clips]
+    clips_have_audio = all(info["audio"] for info in infos)
+    copyable = len({_copy_signature(info) for info in infos}) == 1
+    mode = "copy" if copyable else "encode"
+    log(f"🎞️ Assembling {block_folder}: {len(clips)} clips, "
+        f"{'stream copy' if copyable else 'one encode pass (clips differ)'}"
+        + (f", narration {narration.name}" if narration else ", no narration"))
+
+    tmp_output = block_dir / f".{ROUGH_CUT_FILE}.tmp.mp4"
+    list_path = block_dir / ".rough_cut_concat.txt"
+    try:
+        if copyable:
+            with open(list_path, "w") as f:
+                for clip in clips:
+                    escaped = str(clip.resolve()).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            args, mixed = _concat_copy_command(list_path, clips_have_audio, narration, tmp_output)
+        else:
+            args, mixed = _concat_encode_command(clips, infos, clips_have_audio, narration, tmp_output)
+        _run(args)
+        os.replace(tmp_output, output)
+    finally:
+        for leftover in (list_path, tmp_output):
+            if leftover.exists():
+                leftover.unlink()
+
+    video_duration = round(sum(info["duration"] for info in infos), 2)
+    narration_duration = round(probe(narration)["duration"], 2) if narration else None
+    if narration_duration and abs(narration_duration - video_duration) > 1:
+        log(f"⚠️ Narration is {narration_duration}s but clips run {video_duration}s", "warning")
+
+    meta = {
+        "cache_key": cache_key,
+        "file": ROUGH_CUT_FILE,
+        "file_size": output.stat().st_size,
+        "mode": mode,
+        "clips": [clip.name for clip in clips],
+        "missing_scenes": missing,
+        "narration": narration.name if narration else None,
+        "clip_audio_mixed": mixed,
+        "video_duration": video_duration,
+        "narration_duration": narration_duration,
+        "built_at": time.time(),
+        "build_seconds": round(time.time() - start, 2),
+    }
+    with open(block_dir / ROUGH_CUT_META, "w") as f:
+        json.dump(meta, f, indent=2)
+
+    log(f"✅ {block_folder} rough cut ready ({meta['build_seconds']}s, {mode})", "success")
+    return dict(meta, cached=False)
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 3:
+        print("Usage: python assembly.py <project_dir> <block_folder> [--force]")
+        sys.exit(1)
+    result = assemble_block(sys.argv[1], sys.argv[2], force="--force" in sys.argv)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,512 @@
+"""
+The Last Shelter — Audio Utilities
+
+Frame-level MP3 inspection without decoding. ElevenLabs returns CBR/VBR MP3
+streams; walking the frame headers gives the exact sample count (so the exact
+duration), and the Layer III side info tells which frames carry no audible
+signal — enough to locate pauses between sentences.
+
+Usage:
+    scanner = Mp3FrameScanner()
+    for chunk in stream:
+        scanner.feed(chunk)
+    info = scanner.finish()   # duration_seconds, frames, silences, ...
+
+    info = scan_mp3_file("audio/chapter_0.mp3")
+
+Waveform peaks are the one thing here that needs decoded samples: ffmpeg
+decodes each MP3 once at a low rate into a compact `.peaks` file next to it,
+so the Voice tab can draw waveforms without downloading the audio.
+"""
+import os
+import math
+import array
+import struct
+import hashlib
+import tempfile
+import operator
+import subprocess
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Pauses shorter than this are just gaps between words
+MIN_SILENCE_SECONDS = 0.3
+
+# global_gain sets the Layer III quantizer step (2^((gain - 210) / 4)). Encoders
+# drop it sharply in pauses: ElevenLabs speech sits at ~145-185, the room-tone
+# between sentences at ~120-135. Granules below this are treated as silence.
+SILENCE_MAX_GLOBAL_GAIN = 140
+
+# Waveform peaks: decode at 8 kHz mono (plenty for drawing), one peak/RMS pair per 20 ms
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+PEAKS_SAMPLE_RATE = 8000
+PEAKS_PER_SECOND = 50
+# .peaks layout: header, then (peak, rms) uint8 pairs scaled to full scale = 255
+PEAKS_MAGIC = b"TLSP"
+PEAKS_VERSION = 1
+PEAKS_HEADER = struct.Struct("<4sBBHI")   # magic, version, reserved, pairs per second, pair count
+
+# Bitrates (kbps) by [mpeg1][layer] / [mpeg2/2.5][layer], index 0 = free, 15 = bad
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),   # MPEG-1
+    2: (22050, 24000, 16000),   # MPEG-2
+    0: (11025, 12000, 8000),    # MPEG-2.5
+}
+
+
+# =============================================================================
+# FRAME HEADERS
+# =============================================================================
+
+def parse_frame_header(header):
+    """
+    Decode a 4-byte MPEG audio frame header.
+
+    Returns:
+        Dict with version, layer, sample_rate, bitrate, frame_length, samples,
+        channels, protected — or None if the bytes are not a valid header
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03      # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+    layer_bits = (header[1] >> 1) & 0x03        # 1 = III, 2 = II, 3 = I
+    bitrate_index = (header[2] >> 4) & 0x0F
+    rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits
+    family = 1 if version_bits == 3 else 2
+    bitrate = _BITRATES[(family, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][rate_index]
+    padding = (header[2] >> 1) & 0x01
+    channels = 1 if ((header[3] >> 6) & 0x03) == 3 else 2
+
+    if layer == 1:
+        samples = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or family == 1:
+        samples = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+
+    return {
+        "version": {3: 1, 2: 2, 0: 2.5}[version_bits],
+        "layer": layer,
+        "sample_rate": sample_rate,
+        "bitrate": bitrate,
+        "frame_length": frame_length,
+        "samples": samples,
+        "channels": channels,
+        "protected": not (header[1] & 0x01),
+    }
+
+
+def _side_info_length(info):
+    if info["version"] == 1:
+        return 17 if info["channels"] == 1 else 32
+    return 9 if info["channels"] == 1 else 17
+
+
+class _BitReader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, bits):
+        value = 0
+        for _ in range(bits):
+            byte = self.data[self.pos >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return value
+
+
+def _is_silent_frame(frame, info):
+    """
+    True if no granule in this Layer III frame carries audible spectral data.
+
+    Reads only the side info: part2_3_length == 0 means no Huffman data at all,
+    and a global_gain under SILENCE_MAX_GLOBAL_GAIN means only noise-floor energy.
+    """
+    if info["layer"] != 3:
+        return False
+    offset = 4 + (2 if info["protected"] else 0)
+    side = frame[offset:offset + _side_info_length(info)]
+    reader = _BitReader(side)
+    channels = info["channels"]
+
+    if info["version"] == 1:
+        reader.read(9)                                  # main_data_begin
+        reader.read(5 if channels == 1 else 3)          # private bits
+        reader.read(4 * channels)                       # scfsi
+        granules, rest_bits = 2, 59 - 12 - 9 - 8        # 59 bits per granule/channel
+    else:
+        reader.read(8)                                  # main_data_begin
+        reader.read(1 if channels == 1 else 2)          # private bits
+        granules, rest_bits = 1, 63 - 12 - 9 - 8        # 63 bits per channel
+
+    for _ in range(granules):
+        for _ in range(channels):
+            part2_3_length = reader.read(12)
+            reader.read(9)                              # big_values
+            global_gain = reader.read(8)
+            reader.read(rest_bits)
+            if part2_3_length and global_gain >= SILENCE_MAX_GLOBAL_GAIN:
+                return False
+    return True
+
+
+def _parse_info_tag(frame, info):
+    """
+    Detect a Xing/Info/VBRI metadata frame and read the LAME encoder delay/padding.
+
+    Returns:
+        (is_tag_frame, encoder_delay, encoder_padding)
+    """
+    offset = 4 + (2 if info["protected"] else 0) + _side_info_length(info)
+    tag = frame[offset:offset + 4]
+    if tag not in (b"Xing", b"Info"):
+        return (frame[36:40] == b"VBRI"), 0, 0
+
+    flags = int.from_bytes(frame[offset + 4:offset + 8], "big")
+    position = offset + 8
+    position += 4 if flags & 0x1 else 0     # frame count
+    position += 4 if flags & 0x2 else 0     # byte count
+    position += 100 if flags & 0x4 else 0   # seek TOC
+    position += 4 if flags & 0x8 else 0     # quality
+
+    # LAME extension: 9-byte encoder version, then delay/padding 12+12 bits at +21
+    if frame[position:position + 4] in (b"LAME", b"Lavf", b"Lavc") and len(frame) >= position + 24:
+        packed = frame[position + 21:position + 24]
+        delay = (packed[0] << 4) | (packed[1] >> 4)
+        padding = ((packed[1] & 0x0F) << 8) | packed[2]
+        return True, delay, padding
+    return True, 0, 0
+
+
+# =============================================================================
+# STREAMING SCANNER
+# =============================================================================
+
+class Mp3FrameScanner:
+    """
+    Incremental MP3 frame walker — feed it the bytes as they stream in.
+
+    Keeps at most one partial frame buffered, so memory stays flat regardless
+    of file length. Byte offsets refer to positions in the complete file.
+    """
+
+    def __init__(self, min_silence_seconds=MIN_SILENCE_SECONDS):
+        self.min_silence_seconds = min_silence_seconds
+        self._buffer = bytearray()
+        self._buffer_offset = 0      # file offset of _buffer[0]
+        self._skip = 0               # bytes still to skip (ID3v2 tag body)
+        self._started = False
+
+        self.frames = 0
+        self.samples = 0
+        self.sample_rate = None
+        self.bitrates = set()
+        self.encoder_delay = 0
+        self.encoder_padding = 0
+        self.audio_start = None
+        self.audio_end = 0
+        self.silences = []
+        self._silence_start = None   # (byte_offset, sample_offset) of current silent run
+
+    def feed(self, chunk):
+        """Consume the next chunk of the stream."""
+        if self._skip:
+            skipped = min(self._skip, len(chunk))
+            self._skip -= skipped
+            self._buffer_offset += skipped
+            chunk = chunk[skipped:]
+        self._buffer += chunk
+        self._consume()
+
+    def _consume(self):
+        buf = self._buffer
+        pos = 0
+
+        if not self._started:
+            if len(buf) < 10:
+                return
+            self._started = True
+            if buf[:3] == b"ID3":
+                size = (buf[6] << 21) | (buf[7] << 14) | (buf[8] << 7) | buf[9]
+                size += 10 + (10 if buf[5] & 0x10 else 0)   # header + optional footer
+                if size > len(buf):
+                    self._skip = size - len(buf)
+                    self._buffer_offset += len(buf)
+                    self._buffer = bytearray()
+                    return
+                pos = size
+
+        while len(buf) - pos >= 4:
+            info = parse_frame_header(buf[pos:pos + 4])
+            if info is None:
+                pos += 1          # resync to the next frame header
+                continue
+            length = info["frame_length"]
+            if len(buf) - pos < length:
+                break
+            self._on_frame(buf[pos:pos + length], info, self._buffer_offset + pos)
+            pos += length
+
+        del buf[:pos]
+        self._buffer_offset += pos
+
+    def _on_frame(self, frame, info, offset):
+        if self.frames == 0 and self.audio_start is None:
+            is_tag, delay, padding = _parse_info_tag(frame, info)
+            if is_tag:
+                self.encoder_delay, self.encoder_padding = delay, padding
+                self.audio_start = offset + len(frame)
+                return
+            self.audio_start = offset
+
+        self.sample_rate = info["sample_rate"]
+        self.bitrates.add(info["bitrate"])
+
+        if _is_silent_frame(frame, info):
+            if self._silence_start is None:
+                self._silence_start = (offset, self.samples)
+        else:
+            self._close_silence(offset)
+
+        self.frames += 1
+        self.samples += info["samples"]
+        self.audio_end = offset + len(frame)
+
+    def _close_silence(self, end_offset):
+        if self._silence_start is None:
+            return
+        start_offset, start_sample = self._silence_start
+        self._silence_start = None
+        rate = self.sample_rate
+        start = max(0, start_sample - self.encoder_delay) / rate
+        end = max(0, self.samples - self.encoder_delay) / rate
+        if end - start >= self.min_silence_seconds:
+            self.silences.append({
+                "start_byte": start_offset,
+                "end_byte": end_offset,
+                "start_seconds": round(start, 3),
+                "end_seconds": round(end, 3),
+            })
+
+    def finish(self):
+        """
+        Flush the scanner and return the stream summary.
+
+        Returns:
+            Dict with duration_seconds (exact), frames, samples, sample_rate,
+            bitrate (kbps, None if VBR), audio_start/audio_end byte offsets, silences
+        """
+        self._consume()
+        self._close_silence(self.audio_end)
+
+        samples = max(0, self.samples - self.encoder_delay - self.encoder_padding)
+        duration = samples / self.sample_rate if self.sample_rate else 0.0
+        return {
+            "duration_seconds": round(duration, 3),
+            "frames": self.frames,
+            "samples": samples,
+            "sample_rate": self.sample_rate,
+            "bitrate": (next(iter(self.bitrates)) // 1000) if len(self.bitrates) == 1 else None,
+            "encoder_delay": self.encoder_delay,
+            "encoder_padding": self.encoder_padding,
+            "audio_start": self.audio_start or 0,
+            "audio_end": self.audio_end,
+            "silences": self.silences,
+        }
+
+
+# =============================================================================
+# FILE HELPERS
+# =============================================================================
+
+def scan_mp3_file(path, block_size=64 * 1024):
+    """Scan an MP3 file on disk. Returns the same dict as Mp3FrameScanner.finish()."""
+    scanner = Mp3FrameScanner()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            scanner.feed(block)
+    return scanner.finish()
+
+
+def write_mp3_stream(chunks, output_path):
+    """
+    Stream MP3 chunks to output_path, scanning frames on the way through.
+
+    Writes to a temp file in the same directory and atomically renames it,
+    so a failed or interrupted synthesis never leaves a truncated MP3 behind.
+
+    Returns:
+        Scanner summary dict plus file_size and sha256 of the bytes written
+    """
+    directory = os.path.dirname(output_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    scanner = Mp3FrameScanner()
+    digest = hashlib.sha256()
+    file_size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".mp3.part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                f.write(chunk)
+                scanner.feed(chunk)
+                digest.update(chunk)
+                file_size += len(chunk)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    result = scanner.finish()
+    result["file_size"] = file_size
+    result["sha256"] = digest.hexdigest()
+    return result
+
+
+def narration_audio_durations(narration, audio_dir):
+    """
+    Exact per-phase audio durations for generate_scene_prompts(), keyed by phase_name.
+
+    Looks for chapter_{i}.mp3 (Voice tab) or phase_{i+1}.mp3 (generate_all_audio)
+    and scans the frames, so it is exact even for manifests written before
+    durations were measured.
+    """
+    durations = {}
+    for i, phase in enumerate(narration.get("phases", [])):
+        phase_name = phase.get("phase_name", f"Phase {i + 1}")
+        for filename in (f"chapter_{i}.mp3", f"phase_{i + 1}.mp3"):
+            path = os.path.join(audio_dir, filename)
+            if os.path.exists(path):
+                info = scan_mp3_file(path)
+                if info["frames"]:
+                    durations[phase_name] = round(info["duration_seconds"], 1)
+                break
+    return durations
+
+
+# =============================================================================
+# WAVEFORM PEAKS
+# =============================================================================
+
+def peaks_path(mp3_path):
+    """audio/chapter_0.mp3 -> audio/chapter_0.peaks"""
+    return os.path.splitext(mp3_path)[0] + ".peaks"
+
+
+def compute_peaks(mp3_path):
+    """
+    Decode an MP3 with ffmpeg and reduce it to peak/RMS pairs.
+
+    Returns:
+        bytes of interleaved (peak, rms) uint8 pairs, PEAKS_PER_SECOND pairs per second
+    """
+    bucket = PEAKS_SAMPLE_RATE // PEAKS_PER_SECOND
+    bucket_bytes = bucket * 2
+    process = subprocess.Popen(
+        [FFMPEG_BIN, "-v", "error", "-i", mp3_path, "-ac", "1", "-ar", str(PEAKS_SAMPLE_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    pairs = bytearray()
+    pending = b""
+    while True:
+        block = process.stdout.read(bucket_bytes * 256)
+        if block:
+            pending += block
+        whole = len(pending) - len(pending) % bucket_bytes if block else len(pending) - len(pending) % 2
+        for start in range(0, whole, bucket_bytes):
+            samples = array.array("h", pending[start:start + bucket_bytes])
+            if not samples:
+                continue
+            peak = max(max(samples), -min(samples))
+            rms = math.sqrt(sum(map(operator.mul, samples, samples)) / len(samples))
+            pairs.append(min(255, round(peak * 255 / 32768)))
+            pairs.append(min(255, round(rms * 255 / 32768)))
+        pending = pending[whole:]
+        if not block:
+            break
+    stderr = process.stderr.read().decode("utf-8", "replace")
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg could not decode {mp3_path}: {stderr.strip()[-300:]}")
+    return bytes(pairs)
+
+
+def write_peaks(mp3_path):
+    """
+    Compute and save the .peaks file for an MP3 (atomic write).
+
+    Returns:
+        dict with file, pairs, pairs_per_second
+    """
+    pairs = compute_peaks(mp3_path)
+    count = len(pairs) // 2
+    path = peaks_path(mp3_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, 0, PEAKS_PER_SECOND, count))
+        f.write(pairs)
+    os.replace(tmp_path, path)
+    return {"file": os.path.basename(path), "pairs": count, "pairs_per_second": PEAKS_PER_SECOND}
+
+
+def ensure_peaks(mp3_path):
+    """
+    Make sure the .peaks file exists and is newer than the MP3.
+
+    Never raises — a missing ffmpeg only costs the waveform.
+
+    Returns:
+        Same dict as write_peaks(), or None if peaks could not be computed
+    """
+    path = peaks_path(mp3_path)
+    try:
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(mp3_path):
+            with open(path, "rb") as f:
+                magic, version, _, per_second, count = PEAKS_HEADER.unpack(f.read(PEAKS_HEADER.size))
+            if magic == PEAKS_MAGIC and version == PEAKS_VERSION:
+                return {"file": os.path.basename(path), "pairs": count, "pairs_per_second": per_second}
+        return write_peaks(mp3_path)
+    except (OSError, RuntimeError, struct.error) as e:
+        print(f"[Audio] ⚠️ No waveform peaks for {os.path.basename(mp3_path)}: {e}")
+        return None
+
+
+# Quick check when run directly
+if __name__ == "__main__":
+    import sys
+    import json
+    for mp3 in [arg for arg in sys.argv[1:] if not arg.startswith("-")]:
+        info = scan_mp3_file(mp3)
+        size = os.path.getsize(mp3)
+        print(f"{mp3}: {info['duration_seconds']}s exact vs {round(size / 16000, 1)}s estimated, "
+              f"{info['frames']} frames, {len(info['silences'])} pauses")
+        if "-v" in sys.argv:
+            print(json.dumps(info["silences"][:10], indent=2))
+        if "--peaks" in sys.argv:
+            print(ensure_peaks(mp3))
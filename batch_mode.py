@@ -0,0 +1,271 @@
+"""
+The Last Shelter — Gemini Batch Mode
+
+Overnight and backlog work (elements, location images and scene prompts for
+a queue of episodes) doesn't need interactive latency. In batch mode the
+normal call sites — generate_json(), generate_image() and their *_async
+versions — hand their generate_content() request to a per-model collector
+instead of calling the model. Requests that are waiting together (a stage's
+fan-out, or several episodes' fan-outs at once) go out as ONE Gemini Batch
+API job; the job is polled until it finishes and every caller gets its own
+GenerateContentResponse back, as if it had made the call itself.
+
+    with batch_mode.enabled():          # a bulk job (set before its thread starts)
+        threading.Thread(target=telemetry.propagate(tracing.job(run))).start()
+
+    GEMINI_BATCH_MODE=1                 # the whole process (overnight worker)
+
+or "batch": true in the body of generate-elements, generate-prompts and
+generate-chapter-production.
+
+Batch jobs have their own, higher quota and are billed at half price
+(telemetry prices them as "<model>:batch"), but take minutes to hours to
+come back — keep interactive editing out of batch mode. Sequential code gains
+nothing: a request is only grouped with the ones waiting alongside it.
+
+A model's waiting requests are flushed as one job once BATCH_MAX_REQUESTS
+are queued, or BATCH_COLLECT_SECONDS after the last one arrived. Jobs are
+polled with backoff from BATCH_POLL_MIN to BATCH_POLL_MAX seconds. With
+PROVIDER_BACKEND=synthetic the batch endpoints are answered by
+provider_backend's fake batch service.
+"""
+import os
+import time
+import asyncio
+import itertools
+import contextvars
+from contextlib import contextmanager
+
+from google.genai import types
+
+import telemetry
+import tracing
+import rate_limiter
+import provider_loop
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+BATCH_MODE_DEFAULT = os.environ.get("GEMINI_BATCH_MODE", "0").lower() in ("1", "true", "on")
+
+BATCH_COLLECT_SECONDS = 2.0
+# Inline batch requests must stay under the API's 20 MB request size
+BATCH_MAX_REQUESTS = 100
+BATCH_POLL_MIN = 5.0
+BATCH_POLL_MAX = 60.0
+# The Batch API's own target turnaround; jobs still running after this are cancelled
+BATCH_TIMEOUT_SECONDS = 24 * 3600
+
+# Control-plane calls (create / get / cancel) share one limiter key
+BATCH_RATE_KEY = "gemini-batch"
+BATCH_RATE_DEFAULTS = {"rpm": 60, "concurrency": 4}
+
+_SUCCEEDED = "JOB_STATE_SUCCEEDED"
+_TERMINAL = {_SUCCEEDED, "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+_enabled = contextvars.ContextVar("batch_mode", default=None)
+_collectors = {}             # model -> _Collector (only touched on the provider loop)
+_job_ids = itertools.count(1)
+
+
+class BatchError(Exception):
+    """A batch job, or one request in it, came back without a response."""
+
+
+def active():
+    """True when calls made here should go through the Batch API."""
+    on = _enabled.get()
+    return BATCH_MODE_DEFAULT if on is None else on
+
+
+@contextmanager
+def enabled(on=True):
+    """Batch (or, with on=False, don't batch) calls made in this block; on=None leaves the mode as it is."""
+    if on is None:
+        yield
+        return
+    token = _enabled.set(bool(on))
+    try:
+        yield
+    finally:
+        _enabled.reset(token)
+
+
+# =============================================================================
+# COLLECTION
+# =============================================================================
+
+class _Pending:
+    """One caller's request, waiting for its batch job."""
+
+    __slots__ = ("contents", "config", "future", "context", "began")
+
+    def __init__(self, contents, config, future, context):
+        self.contents = contents
+        self.config = config
+        self.future = future
+        self.context = context
+        self.began = time.perf_counter()
+
+
+class _Collector:
+    """Requests for one model waiting to be submitted together."""
+
+    def __init__(self, model, client, meter):
+        self.model = model
+        self.client = client
+        self.meter = meter
+        self.waiting = []
+        self.timer = None
+
+    def add(self, pending):
+        self.waiting.append(pending)
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if len(self.waiting) >= BATCH_MAX_REQUESTS:
+            self.flush()
+        else:
+            self.timer = asyncio.get_running_loop().call_later(BATCH_COLLECT_SECONDS, self.flush)
+
+    def flush(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        items, self.waiting = [p for p in self.waiting if not p.future.done()], []
+        if items:
+            asyncio.ensure_future(_run_job(self.model, self.client, self.meter, items))
+
+
+async def submit(client, model, contents, config=None, meter=None):
+    """
+    Queue one generate_content() request for the model's next batch job and
+    await its response.
+
+    Args:
+        client: google-genai async client (client.aio)
+        model: Model ID
+        contents, config: As for generate_content()
+        meter: fn(response) -> usage dict for telemetry (provider_clients._gemini_usage)
+
+    Returns:
+        The request's GenerateContentResponse
+    """
+    if not provider_loop.on_loop():
+        # Collectors live on the provider loop; hop over and wait there
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            submit(client, model, contents, config, meter), provider_loop.loop()))
+    # The job runs as its own task — keep each request's project, stage, span and caller
+    with telemetry.attribute(), tracing.track():
+        context = contextvars.copy_context()
+    pending = _Pending(contents, config, asyncio.get_running_loop().create_future(), context)
+    collector = _collectors.get(model)
+    if collector is None:
+        collector = _collectors[model] = _Collector(model, client, meter)
+    collector.add(pending)
+    return await pending.future
+
+
+# =============================================================================
+# JOBS
+# =============================================================================
+
+async def _run_job(model, client, meter, items):
+    display_name = f"last-shelter-{model}-{os.getpid()}-{next(_job_ids)}"
+    started = time.monotonic()
+    job = None
+    try:
+        job = await rate_limiter.call_async(
+            BATCH_RATE_KEY, client.batches.create, model=model,
+            src=[types.InlinedRequest(model=model, contents=p.contents, config=p.config, metadata={"key": str(i)})
+                 for i, p in enumerate(items)],
+            config=types.CreateBatchJobConfig(display_name=display_name),
+            defaults=BATCH_RATE_DEFAULTS,
+        )
+        telemetry.count("gemini_batch_jobs_total", model=model, state="submitted")
+        print(f"[BatchMode] {model}: {len(items)} request(s) submitted as {job.name}")
+
+        delay = BATCH_POLL_MIN
+        while job.state not in _TERMINAL:
+            if time.monotonic() - started > BATCH_TIMEOUT_SECONDS:
+                await rate_limiter.call_async(BATCH_RATE_KEY, client.batches.cancel, name=job.name,
+                                              defaults=BATCH_RATE_DEFAULTS)
+                raise BatchError(f"{job.name} still {job.state} after {BATCH_TIMEOUT_SECONDS}s — cancelled")
+            await asyncio.sleep(delay)
+            delay = min(BATCH_POLL_MAX, delay * 2)
+            job = await rate_limiter.call_async(BATCH_RATE_KEY, client.batches.get, name=job.name,
+                                                defaults=BATCH_RATE_DEFAULTS)
+        if job.state != _SUCCEEDED:
+            raise BatchError(f"{job.name} ended {job.state}: {job.error}")
+    except BaseException as e:
+        telemetry.count("gemini_batch_jobs_total", model=model, state="failed")
+        print(f"[BatchMode] {model}: batch of {len(items)} failed: {e}")
+        error = e if isinstance(e, Exception) else BatchError(f"batch {getattr(job, 'name', display_name)} was cancelled")
+        for p in items:
+            if not p.future.done():
+                p.future.set_exception(error)
+        if not isinstance(e, Exception):
+            raise
+        return
+
+    turnaround = time.monotonic() - started
+    telemetry.count("gemini_batch_jobs_total", model=model, state="succeeded")
+    print(f"[BatchMode] {model}: {job.name} finished in {turnaround:.0f}s")
+    _deliver(model, meter, items, (job.dest.inlined_responses if job.dest else None) or [], job.name, turnaround)
+
+
+def _deliver(model, meter, items, responses, job_name, turnaround):
+    """Resolve every caller's future with its own response (matched on metadata key, else position)."""
+    by_key = {}
+    for i, inlined in enumerate(responses):
+        by_key[(inlined.metadata or {}).get("key", str(i))] = inlined
+    for i, p in enumerate(items):
+        inlined = by_key.get(str(i))
+        if inlined is not None and inlined.response is not None and not inlined.error:
+            p.context.run(_record, model, meter, p, inlined.response, job_name, turnaround)
+            if not p.future.done():
+                p.future.set_result(inlined.response)
+        else:
+            error = BatchError(f"{job_name}: request {i} — {getattr(inlined, 'error', None) or 'no response'}")
+            p.context.run(_record, model, None, p, None, job_name, turnaround, error)
+            if not p.future.done():
+                p.future.set_exception(error)
+
+
+def _record(model, meter, pending, response, job_name, turnaround, error=None):
+    usage = {}
+    if meter and response is not None:
+        try:
+            usage = meter(response) or {}
+        except Exception:
+            usage = {}
+    key = f"{model}:batch"
+    telemetry.record(key, turnaround, ok=error is None, usage=usage,
+                     error=type(error).__name__ if error else None)
+    tracing.record_span(key, pending.began, batch=job_name, **usage)
+
+
+# Quick test when run directly (PROVIDER_BACKEND=synthetic)
+if __name__ == "__main__":
+    import json
+    import provider_clients
+    import batch_mode  # the module provider_clients checks, not this __main__ copy
+
+    async def episode(n):
+        responses = await asyncio.gather(*(
+            provider_clients.gemini_generate_async(
+                "gemini-2.5-flash", f"Episode {n}, scene {i}. Return JSON: {{\"scene\": {i}, \"action\": \"<what happens>\"}}",
+                types.GenerateContentConfig(response_mime_type="application/json"))
+            for i in range(3)))
+        return [json.loads(r.text) for r in responses]
+
+    async def overnight():
+        return await asyncio.gather(*(episode(n) for n in range(4)))
+
+    started = time.perf_counter()
+    with telemetry.context(project="demo", stage="batch_demo"), batch_mode.enabled():
+        results = provider_loop.run(overnight())
+    print(f"{sum(map(len, results))} responses from 4 episodes in {time.perf_counter() - started:.1f}s")
+    print(results[0])
+    print("\n".join(line for line in telemetry.prometheus_text().splitlines() if "batch" in line))
@@ -0,0 +1,433 @@
+"""
+The Last Shelter — HTTP Load Test
+
+Simulates several editors working at once against a running app and reports
+per-route latency percentiles and how close the server's thread pool is to
+saturation. By default it starts the app the way the Procfile does
+(gunicorn gthread, --threads 4) on the synthetic provider backend, so no keys
+or network are needed and generation jobs take modelled time.
+
+Each simulated editor owns one of a few seeded copies of the sample project
+(uploaded through /api/upload-project, deleted afterwards) and loops over:
+
+    poll        GET  /api/project/<id>                       (the UI's refresh)
+    browse      GET  /storyboard/<block> + scene / element images
+    save        GET + PUT /storyboard/<block>                (unchanged round-trip)
+    job         POST generate-prompts / generate-narration, then hold
+                GET /progress (SSE) open until the job completes
+
+Only one job runs per project at a time, like the disabled buttons in the UI.
+The SSE stream is held on its own thread while the editor keeps clicking —
+in gunicorn each open stream pins a worker thread for the whole job, which is
+usually what saturates the pool first.
+
+Load ramps through --sessions (default 1,2,4,8 editors), --step seconds each.
+A monitor samples /api/telemetry every second for
+http_requests_in_flight{kind=request|stream}. A step "falls over" when
+interactive routes miss the p95 SLO or more than 1% of requests fail.
+
+Usage:
+    python benchmarks/load_test.py                            # gunicorn --threads 4, ramp 1,2,4,8
+    python benchmarks/load_test.py --threads 8 --sessions 4 8 16
+    python benchmarks/load_test.py --url http://localhost:5000 --threads 4   # app already running
+    python benchmarks/load_test.py --json > load.json
+
+Exit code 1 when any step falls over.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import zipfile
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from collections import defaultdict
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SAMPLE_PROJECT = "60fb2ed6-he-built-an-incredible-log-cab"
+PROJECT_PREFIX = "loadtest"
+
+DEFAULT_SESSIONS = [1, 2, 4, 8]
+DEFAULT_STEP_SECONDS = 60
+DEFAULT_THREADS = 4            # Procfile: gunicorn --worker-class gthread --threads 4
+DEFAULT_PROJECTS = 4            # one SSE stream each at most — 4 can pin every default thread
+DEFAULT_LATENCY_SCALE = 0.1
+
+# Mean pause between an editor's actions (exponential, so bursts happen)
+MEAN_THINK_SECONDS = 1.5
+# Relative weight of each action in an editor's loop
+ACTION_WEIGHTS = {"poll": 5, "browse": 3, "save": 2, "job": 1}
+IMAGES_PER_BROWSE = 4
+JOBS = [("generate-prompts", {"block_folder": "chapter_1"}),
+        ("generate-prompts", {"block_folder": "intro"}),
+        ("generate-narration", {})]
+
+REQUEST_TIMEOUT = 30
+JOB_TIMEOUT = 600
+SERVER_START_TIMEOUT = 60
+MONITOR_INTERVAL = 1.0
+
+# A step falls over when interactive routes (everything but jobs and SSE) exceed this p95 ...
+INTERACTIVE_P95_SLO = 1.0
+# ... or more than this share of requests fail
+MAX_ERROR_RATE = 0.01
+
+
+# =============================================================================
+# RESULTS
+# =============================================================================
+
+def percentile(values, q):
+    """Nearest-rank percentile (same as telemetry's)."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+class Stats:
+    """Latencies and failures per route for one load step."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.samples = []            # (time, in_flight_requests, in_flight_streams, probe_seconds)
+
+    def add(self, route, seconds, ok):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def sample(self, requests_in_flight, streams_in_flight, probe_seconds):
+        with self._lock:
+            self.samples.append((time.time(), requests_in_flight, streams_in_flight, probe_seconds))
+
+    def routes(self):
+        with self._lock:
+            rows = {}
+            for route, values in sorted(self.latencies.items()):
+                rows[route] = {
+                    "count": len(values),
+                    "errors": self.errors[route],
+                    "p50": round(percentile(values, 0.50), 3),
+                    "p95": round(percentile(values, 0.95), 3),
+                    "p99": round(percentile(values, 0.99), 3),
+                    "max": round(max(values), 3),
+                }
+            return rows
+
+
+def _interactive(route):
+    return not route.startswith(("POST /generate", "SSE "))
+
+
+# =============================================================================
+# SERVER + FIXTURES
+# =============================================================================
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(threads, latency_scale):
+    """Start gunicorn the way the Procfile does, on the synthetic provider backend."""
+    port = _free_port()
+    env = {**os.environ, "PROVIDER_BACKEND": "synthetic", "PROVIDER_LATENCY_SCALE": str(latency_scale)}
+    env.pop("PROVIDER_CASSETTE_DIR", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--worker-class", "gthread", "--threads", str(threads),
+         "--timeout", "120", "-b", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            if requests.get(f"{url}/api/telemetry", timeout=2).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise TimeoutError(f"gunicorn not ready after {SERVER_START_TIMEOUT}s")
+
+
+def seed_projects(url, count, run_id):
+    """Upload `count` copies of the sample project. Returns their ids."""
+    source = ROOT / "projects" / SAMPLE_PROJECT
+    ids = []
+    with tempfile.TemporaryDirectory(prefix="tls-load-") as tmp:
+        for n in range(count):
+            project_id = f"{PROJECT_PREFIX}-{run_id}-{n}"
+            zip_path = Path(tmp) / f"{project_id}.zip"
+            # Stored, not deflated: most of the project is already-compressed PNG/MP3
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+                for path in source.rglob("*"):
+                    if path.is_file() and path.name != "telemetry.jsonl":
+                        zf.write(path, f"{project_id}/{path.relative_to(source)}")
+            with open(zip_path, "rb") as f:
+                resp = requests.post(f"{url}/api/upload-project", files={"file": (zip_path.name, f)},
+                                     timeout=300)
+            resp.raise_for_status()
+            ids.append(project_id)
+            print(f"[Load] Seeded {project_id}", flush=True)
+    return ids
+
+
+def delete_projects(url, ids):
+    for project_id in ids:
+        try:
+            requests.delete(f"{url}/api/project/{project_id}", timeout=60)
+        except requests.RequestException as e:
+            print(f"[Load] ⚠️ Could not delete {project_id}: {e}")
+
+
+def sample_assets():
+    """Blocks and image filenames an editor can browse (same in every seeded copy)."""
+    source = ROOT / "projects" / SAMPLE_PROJECT
+    blocks = {}
+    for block_dir in sorted((source / "production").iterdir()):
+        if (block_dir / "storyboard.json").exists():
+            images = sorted(p.name for p in (block_dir / "images").glob("*.png")) if (block_dir / "images").exists() else []
+            blocks[block_dir.name] = images
+    elements = sorted(p.name for p in (source / "elements").glob("*.png"))
+    return blocks, elements
+
+
+# =============================================================================
+# EDITOR SESSION
+# =============================================================================
+
+class Editor(threading.Thread):
+    """One simulated editor: think, act, repeat until the step ends."""
+
+    def __init__(self, url, project_id, assets, stats, job_locks, stop, seed):
+        super().__init__(daemon=True)
+        self.url = url
+        self.project_id = project_id
+        self.blocks, self.elements = assets
+        self.stats = stats
+        self.job_locks = job_locks
+        self.stop = stop
+        self.rng = random.Random(seed)
+        self.http = requests.Session()
+        self.streams = []
+
+    def _request(self, route, method, path, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        resp = None
+        try:
+            resp = self.http.request(method, f"{self.url}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+            ok = resp.status_code < 400
+            resp.content           # include the body transfer in the timing
+        except requests.RequestException:
+            pass
+        self.stats.add(route, time.perf_counter() - start, ok)
+        return resp if ok else None
+
+    def run(self):
+        actions, weights = zip(*ACTION_WEIGHTS.items())
+        base = f"/api/project/{self.project_id}"
+        while not self.stop.is_set():
+            self.stop.wait(self.rng.expovariate(1 / MEAN_THINK_SECONDS))
+            if self.stop.is_set():
+                break
+            action = self.rng.choices(actions, weights)[0]
+            block = self.rng.choice(sorted(self.blocks))
+
+            if action == "poll":
+                self._request("GET /project", "GET", base)
+            elif action == "browse":
+                self._request("GET /storyboard", "GET", f"{base}/storyboard/{block}")
+                for name in self.rng.sample(self.blocks[block], min(IMAGES_PER_BROWSE, len(self.blocks[block]))):
+                    self._request("GET /scene-image", "GET", f"{base}/scene-image/{block}/{name}")
+                if self.elements:
+                    self._request("GET /element", "GET", f"{base}/element/{self.rng.choice(self.elements)}")
+            elif action == "save":
+                resp = self._request("GET /storyboard", "GET", f"{base}/storyboard/{block}")
+                if resp is not None:
+                    self._request("PUT /storyboard", "PUT", f"{base}/storyboard/{block}", json=resp.json())
+            elif action == "job":
+                self._start_job(base)
+        for stream in self.streams:
+            stream.join(timeout=JOB_TIMEOUT)
+
+    def _start_job(self, base):
+        lock = self.job_locks[self.project_id]
+        if not lock.acquire(blocking=False):
+            self._request("GET /project", "GET", base)     # button disabled — just refresh
+            return
+        endpoint, body = self.rng.choice(JOBS)
+        if self._request(f"POST /{endpoint}", "POST", f"{base}/{endpoint}", json=body) is None:
+            lock.release()
+            return
+        stream = threading.Thread(target=self._hold_progress, args=(base, lock), daemon=True)
+        stream.start()
+        self.streams.append(stream)
+
+    def _hold_progress(self, base, lock):
+        """Keep the SSE stream open until the job reports complete/error, like the UI does."""
+        start = time.perf_counter()
+        ok = False
+        try:
+            with requests.get(f"{self.url}{base}/progress", stream=True, timeout=(REQUEST_TIMEOUT, JOB_TIMEOUT)) as resp:
+                first = None
+                for line in resp.iter_lines(decode_unicode=True):
+                    if first is None:
+                        first = time.perf_counter() - start
+                        self.stats.add("SSE /progress (first event)", first, True)
+                    if line and line.startswith("data: "):
+                        if json.loads(line[6:]).get("type") in ("complete", "error"):
+                            ok = True
+                            break
+        except (requests.RequestException, ValueError):
+            pass
+        finally:
+            self.stats.add("SSE /progress (job)", time.perf_counter() - start, ok)
+            lock.release()
+
+
+# =============================================================================
+# MONITOR
+# =============================================================================
+
+def monitor(url, stats, stop):
+    """Sample requests in flight from /api/telemetry. The probe's own latency shows queueing."""
+    http = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            gauges = http.get(f"{url}/api/telemetry", timeout=REQUEST_TIMEOUT).json().get("gauges", {})
+            probe = time.perf_counter() - start
+            in_flight = gauges.get('http_requests_in_flight{kind="request"}', {}).get("value", 0)
+            streams = gauges.get('http_requests_in_flight{kind="stream"}', {}).get("value", 0)
+            stats.sample(max(0, in_flight - 1), streams, probe)       # minus the probe itself
+        except (requests.RequestException, ValueError):
+            stats.sample(None, None, time.perf_counter() - start)
+        stop.wait(MONITOR_INTERVAL)
+
+
+# =============================================================================
+# DRIVER
+# =============================================================================
+
+def run_step(url, sessions, seconds, project_ids, assets, job_locks, threads):
+    """Run `sessions` editors for `seconds` and summarise the step."""
+    stats = Stats()
+    stop = threading.Event()
+    editors = [Editor(url, project_ids[n % len(project_ids)], assets, stats, job_locks, stop, seed=n)
+               for n in range(sessions)]
+    watcher = threading.Thread(target=monitor, args=(url, stats, stop), daemon=True)
+    watcher.start()
+    for editor in editors:
+        editor.start()
+    time.sleep(seconds)
+    stop.set()
+    for editor in editors:
+        editor.join(timeout=JOB_TIMEOUT)
+    watcher.join(timeout=REQUEST_TIMEOUT)
+
+    routes = stats.routes()
+    busy = [(r or 0) + (s or 0) for _, r, s, _ in stats.samples]
+    probes = [p for *_, p in stats.samples]
+    interactive = [v for route, values in stats.latencies.items() if _interactive(route) for v in values]
+    total = sum(row["count"] for row in routes.values())
+    errors = sum(row["errors"] for row in routes.values())
+    p95 = percentile(interactive, 0.95)
+    error_rate = errors / total if total else 0.0
+    return {
+        "sessions": sessions,
+        "seconds": seconds,
+        "requests": total,
+        "rps": round(total / seconds, 2),
+        "error_rate": round(error_rate, 4),
+        "interactive_p95": round(p95, 3) if p95 is not None else None,
+        "peak_in_flight": max(busy, default=0),
+        "peak_streams": max((s or 0 for _, _, s, _ in stats.samples), default=0),
+        # Share of samples where every worker thread was busy (new requests queue)
+        "saturated_share": round(sum(1 for b in busy if b >= threads) / len(busy), 3) if busy else None,
+        "probe_p95": round(percentile(probes, 0.95), 3) if probes else None,
+        "fell_over": error_rate > MAX_ERROR_RATE or (p95 is not None and p95 > INTERACTIVE_P95_SLO),
+        "routes": routes,
+    }
+
+
+def print_step(step, threads):
+    print(f"\n── {step['sessions']} editor(s) · {step['rps']} req/s · interactive p95 {step['interactive_p95']}s · "
+          f"errors {step['error_rate']:.1%} · peak in flight {step['peak_in_flight']:g}/{threads} "
+          f"({step['peak_streams']:g} SSE) · saturated {(step['saturated_share'] or 0):.0%} of samples "
+          + ("❌ FELL OVER" if step["fell_over"] else "✅"))
+    print(f"{'route':<30} {'n':>6} {'err':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}")
+    for route, row in step["routes"].items():
+        print(f"{route:<30} {row['count']:>6} {row['errors']:>5} {row['p50']:>7.3f} {row['p95']:>7.3f} "
+              f"{row['p99']:>7.3f} {row['max']:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="Load an already running app instead of starting gunicorn")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="gunicorn --threads (also the saturation reference for --url)")
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS,
+                        help="Concurrent editors per load step")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP_SECONDS, help="Seconds per load step")
+    parser.add_argument("--projects", type=int, default=DEFAULT_PROJECTS, help="Seeded copies of the sample project")
+    parser.add_argument("--latency-scale", type=float, default=DEFAULT_LATENCY_SCALE,
+                        help="Modelled provider latency multiplier for the started server")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        print(f"[Load] Starting gunicorn (gthread, {args.threads} threads, synthetic providers)...", flush=True)
+        server, url = start_server(args.threads, args.latency_scale)
+
+    run_id = time.strftime("%H%M%S")
+    project_ids = []
+    steps = []
+    try:
+        project_ids = seed_projects(url, args.projects, run_id)
+        assets = sample_assets()
+        job_locks = {project_id: threading.Lock() for project_id in project_ids}
+        for sessions in args.sessions:
+            print(f"[Load] {sessions} editor(s) for {args.step:g}s...", flush=True)
+            step = run_step(url, sessions, args.step, project_ids, assets, job_locks, args.threads)
+            steps.append(step)
+            if not args.json:
+                print_step(step, args.threads)
+    finally:
+        delete_projects(url, project_ids)
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    fell_over = next((s["sessions"] for s in steps if s["fell_over"]), None)
+    if args.json:
+        print(json.dumps({"threads": args.threads, "fell_over_at": fell_over, "steps": steps}, indent=2))
+    elif fell_over:
+        print(f"\n[Load] ❌ Falls over at {fell_over} concurrent editor(s) with {args.threads} threads")
+    else:
+        print(f"\n[Load] ✅ Held up through {args.sessions[-1]} concurrent editor(s) with {args.threads} threads")
+    return 1 if fell_over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+The Last Shelter — End-to-End Pipeline Benchmark
+
+Runs the production pipeline on the bundled sample project against the
+synthetic provider backend (provider_backend.py), one stage at a time, and
+compares the numbers with benchmarks/baseline.json.
+
+Each stage drives the same Flask route the UI calls, on a fresh copy of the
+sample project, in its own Python process — so peak RSS and CPU are that
+stage's alone. Provider calls go through the real rate limiter, telemetry,
+caches and manifest code; only the network is replaced, with latencies from
+config/synthetic_latency.json scaled by --latency-scale.
+
+Stages:
+    parse       upload-script (section parse + background entity extraction)
+    breakdown   generate-breakdown (metadata + narration split)
+    narration   generate-narration
+    elements    generate-elements (element analysis + reference images)
+    intro       analyze-intro (storyboard + scene images)
+    chapter     analyze-chapter 0 (cinematic analysis + validation + scene images)
+    prompts     generate-prompts for chapter_1
+    production  generate-chapter-production 0 (scene-state chain + location images + prompts)
+    audio       generate_audio_segment for every chapter, 3 at a time like the Voice tab
+
+Reported per stage: wall seconds, CPU seconds (user + sys), peak RSS,
+provider calls by model, and the image / TTS share of them.
+
+Usage:
+    python benchmarks/pipeline_bench.py                      # all stages, compare to baseline
+    python benchmarks/pipeline_bench.py --stages intro audio
+    python benchmarks/pipeline_bench.py --update-baseline    # accept current numbers
+    python benchmarks/pipeline_bench.py --latency-scale 0    # CPU-only: no modelled waits
+
+Exit code 1 when any stage regresses past the baseline thresholds.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SAMPLE_PROJECT = "60fb2ed6-he-built-an-incredible-log-cab"
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+STAGES = ["parse", "breakdown", "narration", "elements", "intro", "chapter", "prompts", "production", "audio"]
+
+# Modelled provider latency is real-world × this (0.1 keeps a full run to a few minutes)
+DEFAULT_LATENCY_SCALE = 0.1
+STAGE_TIMEOUT = 900
+# Same parallelism as the Voice tab's "Generate all"
+AUDIO_PARALLEL_SEGMENTS = 3
+BENCH_VOICE_ID = "bench-voice"
+
+# A stage regresses when a metric exceeds baseline × (1 + threshold)
+DEFAULT_THRESHOLDS = {
+    "wall_seconds": 0.20,
+    "cpu_seconds": 0.25,
+    "peak_rss_mb": 0.20,
+    "provider_calls": 0.0,
+}
+# Differences smaller than these are noise, whatever the ratio
+ABSOLUTE_SLACK = {"wall_seconds": 0.5, "cpu_seconds": 0.3, "peak_rss_mb": 15, "provider_calls": 0}
+
+
+# =============================================================================
+# STAGE WORKER (runs in its own process)
+# =============================================================================
+
+def _stage_requests(stage, client, project_id):
+    """Fire the route(s) for one stage. Returns the HTTP statuses."""
+    base = f"/api/project/{project_id}"
+    project_dir = ROOT / "projects" / SAMPLE_PROJECT
+
+    if stage == "parse":
+        with open(project_dir / "script_raw.md", "rb") as f:
+            data = {"script": (f, "script_raw.md")}
+            return [client.post(f"{base}/upload-script", data=data, content_type="multipart/form-data").status_code]
+    if stage == "breakdown":
+        return [client.post(f"{base}/generate-breakdown", json={}).status_code]
+    if stage == "narration":
+        return [client.post(f"{base}/generate-narration", json={}).status_code]
+    if stage == "elements":
+        return [client.post(f"{base}/generate-elements", json={}).status_code]
+    if stage == "intro":
+        return [client.post(f"{base}/analyze-intro", json={}).status_code]
+    if stage == "chapter":
+        return [client.post(f"{base}/analyze-chapter", json={"chapter_index": 0}).status_code]
+    if stage == "prompts":
+        return [client.post(f"{base}/generate-prompts", json={"block_folder": "chapter_1"}).status_code]
+    if stage == "production":
+        return [client.post(f"{base}/generate-chapter-production", json={"chapter_index": 0}).status_code]
+    if stage == "audio":
+        with open(project_dir / "narration.json") as f:
+            phases = json.load(f).get("phases", [])
+
+        def segment(index):
+            return client.post(f"{base}/generate_audio_segment", json={
+                "segment_id": f"chapter_{index}", "segment_type": "narration", "voice_id": BENCH_VOICE_ID,
+            }).status_code
+        with ThreadPoolExecutor(AUDIO_PARALLEL_SEGMENTS) as pool:
+            return list(pool.map(segment, range(len(phases))))
+    raise ValueError(f"Unknown stage {stage}")
+
+
+def run_stage(stage, latency_scale):
+    """Run one stage in this process and return its measurements."""
+    os.environ["PROVIDER_BACKEND"] = "synthetic"
+    os.environ["PROVIDER_LATENCY_SCALE"] = str(latency_scale)
+    os.environ.setdefault("FLASK_ENV", "development")
+    os.chdir(ROOT)                    # routes read config/ relative to the repo
+    sys.path.insert(0, str(ROOT))
+
+    import app as webapp
+    import telemetry
+    import tracing
+
+    with tempfile.TemporaryDirectory(prefix="tls-bench-") as tmp:
+        projects_dir = Path(tmp)
+        shutil.copytree(ROOT / "projects" / SAMPLE_PROJECT, projects_dir / SAMPLE_PROJECT)
+        webapp.PROJECTS_DIR = projects_dir
+        telemetry.configure(projects_dir)
+        tracing.configure(projects_dir)
+        client = webapp.app.test_client()
+
+        idle_threads = set(threading.enumerate())
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+
+        statuses = _stage_requests(stage, client, SAMPLE_PROJECT)
+        # Routes return immediately and finish on background threads — wait those out
+        # (the provider loop and its offload pool live for the whole process)
+        deadline = time.monotonic() + STAGE_TIMEOUT
+        while any(t.is_alive() and not t.name.startswith("provider-")
+                  for t in set(threading.enumerate()) - idle_threads):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{stage} still running after {STAGE_TIMEOUT}s")
+            time.sleep(0.02)
+
+        wall = time.perf_counter() - start
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        messages = webapp._progress_streams.get(SAMPLE_PROJECT, [])
+        if os.environ.get("BENCH_VERBOSE"):
+            for m in messages:
+                print(f"  [{m['type']}] {m['message']}", file=sys.stderr)
+        costs = telemetry.project_costs(projects_dir / SAMPLE_PROJECT)
+
+    failed = [s for s in statuses if s >= 400] or [m for m in messages if m.get("type") == "error"
+                                                      and m["message"].startswith("❌")]
+    by_provider = costs["by_provider"]
+    return {
+        "ok": not failed,
+        "error": (str(failed[0].get("message") if isinstance(failed[0], dict) else f"HTTP {failed[0]}")[:200]
+                  if failed else None),
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime - usage_before.ru_utime - usage_before.ru_stime, 3),
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        "peak_rss_mb": round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "provider_calls": costs["total"]["calls"],
+        "provider_seconds": round(costs["total"]["latency_seconds"], 3),
+        "calls_by_provider": {name: b["calls"] for name, b in by_provider.items()},
+        "images": costs["total"]["images"],
+        "tts_characters": costs["total"]["characters"],
+    }
+
+
+# =============================================================================
+# DRIVER
+# =============================================================================
+
+def measure(stage, latency_scale):
+    """Run a stage in a fresh interpreter and parse its JSON result."""
+    env = dict(os.environ)
+    env.pop("PROVIDER_CASSETTE_DIR", None)
+    proc = subprocess.run(
+        [sys.executable, __file__, "--worker", stage, "--latency-scale", str(latency_scale)],
+        capture_output=True, text=True, env=env, timeout=STAGE_TIMEOUT + 120,
+    )
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    tail = (proc.stderr or proc.stdout).strip().splitlines()[-5:]
+    return {"ok": False, "error": " | ".join(tail)[:300] or f"exit {proc.returncode}"}
+
+
+def compare(stage, result, baseline, thresholds):
+    """Metrics of one stage that regressed past the thresholds."""
+    reference = (baseline.get("stages") or {}).get(stage)
+    if not reference or not result.get("ok"):
+        return []
+    regressions = []
+    for metric, threshold in thresholds.items():
+        if metric not in reference or metric not in result:
+            continue
+        limit = reference[metric] * (1 + threshold)
+        if result[metric] > limit and result[metric] - reference[metric] > ABSOLUTE_SLACK.get(metric, 0):
+            regressions.append(f"{metric} {reference[metric]} → {result[metric]} (limit {limit:.2f})")
+    return regressions
+
+
+def _delta(now, then):
+    if then in (None, 0) or now is None:
+        return ""
+    change = (now - then) / then * 100
+    return f"{change:+.0f}%"
+
+
+def print_report(results, baseline):
+    reference = baseline.get("stages") or {}
+    print(f"\n{'stage':<11} {'wall s':>8} {'Δ':>6} {'cpu s':>7} {'Δ':>6} {'rss MB':>7} {'calls':>6} {'images':>6}  status")
+    print("─" * 78)
+    for stage, result in results.items():
+        if not result.get("ok"):
+            print(f"{stage:<11} {'—':>8} {'':>6} {'—':>7} {'':>6} {'—':>7} {'—':>6} {'—':>6}  ❌ {result.get('error')}")
+            continue
+        ref = reference.get(stage, {})
+        print(f"{stage:<11} {result['wall_seconds']:>8.2f} {_delta(result['wall_seconds'], ref.get('wall_seconds')):>6} "
+              f"{result['cpu_seconds']:>7.2f} {_delta(result['cpu_seconds'], ref.get('cpu_seconds')):>6} "
+              f"{result['peak_rss_mb']:>7.1f} {result['provider_calls']:>6} {result['images']:>6}  "
+              + ("⚠️ " + "; ".join(result["regressions"]) if result.get("regressions") else "✅"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--latency-scale", type=float, default=None,
+                        help=f"Modelled provider latency multiplier (default: baseline's, else {DEFAULT_LATENCY_SCALE})")
+    parser.add_argument("--update-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--worker", choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_stage(args.worker, args.latency_scale if args.latency_scale is not None else DEFAULT_LATENCY_SCALE)
+        print("BENCH_RESULT " + json.dumps(result))
+        return 0
+
+    baseline = {}
+    if BASELINE_PATH.exists():
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    latency_scale = args.latency_scale if args.latency_scale is not None else baseline.get(
+        "latency_scale", DEFAULT_LATENCY_SCALE)
+    if baseline and latency_scale != baseline.get("latency_scale"):
+        print(f"[Bench] latency scale {latency_scale} differs from the baseline's "
+              f"{baseline.get('latency_scale')} — wall times are not comparable")
+    thresholds = {**DEFAULT_THRESHOLDS, **baseline.get("thresholds", {})}
+
+    results = {}
+    for stage in args.stages:
+        print(f"[Bench] {stage}...", flush=True)
+        result = measure(stage, latency_scale)
+        result["regressions"] = compare(stage, result, baseline, thresholds)
+        results[stage] = result
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, baseline)
+
+    if args.update_baseline:
+        stages = dict(baseline.get("stages") or {})
+        for stage, result in results.items():
+            if result.get("ok"):
+                stages[stage] = {k: v for k, v in result.items() if k not in ("ok", "error", "regressions")}
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({
+                "latency_scale": latency_scale,
+                "thresholds": thresholds,
+                "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": os.cpu_count()},
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "stages": stages,
+            }, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n[Bench] Baseline written to {BASELINE_PATH.relative_to(ROOT)}")
+        return 0
+
+    failed = [s for s, r in results.items() if not r.get("ok")]
+    regressed = [s for s, r in results.items() if r.get("regressions")]
+    if failed or regressed:
+        print(f"\n[Bench] {len(regressed)} regressed, {len(failed)} failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
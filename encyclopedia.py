@@ -0,0 +1,269 @@
+"""
+The Last Shelter — Survival Encyclopedia Index
+
+Keeps resources/encyclopedia/index.json next to the guide files:
+
+    {"version": 1, "entries": {"<filename>.md": {"topic", "aliases", "sha1", "updated_at"}}}
+
+so auto-research can tell which topics are already covered before it spends
+a Pro call on them. Topics are compared on their stemmed terms
+(research_index.tokenize), which folds the audit's near-duplicates
+("Carving a saddle notch into a log" / "Carving saddle notches in logs")
+onto one guide. Only rewordings fold: apart from generic filler
+("construction", "walls", "technique", ...) one topic's terms must contain
+the other's, so "…mortise joint into the sill log" and "…tenon joint on the
+sill log" stay two guides however much boilerplate they share.
+
+Guide filenames are a readable slug plus a hash of the normalized topic:
+
+    carving_a_saddle_notch_into_a_log_for_log_cabin-3f9c2a1e.md
+
+so the same topic always lands in the same file and two long topics that
+share a prefix never overwrite each other. The index is updated one entry
+at a time as guides are written; files that predate it are picked up with
+their first heading as the topic.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+import research_index
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+ENCYCLOPEDIA_DIR = Path(__file__).parent / "resources" / "encyclopedia"
+INDEX_FILENAME = "index.json"
+INDEX_VERSION = 1
+
+SLUG_CHARS = 48
+HASH_CHARS = 8
+# Share of stemmed terms (Jaccard) two topics need in common to count as one
+# (and neither may have a non-filler term the other lacks — see same_topic())
+TOPIC_SIMILARITY = 0.6
+# Generic words two wordings of one technique may differ by
+FILLER_WORDS = ("build building construction make making technique method process step steps guide "
+                "proper basic simple large scale small wall walls structure")
+
+_HEADING_RE = re.compile(r"^#+\s*(.+?)\s*$", re.MULTILINE)
+# "Technical Guide for AI Video Generation: Building a Log Cabin" -> "Building a Log Cabin"
+_GUIDE_PREFIX_RE = re.compile(r"^technical guide[^:]*:\s*", re.IGNORECASE)
+
+_lock = threading.Lock()
+
+
+# =============================================================================
+# TOPICS
+# =============================================================================
+
+def normalize_topic(topic):
+    return re.sub(r"[^a-z0-9]+", " ", str(topic).lower()).strip()
+
+
+def topic_terms(topic):
+    # tokenize() leaves short plurals alone ("logs"); topics are short, so fold them here
+    return frozenset(t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t
+                     for t in research_index.tokenize(str(topic)))
+
+
+_FILLER_TERMS = topic_terms(FILLER_WORDS)
+
+
+def similarity(a, b):
+    """Jaccard overlap of two topics' stemmed terms (0-1)."""
+    terms_a, terms_b = topic_terms(a), topic_terms(b)
+    if not terms_a or not terms_b:
+        return 1.0 if normalize_topic(a) == normalize_topic(b) else 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+def same_topic(a, b, threshold=TOPIC_SIMILARITY):
+    """
+    True when b is a rewording of a: similar enough, and apart from filler
+    every term of one topic is in the other. A content term on each side
+    (mortise / tenon, cedar / oak) means a different technique, not
+    different wording.
+    """
+    if normalize_topic(a) == normalize_topic(b):
+        return True
+    terms_a, terms_b = topic_terms(a) - _FILLER_TERMS, topic_terms(b) - _FILLER_TERMS
+    if not (terms_a <= terms_b or terms_b <= terms_a):
+        return False
+    return similarity(a, b) >= threshold
+
+
+def topic_filename(topic):
+    """Stable guide filename: readable slug + hash of the normalized topic."""
+    normalized = normalize_topic(topic)
+    slug = re.sub(r"[^a-z0-9]+", "_", normalized)[:SLUG_CHARS].strip("_") or "topic"
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:HASH_CHARS]
+    return f"{slug}-{digest}.md"
+
+
+def _heading_topic(path):
+    """Topic of a guide written before the index existed: its first heading, else its filename."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            match = _HEADING_RE.search(f.read(2000))
+    except OSError:
+        match = None
+    topic = _GUIDE_PREFIX_RE.sub("", match.group(1)).strip(" *") if match else ""
+    return topic or path.stem.replace("_", " ")
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+def _index_path():
+    return ENCYCLOPEDIA_DIR / INDEX_FILENAME
+
+
+def _read_index():
+    try:
+        with open(_index_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION:
+            return data.get("entries", {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+
+def _write_index(entries):
+    ENCYCLOPEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = ENCYCLOPEDIA_DIR / f".{INDEX_FILENAME}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "entries": dict(sorted(entries.items()))}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, _index_path())
+
+
+def load_index():
+    """
+    Index entries keyed by filename, reconciled with the guides on disk.
+
+    Guides without an entry are added (topic from their first heading) and
+    entries whose file is gone are dropped; the index is rewritten only when
+    something changed.
+    """
+    with _lock:
+        entries = _read_index()
+        files = {p.name: p for p in ENCYCLOPEDIA_DIR.glob("*.md")} if ENCYCLOPEDIA_DIR.exists() else {}
+        changed = False
+        for name in [n for n in entries if n not in files]:
+            del entries[name]
+            changed = True
+        for name, path in files.items():
+            if name not in entries:
+                entries[name] = {"topic": _heading_topic(path), "aliases": [], "sha1": None,
+                                 "updated_at": round(path.stat().st_mtime, 3)}
+                changed = True
+        if changed and files:
+            _write_index(entries)
+        return entries
+
+
+def best_match(topic, entries, threshold=TOPIC_SIMILARITY):
+    """(filename, score) of the closest entry that topic is a rewording of (its topic or any alias), or (None, 0.0)."""
+    best, best_score = None, 0.0
+    for name, entry in entries.items():
+        for known in [entry.get("topic", "")] + list(entry.get("aliases", [])):
+            if not same_topic(topic, known, threshold):
+                continue
+            score = similarity(topic, known)
+            if score > best_score:
+                best, best_score = name, score
+    return best, best_score
+
+
+def cluster_topics(topics, entries=None, threshold=TOPIC_SIMILARITY):
+    """
+    Group near-duplicate topics, and set aside the ones the encyclopedia already covers.
+
+    Returns:
+        (clusters, covered):
+        clusters — [{"topic", "aliases"}] to research, in first-appearance
+                   order; the first topic of a group names it, the rest are aliases
+        covered  — [{"topic", "filename", "score"}] matched to an existing guide
+    """
+    entries = load_index() if entries is None else entries
+    clusters, covered = [], []
+    for topic in topics:
+        topic = str(topic).strip()
+        if not topic:
+            continue
+        filename, score = best_match(topic, entries, threshold)
+        if filename:
+            covered.append({"topic": topic, "filename": filename, "score": round(score, 2)})
+            continue
+        for cluster in clusters:
+            if any(same_topic(topic, t, threshold) for t in [cluster["topic"]] + cluster["aliases"]):
+                if normalize_topic(topic) not in map(normalize_topic, [cluster["topic"]] + cluster["aliases"]):
+                    cluster["aliases"].append(topic)
+                break
+        else:
+            clusters.append({"topic": topic, "aliases": []})
+    return clusters, covered
+
+
+def write_guide(topic, content, aliases=()):
+    """Write a guide to its stable filename and record it in the index. Returns the filename."""
+    filename = topic_filename(topic)
+    data = content.encode("utf-8")
+    with _lock:
+        ENCYCLOPEDIA_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = ENCYCLOPEDIA_DIR / f".{filename}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, ENCYCLOPEDIA_DIR / filename)
+        entries = _read_index()
+        entries[filename] = {
+            "topic": topic,
+            "aliases": sorted(set(aliases) - {topic}),
+            "sha1": hashlib.sha1(data).hexdigest(),
+            "updated_at": round(time.time(), 3),
+        }
+        _write_index(entries)
+    return filename
+
+
+def load_guides():
+    """{topic: markdown} for every guide in the encyclopedia."""
+    guides = {}
+    for name, entry in load_index().items():
+        try:
+            with open(ENCYCLOPEDIA_DIR / name, "r", encoding="utf-8") as f:
+                content = f.read()
+        except OSError:
+            continue
+        topic = entry.get("topic") or Path(name).stem
+        guides[topic if topic not in guides else Path(name).stem] = content
+    return guides
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import sys
+
+    entries = load_index()
+    print(f"{len(entries)} guides indexed in {_index_path()}")
+    topics = sys.argv[1:] or [
+        "Carving a saddle notch into a log for log cabin walls",
+        "Carving saddle notches in logs",
+        "Building a smokehouse from split cedar",
+        "Building a cedar smokehouse",
+        "Starting a survival fire",
+    ]
+    # Regression: distinct techniques that share boilerplate must not fold
+    for pair in (["Carving a large-scale mortise joint into the sill log", "Carving a large-scale tenon joint on the sill log"],
+                 ["Splitting cedar shakes for the roof", "Splitting oak shakes for the roof"]):
+        assert len(cluster_topics(pair, entries={})[0]) == 2, pair
+    clusters, covered = cluster_topics(topics, entries)
+    for c in covered:
+        print(f"  covered   {c['topic']!r} → {c['filename']} ({c['score']})")
+    for c in clusters:
+        print(f"  research  {c['topic']!r} aliases={c['aliases']} → {topic_filename(c['topic'])}")
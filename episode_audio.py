@@ -0,0 +1,436 @@
+"""
+The Last Shelter — Episode Narration Track
+
+Joins the per-segment narration MP3s into one continuous episode track in
+generate_all_audio order (intro → phase + break pairs → close):
+
+1. Segment files are resolved from both audio manifests — generate_all_audio
+   (intro.mp3, phase_N.mp3, break_N.mp3, close.mp3) and the Voice tab
+   (chapter_N.mp3) — newest file wins
+2. MP3 frames are copied straight through (ID3 tags and Xing/Info headers
+   dropped); gaps between segments are synthesized silent frames, so
+   nothing is decoded or re-encoded. Mismatched formats fall back to one
+   ffmpeg encode pass
+3. Loudness is measured once (EBU R128 via ffmpeg) and written as
+   ReplayGain tags, so players and editors can normalize without touching
+   the audio
+4. A cue sheet records where every segment starts
+
+Output (audio/):
+    episode_narration.mp3     # the track
+    episode_narration.json    # cues, gaps, loudness, cache key
+    episode_narration.cue     # CD-style cue sheet for editors
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import subprocess
+
+from audio_utils import parse_frame_header, scan_mp3_file, FFMPEG_BIN
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+EPISODE_TRACK_FILE = "episode_narration.mp3"
+EPISODE_META_FILE = "episode_narration.json"
+EPISODE_CUE_FILE = "episode_narration.cue"
+
+# Silence inserted before a segment, by segment type (seconds)
+DEFAULT_GAP_SECONDS = 0.75
+SEGMENT_GAPS = {"break": 1.5, "close": 1.5}
+
+# Narration loudness target for the editor's normalize pass; ReplayGain tags
+# are relative to the ReplayGain 2.0 reference
+NARRATION_TARGET_LUFS = -16.0
+REPLAYGAIN_REFERENCE_LUFS = -18.0
+
+# Fallback encode when segments don't share one MP3 format
+FALLBACK_ENCODE_ARGS = ["-c:a", "libmp3lame", "-b:a", "128k"]
+
+COPY_BLOCK_SIZE = 256 * 1024
+
+# Bump to invalidate cached episode tracks
+EPISODE_TRACK_VERSION = 1
+
+
+# =============================================================================
+# SEGMENT LAYOUT
+# =============================================================================
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def episode_segments(narration, audio_dir):
+    """
+    Episode segments in generate_all_audio order, each with the MP3 that voices it.
+
+    Returns:
+        List of dicts: id (production block name), type, title, path (None if not generated)
+    """
+    voice_tab = _load_json(os.path.join(audio_dir, "manifest.json"))
+    pipeline = {s.get("filename") for s in _load_json(os.path.join(audio_dir, "audio_manifest.json")).get("segments", [])}
+
+    def pick(*candidates):
+        """Newest existing file among (filename, listed-in-a-manifest) candidates."""
+        existing = [os.path.join(audio_dir, name) for name, listed in candidates
+                    if name and listed and os.path.exists(os.path.join(audio_dir, name))]
+        return max(existing, key=os.path.getmtime) if existing else None
+
+    def voice_tab_file(segment_id):
+        return (voice_tab.get(segment_id) or {}).get("filename")
+
+    segments = []
+    intro = narration.get("intro") or {}
+    if intro.get("text"):
+        segments.append({"id": "intro", "type": "intro", "title": "Intro",
+                         "path": pick(("intro.mp3", True))})
+
+    breaks = narration.get("breaks", [])
+    for i, phase in enumerate(narration.get("phases", [])):
+        if phase.get("narration"):
+            segments.append({
+                "id": f"chapter_{i + 1}", "type": "narration",
+                "title": phase.get("phase_name") or f"Chapter {i + 1}",
+                "path": pick((f"phase_{i + 1}.mp3", True),
+                             (voice_tab_file(f"chapter_{i}") or f"chapter_{i}.mp3", True)),
+            })
+        # break_N.mp3 means the Nth break to generate_all_audio but the (N+1)th to the
+        # Voice tab, so breaks are only taken from the manifest that wrote them
+        if i < len(breaks) and breaks[i].get("text"):
+            segments.append({
+                "id": f"break_{i + 1}", "type": "break",
+                "title": breaks[i].get("title") or f"Break {i + 1}",
+                "path": pick((f"break_{i + 1}.mp3", f"break_{i + 1}.mp3" in pipeline),
+                             (voice_tab_file(f"break_{i}"), True)),
+            })
+
+    close = narration.get("close") or {}
+    if close.get("text"):
+        segments.append({"id": "close", "type": "close", "title": "Close",
+                         "path": pick(("close.mp3", True))})
+    return segments
+
+
+def segment_audio_path(narration, audio_dir, block_id):
+    """MP3 voicing one production block (chapter_N, break_N, intro, close), or None."""
+    for segment in episode_segments(narration, audio_dir):
+        if segment["id"] == block_id:
+            return segment["path"]
+    return None
+
+
+# =============================================================================
+# FRAME HELPERS
+# =============================================================================
+
+def _first_frame_header(path, offset):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(4)
+
+
+def _format_key(header):
+    """What has to match for frames from two files to share one stream."""
+    info = parse_frame_header(header)
+    return (info["version"], info["layer"], info["sample_rate"], info["channels"]) if info else None
+
+
+def silent_frame(header):
+    """
+    A Layer III frame that decodes to silence, in the same format as header.
+
+    All-zero side info means main_data_begin = 0 and part2_3_length = 0 for
+    every granule — no bit reservoir, no coded samples.
+    """
+    header = bytearray(header)
+    header[1] |= 0x01      # no CRC
+    header[2] &= ~0x02     # no padding slot
+    info = parse_frame_header(bytes(header))
+    return bytes(header) + bytes(info["frame_length"] - 4), info["samples"]
+
+
+def _copy_range(src_path, start, end, out):
+    with open(src_path, "rb") as src:
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = src.read(min(COPY_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            out.write(block)
+            remaining -= len(block)
+
+
+# =============================================================================
+# LOUDNESS + TAGS
+# =============================================================================
+
+def measure_loudness(path):
+    """
+    Integrated loudness and true peak via ffmpeg's ebur128 filter.
+
+    Returns:
+        dict with integrated_lufs, true_peak_dbfs — or None if ffmpeg is unavailable
+    """
+    try:
+        result = subprocess.run(
+            [FFMPEG_BIN, "-hide_banner", "-nostats", "-i", path,
+             "-filter_complex", "ebur128=peak=true", "-f", "null", "-"],
+            capture_output=True, text=True,
+        )
+    except FileNotFoundError:
+        return None
+    summary = result.stderr.rsplit("Summary:", 1)[-1]
+    integrated = re.search(r"I:\s+(-?[\d.]+|-inf) LUFS", summary)
+    peak = re.search(r"Peak:\s+(-?[\d.]+|-inf) dBFS", summary)
+    if result.returncode != 0 or not integrated or integrated.group(1) == "-inf":
+        return None
+    return {
+        "integrated_lufs": float(integrated.group(1)),
+        "true_peak_dbfs": float(peak.group(1)) if peak and peak.group(1) != "-inf" else None,
+    }
+
+
+def _synchsafe(n):
+    return bytes([(n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F])
+
+
+def _id3_text_frame(frame_id, payload):
+    body = b"\x03" + payload.encode("utf-8")           # UTF-8
+    return frame_id.encode("ascii") + _synchsafe(len(body)) + b"\x00\x00" + body
+
+
+def id3_tag(title, loudness):
+    """ID3v2.4 tag with the title and ReplayGain 2.0 track gain/peak."""
+    frames = _id3_text_frame("TIT2", title)
+    if loudness:
+        gain = REPLAYGAIN_REFERENCE_LUFS - loudness["integrated_lufs"]
+        frames += _id3_text_frame("TXXX", f"REPLAYGAIN_TRACK_GAIN\x00{gain:+.2f} dB")
+        if loudness.get("true_peak_dbfs") is not None:
+            peak = 10 ** (loudness["true_peak_dbfs"] / 20)
+            frames += _id3_text_frame("TXXX", f"REPLAYGAIN_TRACK_PEAK\x00{peak:.6f}")
+    return b"ID3\x04\x00\x00" + _synchsafe(len(frames)) + frames
+
+
+def _cue_time(seconds):
+    """Cue sheet MM:SS:FF (75 frames per second)."""
+    frames = int(round(seconds * 75))
+    return f"{frames // 4500:02d}:{frames // 75 % 60:02d}:{frames % 75:02d}"
+
+
+def write_cue_sheet(path, title, cues):
+    lines = [f'TITLE "{title}"', f'FILE "{EPISODE_TRACK_FILE}" MP3']
+    for number, cue in enumerate(cues, 1):
+        lines += [
+            f"  TRACK {number:02d} AUDIO",
+            f'    TITLE "{cue["title"].replace(chr(34), chr(39))}"',
+            f"    INDEX 01 {_cue_time(cue['start_seconds'])}",
+        ]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def _gap_for(segment_type, gap_seconds, gaps):
+    if gaps and segment_type in gaps:
+        return gaps[segment_type]
+    if gap_seconds is not None:
+        return gap_seconds
+    return SEGMENT_GAPS.get(segment_type, DEFAULT_GAP_SECONDS)
+
+
+def _cache_key(parts, gap_seconds, gaps):
+    digest = hashlib.sha256(json.dumps(
+        [EPISODE_TRACK_VERSION, gap_seconds, gaps or {}, SEGMENT_GAPS, DEFAULT_GAP_SECONDS], sort_keys=True
+    ).encode("utf-8"))
+    for part in parts:
+        stat = os.stat(part["path"])
+        digest.update(f"|{part['id']}:{os.path.basename(part['path'])}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _concat_frames(parts, gaps_before, out):
+    """
+    Stream every part's audio frames into out, with silent frames for the gaps.
+
+    Returns:
+        Cue list with exact sample-based start/end times
+    """
+    silence, silence_samples = silent_frame(parts[0]["header"])
+    sample_rate = parts[0]["scan"]["sample_rate"]
+    position = 0            # samples written so far
+    cues = []
+    for part, gap in zip(parts, gaps_before):
+        for _ in range(int(round(gap * sample_rate / silence_samples))):
+            out.write(silence)
+            position += silence_samples
+        scan = part["scan"]
+        _copy_range(part["path"], scan["audio_start"], scan["audio_end"], out)
+        start = position + scan["encoder_delay"]
+        cues.append({
+            "start_seconds": round(start / sample_rate, 3),
+            "end_seconds": round((start + scan["samples"]) / sample_rate, 3),
+        })
+        position += scan["frames"] * silence_samples
+    return cues
+
+
+def _concat_encoded(parts, gaps_before, output_path):
+    """Fallback: decode everything, conform to the first part's format, encode once."""
+    first = parse_frame_header(parts[0]["header"])
+    rate = first["sample_rate"]
+    layout = "mono" if first["channels"] == 1 else "stereo"
+
+    args = [FFMPEG_BIN, "-y", "-hide_banner", "-loglevel", "error"]
+    graph, labels, cues, position = [], "", [], 0.0
+    for i, (part, gap) in enumerate(zip(parts, gaps_before)):
+        args += ["-i", part["path"]]
+        if gap > 0:
+            graph.append(f"anullsrc=r={rate}:cl={layout},atrim=duration={gap}[s{i}]")
+            labels += f"[s{i}]"
+            position += gap
+        graph.append(f"[{i}:a:0]aresample={rate},aformat=channel_layouts={layout}[a{i}]")
+        labels += f"[a{i}]"
+        duration = part["scan"]["duration_seconds"]
+        cues.append({"start_seconds": round(position, 3), "end_seconds": round(position + duration, 3)})
+        position += duration
+    graph.append(f"{labels}concat=n={labels.count('[')}:v=0:a=1[out]")
+    args += ["-filter_complex", ";".join(graph), "-map", "[out]"] + FALLBACK_ENCODE_ARGS + ["-f", "mp3", output_path]
+
+    try:
+        result = subprocess.run(args, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise RuntimeError("Segments use different MP3 formats and ffmpeg is not installed to conform them")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+    return cues
+
+
+def build_episode_track(narration, audio_dir, title="", gap_seconds=None, gaps=None, force=False,
+                        progress_callback=None):
+    """
+    Build audio/episode_narration.mp3 (+ .json, .cue) from the segment MP3s.
+
+    Args:
+        narration: Narration dict (intro, phases, breaks, close)
+        audio_dir: Project audio directory
+        title: Track title for the tags and cue sheet
+        gap_seconds: Silence before every segment (default: per type, SEGMENT_GAPS)
+        gaps: Per-type overrides, e.g. {"break": 2.0}
+        force: Rebuild even if no segment changed
+        progress_callback: Optional callback(message, type)
+
+    Returns:
+        episode_narration.json contents, plus 'cached': True when nothing was rebuilt
+    """
+    def log(message, msg_type="info"):
+        print(f"[Episode Audio] {message}")
+        if progress_callback:
+            progress_callback(message, msg_type)
+
+    segments = episode_segments(narration, audio_dir)
+    parts = [s for s in segments if s["path"]]
+    missing = [s["id"] for s in segments if not s["path"]]
+    if not parts:
+        raise ValueError("No narration audio generated yet")
+    if missing:
+        log(f"⚠️ No audio for {', '.join(missing)} — leaving them out", "warning")
+
+    meta_path = os.path.join(audio_dir, EPISODE_META_FILE)
+    output_path = os.path.join(audio_dir, EPISODE_TRACK_FILE)
+    cache_key = _cache_key(parts, gap_seconds, gaps)
+    previous = _load_json(meta_path)
+    if not force and previous.get("cache_key") == cache_key and os.path.exists(output_path):
+        log("♻️ Episode track unchanged — reusing it", "success")
+        return dict(previous, cached=True)
+
+    start_time = time.time()
+    for part in parts:
+        part["scan"] = scan_mp3_file(part["path"])
+        part["header"] = _first_frame_header(part["path"], part["scan"]["audio_start"])
+    gaps_before = [0.0] + [_gap_for(p["type"], gap_seconds, gaps) for p in parts[1:]]
+    formats = {_format_key(p["header"]) for p in parts}
+    copyable = len(formats) == 1 and None not in formats
+
+    log(f"🎧 Joining {len(parts)} segments "
+        f"({'frame copy, no re-encode' if copyable else 'formats differ — one encode pass'})")
+
+    body_path = output_path + ".body"
+    tmp_path = output_path + ".tmp"
+    try:
+        if copyable:
+            with open(body_path, "wb") as out:
+                cues = _concat_frames(parts, gaps_before, out)
+        else:
+            cues = _concat_encoded(parts, gaps_before, body_path)
+
+        loudness = measure_loudness(body_path)
+        if loudness:
+            loudness["target_lufs"] = NARRATION_TARGET_LUFS
+            loudness["gain_to_target_db"] = round(NARRATION_TARGET_LUFS - loudness["integrated_lufs"], 2)
+            log(f"  🔈 {loudness['integrated_lufs']} LUFS integrated "
+                f"({loudness['gain_to_target_db']:+} dB to {NARRATION_TARGET_LUFS} LUFS)")
+        else:
+            log("  ⚠️ Loudness not measured (ffmpeg unavailable)", "warning")
+
+        # Tag goes first, so the body is written once and prefixed afterwards
+        with open(tmp_path, "wb") as out:
+            out.write(id3_tag(title or "Episode narration", loudness))
+            _copy_range(body_path, 0, os.path.getsize(body_path), out)
+        os.replace(tmp_path, output_path)
+    finally:
+        for leftover in (body_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    for cue, part, gap in zip(cues, parts, gaps_before):
+        cue.update(id=part["id"], type=part["type"], title=part["title"],
+                   file=os.path.basename(part["path"]), gap_before_seconds=gap)
+
+    meta = {
+        "cache_key": cache_key,
+        "file": EPISODE_TRACK_FILE,
+        "file_size": os.path.getsize(output_path),
+        "mode": "frame_copy" if copyable else "encode",
+        "duration_seconds": cues[-1]["end_seconds"] if cues else 0,
+        "cues": cues,
+        "missing_segments": missing,
+        "loudness": loudness,
+        "built_at": time.time(),
+        "build_seconds": round(time.time() - start_time, 2),
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    write_cue_sheet(os.path.join(audio_dir, EPISODE_CUE_FILE), title or "Episode narration", cues)
+
+    total = meta["duration_seconds"]
+    log(f"✅ Episode track: {len(cues)} segments, {int(total // 60)}m {int(total % 60)}s "
+        f"({meta['build_seconds']}s)", "success")
+    return dict(meta, cached=False)
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python episode_audio.py <project_dir> [--force]")
+        sys.exit(1)
+    project_dir = sys.argv[1]
+    narration = _load_json(os.path.join(project_dir, "narration.json"))
+    result = build_episode_track(narration, os.path.join(project_dir, "audio"), force="--force" in sys.argv)
+    print(json.dumps({k: v for k, v in result.items() if k != "cues"}, indent=2))
+    for cue in result["cues"]:
+        print(f"  {_cue_time(cue['start_seconds'])}  {cue['id']:<12} {cue['title']}")
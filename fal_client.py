@@ -3,14 +3,23 @@ fal_client.py — fal.ai API integration for Kling video generation.
 
 Uses the REST API directly (no SDK dependency).
 Queue-based: submit → poll → result.
+All calls share one keep-alive session (provider_clients.http());
+check_status_async() polls on provider_loop via provider_clients.http_async().
 """
 
 import os
+import json
 import time
 import base64
-import requests
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
+import provider_clients
+import rate_limiter
+import webhooks
+
 FAL_API_KEY = os.environ.get("FAL_KEY", "")
 FAL_BASE_URL = "https://queue.fal.run"
 
@@ -43,9 +52,116 @@ def image_to_data_uri(image_path):
     return f"data:{mime};base64,{b64}"
 
 
+# =============================================================================
+# UPLOAD CACHE — content hash -> fal CDN URL, persisted across runs
+# =============================================================================
+
+BASE_DIR = Path(__file__).parent
+FAL_UPLOAD_CACHE_PATH = Path(os.environ.get("FAL_UPLOAD_CACHE", BASE_DIR / "cache" / "fal_uploads.json"))
+# fal storage keeps uploads for a limited time; re-upload well before then
+FAL_UPLOAD_TTL = 7 * 24 * 3600
+# Cached URLs older than this get a HEAD check before reuse
+FAL_UPLOAD_REVALIDATE_AFTER = 6 * 3600
+
+_upload_lock = threading.Lock()
+_upload_cache = None          # sha256 -> {url, size, uploaded_at, expires_at, validated_at}
+_uploads_in_flight = {}       # sha256 -> Future shared by concurrent callers
+_hash_memo = {}               # (path, size, mtime_ns) -> sha256
+
+
+def _file_sha256(path):
+    """Streaming sha256 of a file, memoized on (path, size, mtime)."""
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _hash_memo:
+        return _hash_memo[memo_key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def _load_upload_cache():
+    global _upload_cache
+    if _upload_cache is None:
+        _upload_cache = {}
+        if FAL_UPLOAD_CACHE_PATH.exists():
+            try:
+                with open(FAL_UPLOAD_CACHE_PATH) as f:
+                    _upload_cache = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                _upload_cache = {}
+    return _upload_cache
+
+
+def _save_upload_cache():
+    """Persist the cache (caller holds _upload_lock)."""
+    FAL_UPLOAD_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    live = {k: v for k, v in _upload_cache.items() if v.get("expires_at", 0) > now}
+    tmp = FAL_UPLOAD_CACHE_PATH.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(live, f, indent=2)
+    os.replace(tmp, FAL_UPLOAD_CACHE_PATH)
+
+
+def _cached_upload_url(digest):
+    """Return a still-valid cached URL for this content, re-validating stale entries."""
+    with _upload_lock:
+        entry = _load_upload_cache().get(digest)
+    if not entry:
+        return None
+    now = time.time()
+    if entry.get("expires_at", 0) <= now:
+        return None
+    if now - entry.get("validated_at", 0) > FAL_UPLOAD_REVALIDATE_AFTER:
+        try:
+            alive = provider_clients.http().head(entry["url"], timeout=10, allow_redirects=True).status_code == 200
+        except Exception:
+            alive = False
+        with _upload_lock:
+            if alive:
+                entry["validated_at"] = now
+            else:
+                _upload_cache.pop(digest, None)
+            _save_upload_cache()
+        if not alive:
+            return None
+    return entry["url"]
+
+
+def _upload_file_to_fal(path, content_type):
+    """Two-step fal storage upload, streaming the file body from disk. Returns the CDN URL."""
+    initiate_res = provider_clients.http().post(
+        "https://rest.alpha.fal.ai/storage/upload/initiate",
+        headers=_headers(),
+        json={"file_name": path.name, "content_type": content_type}
+    )
+    if initiate_res.status_code != 200:
+        raise Exception(f"fal storage initiate failed ({initiate_res.status_code}): {initiate_res.text[:200]}")
+    
+    data = initiate_res.json()
+    with open(path, "rb") as f:
+        upload_res = provider_clients.http().put(
+            data.get("upload_url"),
+            headers={"Content-Type": content_type, "Content-Length": str(path.stat().st_size)},
+            data=f,
+            timeout=(10, 300),
+        )
+    if upload_res.status_code not in (200, 201):
+        raise Exception(f"fal storage upload failed ({upload_res.status_code}): {upload_res.text[:200]}")
+    return data.get("file_url")
+
+
 def upload_image_to_fal(image_path):
     """Upload a local image to fal.ai CDN and return a public URL.
     
+    Each distinct file content is uploaded once: the URL is cached by sha256
+    (persisted in FAL_UPLOAD_CACHE_PATH) and concurrent calls for the same
+    content wait on a single upload.
+    
     Falls back to data URI if upload fails.
     """
     path = Path(image_path)
@@ -56,34 +172,45 @@ def upload_image_to_fal(image_path):
     mime_map = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
     content_type = mime_map.get(suffix, "application/octet-stream")
     
+    digest = _file_sha256(path)
+    url = _cached_upload_url(digest)
+    if url:
+        return url
+    
+    # Coalesce: the first caller uploads, everyone else waits on its future
+    with _upload_lock:
+        future = _uploads_in_flight.get(digest)
+        owner = future is None
+        if owner:
+            future = Future()
+            _uploads_in_flight[digest] = future
+    
+    if not owner:
+        url = future.result()
+        return url or image_to_data_uri(image_path)
+    
+    url = None
     try:
-        # Step 1: Get upload URL
-        initiate_res = requests.post(
-            "https://rest.alpha.fal.ai/storage/upload/initiate",
-            headers=_headers(),
-            json={"file_name": path.name, "content_type": content_type}
-        )
-        
-        if initiate_res.status_code == 200:
-            data = initiate_res.json()
-            upload_url = data.get("upload_url")
-            file_url = data.get("file_url")
-            
-            # Step 2: Upload the file
-            with open(path, "rb") as f:
-                upload_res = requests.put(
-                    upload_url,
-                    headers={"Content-Type": content_type},
-                    data=f.read()
-                )
-            
-            if upload_res.status_code in (200, 201):
-                return file_url
+        url = _upload_file_to_fal(path, content_type)
+        now = time.time()
+        with _upload_lock:
+            _load_upload_cache()[digest] = {
+                "url": url,
+                "size": path.stat().st_size,
+                "uploaded_at": now,
+                "validated_at": now,
+                "expires_at": now + FAL_UPLOAD_TTL,
+            }
+            _save_upload_cache()
     except Exception as e:
         print(f"[fal_client] Upload failed, falling back to data URI: {e}")
+    finally:
+        with _upload_lock:
+            _uploads_in_flight.pop(digest, None)
+        future.set_result(url)
     
-    # Fallback: use data URI
-    return image_to_data_uri(image_path)
+    # Fallback: use data URI (not cached — retried on the next call)
+    return url or image_to_data_uri(image_path)
 
 
 def submit_video_generation(
@@ -120,12 +247,41 @@ def submit_video_generation(
     if end_url:
         payload["end_image_url"] = end_url
     
-    response = requests.post(
-        f"{FAL_BASE_URL}/{KLING_I2V_ENDPOINT}",
-        headers=_headers(),
-        json=payload,
-        timeout=30,
-    )
+    return submit_request(KLING_I2V_ENDPOINT, payload)
+
+
+def submit_request(endpoint, payload, model_id=KLING_MODEL_ID, webhook_url=None):
+    """
+    Submit a payload to a fal.ai queue endpoint without waiting for it.
+    
+    Args:
+        webhook_url: fal POSTs the result here on completion (default: webhooks.webhook_url())
+    
+    Returns:
+        dict with 'request_id', 'status_url', 'response_url'
+    """
+    webhook_url = webhook_url or webhooks.webhook_url()
+    
+    def post():
+        response = provider_clients.http().post(
+            f"{FAL_BASE_URL}/{endpoint}",
+            headers=_headers(),
+            params={"fal_webhook": webhook_url} if webhook_url else None,
+            json=payload,
+            timeout=30,
+        )
+        if response.status_code == 429:
+            response.raise_for_status()
+        return response
+    
+    # A 429 means the request was not queued, so only that is safe to retry.
+    # Telemetry books the clip's seconds at submission (fal bills per second rendered).
+    def meter(response):
+        if response.status_code in (200, 201, 202):
+            return {"video_seconds": float(payload.get("duration") or 0)}
+        return {}
+    
+    response = rate_limiter.call("fal", post, retry_statuses=(429,), meter=meter)
     
     if response.status_code not in (200, 201, 202):
         raise Exception(f"fal.ai submit failed ({response.status_code}): {response.text[:500]}")
@@ -138,8 +294,8 @@ def submit_video_generation(
     return {
         "request_id": request_id,
         "status": "IN_QUEUE",
-        "status_url": result.get("status_url", f"{FAL_BASE_URL}/{KLING_MODEL_ID}/requests/{request_id}/status"),
-        "response_url": result.get("response_url", f"{FAL_BASE_URL}/{KLING_MODEL_ID}/requests/{request_id}"),
+        "status_url": result.get("status_url", f"{FAL_BASE_URL}/{model_id}/requests/{request_id}/status"),
+        "response_url": result.get("response_url", f"{FAL_BASE_URL}/{model_id}/requests/{request_id}"),
     }
 
 
@@ -151,7 +307,23 @@ def check_status(request_id, status_url=None):
         and optionally 'logs' and 'queue_position'
     """
     url = status_url or f"{FAL_BASE_URL}/{KLING_MODEL_ID}/requests/{request_id}/status"
-    response = requests.get(
+    response = provider_clients.http().get(
+        url,
+        headers=_headers(),
+        params={"logs": "1"},
+        timeout=15,
+    )
+    
+    if response.status_code != 200:
+        return {"status": "UNKNOWN", "error": response.text[:200]}
+    
+    return response.json()
+
+
+async def check_status_async(request_id, status_url=None):
+    """check_status() as a coroutine, so every due request in a batch is polled at once."""
+    url = status_url or f"{FAL_BASE_URL}/{KLING_MODEL_ID}/requests/{request_id}/status"
+    response = await provider_clients.http_async().get(
         url,
         headers=_headers(),
         params={"logs": "1"},
@@ -171,7 +343,7 @@ def get_result(request_id, response_url=None):
         dict with 'video': {'url': '...', 'file_size': ..., 'content_type': '...'}
     """
     url = response_url or f"{FAL_BASE_URL}/{KLING_MODEL_ID}/requests/{request_id}"
-    response = requests.get(
+    response = provider_clients.http().get(
         url,
         headers=_headers(),
         timeout=30,
@@ -187,8 +359,21 @@ def get_result(request_id, response_url=None):
     return data
 
 
+# Adaptive polling: start fast, back off while nothing changes, snap back on change
+POLL_MIN_INTERVAL = 3
+POLL_MAX_INTERVAL = 30
+POLL_BACKOFF = 1.5
+
+
+def next_poll_interval(interval, changed):
+    """Next poll delay given the current one and whether the status just changed."""
+    if changed or not interval:
+        return POLL_MIN_INTERVAL
+    return min(POLL_MAX_INTERVAL, interval * POLL_BACKOFF)
+
+
 def wait_for_completion(request_id, status_url=None, response_url=None,
-                        timeout=600, poll_interval=10, progress_callback=None):
+                        timeout=600, poll_interval=None, progress_callback=None):
     """Poll until the video generation is complete or timeout.
     
     Args:
@@ -196,7 +381,9 @@ def wait_for_completion(request_id, status_url=None, response_url=None,
         status_url: Direct status URL from submit response
         response_url: Direct response URL from submit response
         timeout: Max seconds to wait
-        poll_interval: Seconds between status checks
+        poll_interval: Fixed seconds between status checks (default: adaptive backoff
+                       between POLL_MIN_INTERVAL and POLL_MAX_INTERVAL). With
+                       FAL_WEBHOOK_URL set, polling starts only after WEBHOOK_POLL_FALLBACK.
         progress_callback: Optional callback(message, type)
         
     Returns:
@@ -204,12 +391,24 @@ def wait_for_completion(request_id, status_url=None, response_url=None,
     """
     start_time = time.time()
     last_status = ""
+    interval = 0
+    
+    # Completion webhook first; polling only once the fallback window has passed
+    if webhooks.enabled():
+        delivered = webhooks.wait_for(request_id, min(timeout, webhooks.WEBHOOK_POLL_FALLBACK))
+        if delivered:
+            if delivered["status"] == "COMPLETED":
+                return delivered["payload"]
+            raise Exception(f"Video generation FAILED: {delivered.get('error') or 'Unknown error'}")
+        if progress_callback:
+            progress_callback("⏳ No completion webhook yet — falling back to polling", "info")
     
     while time.time() - start_time < timeout:
         status_data = check_status(request_id, status_url=status_url)
         status = status_data.get("status", "UNKNOWN")
+        changed = status != last_status
         
-        if status != last_status:
+        if changed:
             last_status = status
             if progress_callback:
                 queue_pos = status_data.get("queue_position", "?")
@@ -225,23 +424,163 @@ def wait_for_completion(request_id, status_url=None, response_url=None,
             error = status_data.get("error", "Unknown error")
             raise Exception(f"Video generation {status}: {error}")
         
-        time.sleep(poll_interval)
+        interval = poll_interval or next_poll_interval(interval, changed)
+        time.sleep(interval)
     
     raise TimeoutError(f"Video generation timed out after {timeout}s (request: {request_id})")
 
 
-def download_video(video_url, save_path):
-    """Download a video from fal.ai CDN to local path."""
-    response = requests.get(video_url, stream=True, timeout=120)
-    response.raise_for_status()
+# =============================================================================
+# DOWNLOADS — .part file, Range resume, verification, atomic rename
+# =============================================================================
+
+DOWNLOAD_CHUNK = 1024 * 1024
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_TIMEOUT = (10, 60)         # (connect, per-read) — a stalled read resumes instead of hanging
+# Clips at least this large may be fetched as parallel byte ranges
+PARALLEL_DOWNLOAD_MIN_BYTES = 32 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    """Download failed verification or ran out of retries."""
+
+
+def _probe(video_url):
+    """HEAD the URL: (total size or None, server accepts byte ranges)."""
+    try:
+        head = provider_clients.http().head(video_url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+        size = int(head.headers.get("Content-Length", 0)) or None
+        return size, head.headers.get("Accept-Ranges", "").lower() == "bytes"
+    except Exception:
+        return None, False
+
+
+def _fetch_range(video_url, part_path, start, end=None):
+    """
+    Write bytes [start, end] of the URL into part_path at offset start.
     
-    path = Path(save_path)
-    path.parent.mkdir(parents=True, exist_ok=True)
+    Returns the number of bytes written. If the server ignores the Range
+    header on an open-ended resume, the part file is rewritten from zero.
+    """
+    headers = {}
+    if start or end is not None:
+        headers["Range"] = f"bytes={start}-" + ("" if end is None else str(end))
+    
+    written = 0
+    with provider_clients.http().get(video_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        if start and response.status_code != 206:
+            if end is not None:
+                raise DownloadError("Server does not honour byte ranges")
+            start = 0  # full body came back — start over
+            with open(part_path, "wb"):
+                pass
+        with open(part_path, "r+b" if os.path.exists(part_path) else "wb") as f:
+            f.seek(start)
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                f.write(chunk)
+                written += len(chunk)
+    return start + written
+
+
+def _download_sequential(video_url, part_path, total):
+    """Single-stream download resuming from whatever the .part file already holds."""
+    for attempt in range(DOWNLOAD_RETRIES):
+        have = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if total and have >= total:
+            return
+        try:
+            _fetch_range(video_url, part_path, have)
+            return
+        except DownloadError:
+            raise
+        except Exception as e:
+            have = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            print(f"[fal_client] Download interrupted at {have} bytes ({e}); resuming...")
+            time.sleep(min(30, 2 ** attempt))
+    raise DownloadError(f"Download failed after {DOWNLOAD_RETRIES} attempts: {video_url}")
+
+
+def _download_parallel(video_url, part_path, total, parts):
+    """Fetch fixed byte ranges concurrently into a preallocated .part file."""
+    ranges_path = part_path + ".ranges"
+    done = set()
+    if os.path.exists(ranges_path) and os.path.exists(part_path) and os.path.getsize(part_path) == total:
+        with open(ranges_path) as f:
+            done = {tuple(r) for r in json.load(f)}
+    else:
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+    
+    step = -(-total // parts)
+    todo = [(start, min(total, start + step) - 1) for start in range(0, total, step)]
+    todo = [r for r in todo if r not in done]
+    lock = threading.Lock()
+    
+    def fetch(byte_range):
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                _fetch_range(video_url, part_path, byte_range[0], byte_range[1])
+                with lock:
+                    done.add(byte_range)
+                    with open(ranges_path, "w") as f:
+                        json.dump(sorted(done), f)
+                return
+            except DownloadError:
+                raise
+            except Exception as e:
+                print(f"[fal_client] Range {byte_range} interrupted ({e}); retrying...")
+                time.sleep(min(30, 2 ** attempt))
+        raise DownloadError(f"Range {byte_range} failed after {DOWNLOAD_RETRIES} attempts")
+    
+    with ThreadPoolExecutor(max_workers=parts) as pool:
+        list(pool.map(fetch, todo))
+    os.remove(ranges_path)
+
+
+def download_video(video_url, save_path, expected_size=None, expected_sha256=None, parallel_ranges=1):
+    """Download a video from fal.ai CDN to local path.
+    
+    Bytes go to <save_path>.part and resume with HTTP Range requests after a
+    dropped connection. The file is checked against expected_size /
+    expected_sha256 (when given) and only then atomically renamed into place.
     
-    with open(path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    Args:
+        video_url: CDN URL of the video
+        save_path: Final local path
+        expected_size: Byte size from the result metadata (video.file_size)
+        expected_sha256: Optional content hash to verify
+        parallel_ranges: Fetch clips >= PARALLEL_DOWNLOAD_MIN_BYTES as this many concurrent ranges
     
+    Returns:
+        Local path as a string
+    """
+    path = Path(save_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = str(path) + ".part"
+    
+    total, ranges_ok = _probe(video_url)
+    total = expected_size or total
+    
+    if parallel_ranges > 1 and ranges_ok and total and total >= PARALLEL_DOWNLOAD_MIN_BYTES:
+        _download_parallel(video_url, part_path, total, parallel_ranges)
+    else:
+        _download_sequential(video_url, part_path, total)
+    
+    size = os.path.getsize(part_path)
+    if total and size != total:
+        os.remove(part_path)
+        raise DownloadError(f"Size mismatch for {path.name}: got {size} bytes, expected {total}")
+    if expected_sha256:
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(DOWNLOAD_CHUNK), b""):
+                digest.update(block)
+        if digest.hexdigest() != expected_sha256:
+            os.remove(part_path)
+            raise DownloadError(f"Checksum mismatch for {path.name}")
+    
+    os.replace(part_path, path)
     return str(path)
 
 
@@ -311,7 +650,7 @@ def generate_scene_video(
     # Download
     local_path = None
     if save_path:
-        local_path = download_video(video_url, save_path)
+        local_path = download_video(video_url, save_path, expected_size=video_data.get("file_size"))
         if progress_callback:
             progress_callback(f"💾 Saved to {Path(save_path).name}", "success")
     
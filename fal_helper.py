@@ -6,7 +6,6 @@ import os
 import json
 import time
 import base64
-import httpx
 import fal_client
 from pathlib import Path
 
@@ -23,6 +22,9 @@ def upload_image_to_fal(image_path):
     """
     Upload a local image to fal.ai storage for use in API calls.
     
+    Goes through fal_client's content-hash upload cache, so an element or
+    location image referenced by many scenes is uploaded once.
+    
     Args:
         image_path: Path to local image file
         
@@ -33,8 +35,7 @@ def upload_image_to_fal(image_path):
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image not found: {image_path}")
     
-    url = fal_client.upload_file(image_path)
-    return url
+    return fal_client.upload_image_to_fal(image_path)
 
 
 def generate_video_kling_o3(
@@ -216,13 +217,5 @@ def download_video(video_url, output_path):
     Returns:
         Path to saved video file
     """
-    output_path = str(output_path)
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    with httpx.Client(timeout=120) as client:
-        response = client.get(video_url)
-        response.raise_for_status()
-        with open(output_path, "wb") as f:
-            f.write(response.content)
-    
-    return output_path
+    # Resumable .part download with size check and atomic rename
+    return fal_client.download_video(video_url, str(output_path))
@@ -0,0 +1,173 @@
+"""
+The Last Shelter — Hedged Provider Requests
+
+Cuts the latency tail of image generation. A block of scene images is only
+done when its slowest image is, and a few calls per block hang far past the
+rest. When a hedged call has been in flight (after rate-limiter admission)
+longer than the observed p90 latency for its model, a duplicate request is
+fired; whichever finishes first wins and the other is cancelled.
+
+    response = await hedging.hedged(model, lambda admitted: rate_limiter.call_async(..., admitted=admitted))
+
+Extra spend is capped by a per-model hedge budget: every hedge-eligible call
+earns HEDGE_BUDGET_FRACTION of a hedge, banked up to HEDGE_BUDGET_MAX, and
+each duplicate fired spends one — so beyond the first, at most ~10% of calls
+are ever doubled.
+No hedges are fired until a model has HEDGE_MIN_SAMPLES successful calls in
+telemetry's rolling window, or while its limiter is already at its
+concurrency cap (a duplicate would only queue behind real work).
+
+Outcomes are counted as provider_hedges_total{provider, outcome}:
+    fired | hedge_won | primary_won | skipped_budget | skipped_busy
+
+Set PROVIDER_HEDGING=0 to turn hedging off.
+"""
+import os
+import asyncio
+import threading
+
+import telemetry
+import rate_limiter
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+HEDGING_ENABLED = os.environ.get("PROVIDER_HEDGING", "1").lower() not in ("0", "false", "off")
+
+HEDGE_PERCENTILE = 0.9
+# Successful calls in telemetry's rolling window before the percentile is trusted
+HEDGE_MIN_SAMPLES = 20
+# Never hedge sooner than this, however fast the model has been
+HEDGE_MIN_DELAY = 2.0
+
+# Share of a hedge earned per eligible call, what each model starts with, and the most that can be banked
+HEDGE_BUDGET_FRACTION = 0.1
+HEDGE_BUDGET_INITIAL = 1.0
+HEDGE_BUDGET_MAX = 3.0
+
+_lock = threading.Lock()
+_budgets = {}
+
+
+# =============================================================================
+# BUDGET
+# =============================================================================
+
+def _earn(key):
+    with _lock:
+        _budgets[key] = min(HEDGE_BUDGET_MAX, _budgets.get(key, HEDGE_BUDGET_INITIAL) + HEDGE_BUDGET_FRACTION)
+
+
+def _spend(key):
+    with _lock:
+        if _budgets.get(key, 0.0) < 1.0:
+            return False
+        _budgets[key] -= 1.0
+        return True
+
+
+def hedge_delay(key):
+    """Seconds in flight after which a call to key is hedged, or None while there is too little history."""
+    p = telemetry.latency_percentile(key, HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES)
+    return None if p is None else max(HEDGE_MIN_DELAY, p)
+
+
+# =============================================================================
+# HEDGING
+# =============================================================================
+
+async def _first_success(tasks):
+    """Result of the first task to succeed; the first task's error if every one fails."""
+    pending = set(tasks)
+    errors = {}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                return task
+            errors[task] = task.exception()
+    raise next(errors[t] for t in tasks if t in errors)
+
+
+async def hedged(key, make_call):
+    """
+    Run a provider call, hedged once at the model's p90 latency.
+
+    Args:
+        key: Limiter / telemetry key (model ID)
+        make_call: fn(admitted) -> coroutine; the call sets the asyncio.Event
+                   `admitted` once the rate limiter lets it start
+
+    Returns:
+        The result of whichever request finished first.
+    """
+    if not HEDGING_ENABLED:
+        return await make_call(asyncio.Event())
+    # Both requests run as their own tasks, away from the caller's frames
+    with telemetry.attribute():
+        return await _hedged(key, make_call)
+
+
+async def _hedged(key, make_call):
+    _earn(key)
+    delay = hedge_delay(key)
+    admitted = asyncio.Event()
+    primary = asyncio.ensure_future(make_call(admitted))
+    if delay is None:
+        return await primary
+
+    # The hedge clock starts at admission — time queued on the limiter isn't tail latency
+    waiter = asyncio.ensure_future(admitted.wait())
+    backup = None
+    try:
+        await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        if not primary.done():
+            await asyncio.wait({primary}, timeout=delay)
+        if primary.done():
+            return primary.result()
+
+        if rate_limiter.limiter(key).saturated():
+            telemetry.count("provider_hedges_total", provider=key, outcome="skipped_busy")
+            return await primary
+        if not _spend(key):
+            telemetry.count("provider_hedges_total", provider=key, outcome="skipped_budget")
+            return await primary
+
+        telemetry.count("provider_hedges_total", provider=key, outcome="fired")
+        print(f"[Hedging] {key}: call still running after {delay:.1f}s (p{int(HEDGE_PERCENTILE * 100)}) — firing a duplicate")
+        backup = asyncio.ensure_future(make_call(asyncio.Event()))
+        winner = await _first_success([primary, backup])
+        telemetry.count("provider_hedges_total", provider=key,
+                        outcome="hedge_won" if winner is backup else "primary_won")
+        return winner.result()
+    finally:
+        for task in (primary, waiter, backup):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import random
+    import time
+
+    key = "hedge-demo"
+    rate_limiter.limiter(key, defaults={"concurrency": 8})
+    for _ in range(HEDGE_MIN_SAMPLES):
+        telemetry.record(key, random.uniform(0.1, 0.3))
+
+    async def slow_sometimes(admitted):
+        async def fn():
+            await asyncio.sleep(3.0 if random.random() < 0.2 else random.uniform(0.1, 0.3))
+            return "ok"
+        return await rate_limiter.call_async(key, fn, admitted=admitted)
+
+    async def main():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(hedged(key, slow_sometimes) for _ in range(40)))
+        print(f"{len(results)} calls in {time.perf_counter() - started:.2f}s, budget left {_budgets[key]:.1f}")
+
+    HEDGE_MIN_DELAY = 0.3
+    asyncio.run(main())
+    print("\n".join(line for line in telemetry.prometheus_text().splitlines() if line.startswith("provider_hedges_total")))
@@ -0,0 +1,168 @@
+"""
+The Last Shelter — Model Cascade Router
+
+Routes quality-gated LLM tasks through a cheap-first model cascade:
+
+    gemini-2.5-flash  →  (quality check fails / call errors)  →  gemini-2.5-pro
+
+Each task declares a check — the same programmatic gates the pipeline
+already runs (validate_story, validate_storyboard, scene-batch shape) — and
+only output that fails it is regenerated on Pro. Most chapters pass on
+Flash, which is several times faster and cheaper; the escalation rate per
+task is counted so the split can be watched on /metrics and /api/telemetry:
+
+    model_router_calls_total{task, model, outcome}      outcome = accepted | rejected | error
+    model_router_escalations_total{task, reason}
+
+Usage:
+    result = model_router.route("storyboard", lambda model: generate_json(prompt, model=model), check)
+    result = await model_router.route_async("scene_batch", lambda model: generate_json_async(...), check)
+
+A check takes the result and returns (ok, reason). The last model's output is
+returned even if it fails the check, so callers keep their own fallbacks.
+Set MODEL_CASCADE=0 to send every routed task straight to Pro.
+"""
+import os
+import threading
+from collections import defaultdict
+
+import telemetry
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+FAST_MODEL = "gemini-2.5-flash"
+STRONG_MODEL = "gemini-2.5-pro"
+CASCADE = (FAST_MODEL, STRONG_MODEL)
+
+CASCADE_ENABLED = os.environ.get("MODEL_CASCADE", "1").lower() not in ("0", "false", "off")
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {"routed": 0, "escalated": 0, "errors": 0, "accepted": defaultdict(int)})
+
+
+def models_for(models=None):
+    """The cascade a routed task walks (just the strongest model when cascading is off)."""
+    models = tuple(models or CASCADE)
+    return models if CASCADE_ENABLED else models[-1:]
+
+
+# =============================================================================
+# ROUTING
+# =============================================================================
+
+def _judge(task, model, result, check):
+    try:
+        ok, reason = check(result)
+    except Exception as e:
+        ok, reason = False, f"check raised {type(e).__name__}: {e}"
+    telemetry.count("model_router_calls_total", task=task, model=model, outcome="accepted" if ok else "rejected")
+    return ok, reason
+
+
+def _escalate(task, model, next_model, reason, error=False):
+    telemetry.count("model_router_escalations_total", task=task, reason="error" if error else "check")
+    with _lock:
+        _stats[task]["escalated"] += 1
+        _stats[task]["errors"] += int(error)
+    print(f"[ModelRouter] {task}: {model} {'failed' if error else 'rejected'} ({str(reason)[:160]}) → escalating to {next_model}")
+
+
+def _accepted(task, model):
+    with _lock:
+        _stats[task]["routed"] += 1
+        _stats[task]["accepted"][model] += 1
+
+
+def route(task, call, check, models=None):
+    """
+    Run call(model) down the cascade until check(result) passes.
+
+    Args:
+        task: Task name for stats and logs ("story", "storyboard", ...)
+        call: fn(model) -> result
+        check: fn(result) -> (ok, reason)
+        models: Cascade to walk, cheapest first (default: Flash → Pro)
+
+    Returns:
+        The first result that passes its check, else the last model's result.
+        The last model's exception propagates; earlier ones escalate.
+    """
+    models = models_for(models)
+    for i, model in enumerate(models):
+        last = i == len(models) - 1
+        try:
+            result = call(model)
+        except Exception as e:
+            telemetry.count("model_router_calls_total", task=task, model=model, outcome="error")
+            if last:
+                with _lock:
+                    _stats[task]["routed"] += 1
+                    _stats[task]["errors"] += 1
+                raise
+            _escalate(task, model, models[i + 1], e, error=True)
+            continue
+        ok, reason = _judge(task, model, result, check)
+        if ok or last:
+            _accepted(task, model)
+            return result
+        _escalate(task, model, models[i + 1], reason)
+
+
+async def route_async(task, call, check, models=None):
+    """route() for coroutines on provider_loop: call(model) returns an awaitable."""
+    models = models_for(models)
+    for i, model in enumerate(models):
+        last = i == len(models) - 1
+        try:
+            result = await call(model)
+        except Exception as e:
+            telemetry.count("model_router_calls_total", task=task, model=model, outcome="error")
+            if last:
+                with _lock:
+                    _stats[task]["routed"] += 1
+                    _stats[task]["errors"] += 1
+                raise
+            _escalate(task, model, models[i + 1], e, error=True)
+            continue
+        ok, reason = _judge(task, model, result, check)
+        if ok or last:
+            _accepted(task, model)
+            return result
+        _escalate(task, model, models[i + 1], reason)
+
+
+def stats():
+    """Per-task routing counts and escalation rate since the process started."""
+    with _lock:
+        return {
+            "cascade": list(models_for()),
+            "tasks": {
+                task: {
+                    "routed": s["routed"],
+                    "escalated": s["escalated"],
+                    "errors": s["errors"],
+                    "escalation_rate": round(s["escalated"] / s["routed"], 3) if s["routed"] else 0.0,
+                    "accepted_by": dict(s["accepted"]),
+                }
+                for task, s in sorted(_stats.items())
+            },
+        }
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import json
+    import random
+
+    def fake_call(model):
+        # Flash "fails" the gate a third of the time, Pro always passes
+        return {"model": model, "score": random.randint(0, 100) if model == FAST_MODEL else 100}
+
+    def check(result):
+        return result["score"] >= 33, f"score {result['score']}"
+
+    for _ in range(30):
+        route("demo", fake_call, check)
+    print(json.dumps(stats(), indent=2))
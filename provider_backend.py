@@ -0,0 +1,802 @@
+"""
+The Last Shelter — Pluggable Provider Backend
+
+Every Gemini, ElevenLabs and fal.ai request leaves the process through the
+shared clients in provider_clients, so this module sits underneath them as a
+transport (httpx for google-genai / ElevenLabs, a requests adapter for fal,
+async httpx for the provider_loop clients) and decides what actually answers:
+
+    PROVIDER_BACKEND=live       real network (default — this module is inert)
+    PROVIDER_BACKEND=record     real network, every exchange saved to the cassette dir
+    PROVIDER_BACKEND=replay     recorded exchanges served by request hash, no network
+    PROVIDER_BACKEND=synthetic  fake but well-formed answers, no network, no keys:
+                                JSON filled from the prompt's output template or the
+                                response schema, placeholder PNGs, silent MP3s,
+                                fal renders that complete after a modelled delay,
+                                Gemini batch jobs that finish after a modelled turnaround
+
+Replay and synthetic responses wait like the real provider would — the
+recorded latency, or config/synthetic_latency.json — scaled by
+PROVIDER_LATENCY_SCALE (0 = instant); on the async transports the wait is an
+asyncio.sleep, so concurrent calls overlap as they would for real. Everything above the transport
+(rate limiter, retries, telemetry, manifests, caches) runs for real, which is
+the point: it measures our own overhead in isolation.
+
+Cassettes: <PROVIDER_CASSETTE_DIR>/<provider>/<request hash>.json, with binary
+bodies (audio, video, uploads) in <hash>.<n>.bin next to it. A request that
+is repeated (polling, retries) replays its recorded responses in order.
+"""
+import os
+import io
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
+import itertools
+import threading
+import subprocess
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+MODES = ("live", "record", "replay", "synthetic")
+PROVIDER_BACKEND = os.environ.get("PROVIDER_BACKEND", "live").lower()
+CASSETTE_DIR = Path(os.environ.get("PROVIDER_CASSETTE_DIR", Path(__file__).parent / "cassettes"))
+# What a replay does with a request that was never recorded: error | synthetic | live
+REPLAY_MISS = os.environ.get("PROVIDER_REPLAY_MISS", "error").lower()
+LATENCY_SCALE = float(os.environ.get("PROVIDER_LATENCY_SCALE", "1"))
+LATENCY_PATH = Path(__file__).parent / "config" / "synthetic_latency.json"
+
+# Synthetic content
+SYNTHETIC_SEED = int(os.environ.get("PROVIDER_SYNTHETIC_SEED", "0"))
+SYNTHETIC_LIST_LENGTH = int(os.environ.get("PROVIDER_SYNTHETIC_LIST_LENGTH", "4"))
+SYNTHETIC_TEXT_TOKENS = 600          # cap for free-text answers
+SYNTHETIC_IMAGE_LONG_SIDE = 1024
+SYNTHETIC_SPEECH_WPS = 2.5           # narration pace for silent MP3 length
+SYNTHETIC_HOST = "synthetic.fal.media"
+
+# Fields that get a name taken from the prompt instead of filler text
+_NAME_KEYS = re.compile(r"^(name|label|display_name|character|element|element_name)$", re.I)
+
+# Query parameters that vary per run and must not change a request's hash
+IGNORED_PARAMS = {"fal_webhook", "key"}
+# Headers that describe the original wire encoding, not the body we hand back
+_WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono (ElevenLabs' default output)
+_MP3_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC4])
+
+_lock = threading.Lock()
+# Per-thread accumulator for modelled waits while an async request is being answered
+_deferred = threading.local()
+_replay_positions = {}       # request hash -> next response index
+_fal_jobs = {}               # synthetic request_id -> {"ready_at", "duration"}
+_batch_jobs = {}             # synthetic batch id -> {"model", "state", "responses", "ready_at", ...}
+_latency_profiles = None
+_rng = random.Random(SYNTHETIC_SEED)
+_video_cache = {}
+
+if PROVIDER_BACKEND not in MODES:
+    raise ValueError(f"PROVIDER_BACKEND must be one of {MODES}, got {PROVIDER_BACKEND!r}")
+
+
+class ProviderBackendError(Exception):
+    """A replay miss, or a request the synthetic backend cannot answer."""
+
+
+def mode():
+    return PROVIDER_BACKEND
+
+
+def active():
+    """True when provider traffic goes through this module (any mode but live)."""
+    return PROVIDER_BACKEND != "live"
+
+
+def offline():
+    """True when no real provider is contacted, so API keys are not required."""
+    return PROVIDER_BACKEND == "synthetic" or (PROVIDER_BACKEND == "replay" and REPLAY_MISS != "live")
+
+
+# =============================================================================
+# REQUEST IDENTITY
+# =============================================================================
+
+def provider_of(url):
+    host = urlsplit(url).hostname or ""
+    if "googleapis.com" in host:
+        return "gemini"
+    if "elevenlabs" in host:
+        return "elevenlabs"
+    if host.endswith("fal.run") or host.endswith("fal.ai") or host.endswith("fal.media"):
+        return "fal"
+    return "http"
+
+
+def _canonical_url(url):
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in IGNORED_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def _canonical_body(body):
+    if not body:
+        return b""
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return body
+
+
+def request_key(method, url, body):
+    """Stable hash of a request: method, URL minus volatile params, canonical JSON body."""
+    digest = hashlib.sha256()
+    digest.update(method.upper().encode() + b"\n" + _canonical_url(url).encode() + b"\n")
+    digest.update(_canonical_body(body))
+    return digest.hexdigest()[:32]
+
+
+def _clean_headers(headers):
+    return {k: v for k, v in headers.items() if k.lower() not in _WIRE_HEADERS}
+
+
+# =============================================================================
+# CASSETTES
+# =============================================================================
+
+def _cassette_path(provider, key):
+    return CASSETTE_DIR / provider / f"{key}.json"
+
+
+def _is_text(headers, body):
+    content_type = next((v for k, v in headers.items() if k.lower() == "content-type"), "")
+    if not ("json" in content_type or content_type.startswith("text/") or not content_type):
+        return False
+    try:
+        body.decode("utf-8")
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _record(provider, key, method, url, body, status, headers, content, elapsed):
+    path = _cassette_path(provider, key)
+    with _lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cassette = {"method": method, "url": _canonical_url(url), "responses": []}
+        if path.exists():
+            with open(path) as f:
+                cassette = json.load(f)
+        index = len(cassette["responses"])
+        response = {"status": status, "headers": headers, "elapsed": round(elapsed, 3)}
+        if _is_text(headers, content):
+            response["text"] = content.decode("utf-8")
+        else:
+            blob = path.with_name(f"{key}.{index}.bin")
+            blob.write_bytes(content)
+            response["body_file"] = blob.name
+        if index == 0 and body:
+            cassette["request_preview"] = _canonical_body(body)[:2000].decode("utf-8", errors="replace")
+        cassette["responses"].append(response)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(cassette, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def _replay(provider, key):
+    """Next recorded response for a request hash (the last one repeats), or None."""
+    path = _cassette_path(provider, key)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        responses = json.load(f)["responses"]
+    with _lock:
+        index = min(_replay_positions.get(key, 0), len(responses) - 1)
+        _replay_positions[key] = index + 1
+    response = responses[index]
+    if "text" in response:
+        content = response["text"].encode("utf-8")
+    else:
+        content = path.with_name(response["body_file"]).read_bytes()
+    return response["status"], response["headers"], content, response.get("elapsed", 0)
+
+
+def reset_replay():
+    """Start every cassette from its first response again (between benchmark runs)."""
+    with _lock:
+        _replay_positions.clear()
+        _fal_jobs.clear()
+        _batch_jobs.clear()
+
+
+# =============================================================================
+# DISPATCH
+# =============================================================================
+
+def handle(method, url, body, live):
+    """
+    Answer one provider request according to the backend mode.
+
+    Args:
+        method, url, body: The outgoing request (body as bytes)
+        live: fn() -> (status, headers, content) that performs the real request
+
+    Returns:
+        (status, headers, content) with content fully read
+    """
+    provider = provider_of(url)
+    if PROVIDER_BACKEND == "live":
+        return live()
+
+    key = request_key(method, url, body)
+    if PROVIDER_BACKEND == "record":
+        start = time.monotonic()
+        status, headers, content = live()
+        headers = _clean_headers(headers)
+        _record(provider, key, method, url, body, status, headers, content, time.monotonic() - start)
+        return status, headers, content
+
+    if PROVIDER_BACKEND == "replay":
+        recorded = _replay(provider, key)
+        if recorded:
+            status, headers, content, elapsed = recorded
+            _sleep(elapsed)
+            return status, headers, content
+        if REPLAY_MISS == "live":
+            return live()
+        if REPLAY_MISS != "synthetic":
+            raise ProviderBackendError(f"No recording for {method} {_canonical_url(url)} ({provider}/{key})")
+
+    return _synthesize(provider, method, url, body or b"")
+
+
+async def handle_async(method, url, body, live):
+    """
+    handle() for the async transports. `live` is a coroutine function; modelled
+    latency is awaited with asyncio.sleep so the event loop keeps serving other calls.
+    """
+    import asyncio
+
+    provider = provider_of(url)
+    if PROVIDER_BACKEND == "live":
+        return await live()
+
+    key = request_key(method, url, body)
+    if PROVIDER_BACKEND == "record":
+        start = time.monotonic()
+        status, headers, content = await live()
+        headers = _clean_headers(headers)
+        _record(provider, key, method, url, body, status, headers, content, time.monotonic() - start)
+        return status, headers, content
+
+    if PROVIDER_BACKEND == "replay":
+        recorded = _replay(provider, key)
+        if recorded:
+            status, headers, content, elapsed = recorded
+            await asyncio.sleep(elapsed * LATENCY_SCALE if LATENCY_SCALE > 0 else 0)
+            return status, headers, content
+        if REPLAY_MISS == "live":
+            return await live()
+        if REPLAY_MISS != "synthetic":
+            raise ProviderBackendError(f"No recording for {method} {_canonical_url(url)} ({provider}/{key})")
+
+    _deferred.seconds = 0.0
+    try:
+        answer = _synthesize(provider, method, url, body or b"")
+        wait = _deferred.seconds
+    finally:
+        _deferred.seconds = None
+    await asyncio.sleep(wait)
+    return answer
+
+
+# =============================================================================
+# TRANSPORTS
+# =============================================================================
+
+def httpx_transport(live_transport):
+    """httpx transport for google-genai / ElevenLabs clients, wrapping the real one."""
+    import httpx
+
+    class _Transport(httpx.BaseTransport):
+        def handle_request(self, request):
+            body = request.read()
+
+            def live():
+                response = live_transport.handle_request(request)
+                try:
+                    content = response.read()
+                finally:
+                    response.close()
+                return response.status_code, _clean_headers(dict(response.headers)), content
+
+            status, headers, content = handle(request.method, str(request.url), body, live)
+            return httpx.Response(status, headers=headers, content=content, request=request)
+
+        def close(self):
+            live_transport.close()
+
+    return _Transport()
+
+
+def async_httpx_transport(live_transport):
+    """httpx async transport for the asyncio provider core (google-genai .aio, AsyncElevenLabs, fal)."""
+    import httpx
+
+    class _AsyncTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            body = await request.aread()
+
+            async def live():
+                response = await live_transport.handle_async_request(request)
+                try:
+                    content = await response.aread()
+                finally:
+                    await response.aclose()
+                return response.status_code, _clean_headers(dict(response.headers)), content
+
+            status, headers, content = await handle_async(request.method, str(request.url), body, live)
+            return httpx.Response(status, headers=headers, content=content, request=request)
+
+        async def aclose(self):
+            await live_transport.aclose()
+
+    return _AsyncTransport()
+
+
+def requests_adapter(live_adapter):
+    """requests transport adapter for the shared HTTP session (fal queue, storage, CDN)."""
+    import requests
+    from requests.adapters import BaseAdapter
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    class _Adapter(BaseAdapter):
+        def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+            if hasattr(request.body, "read"):
+                request.body = request.body.read()     # streamed uploads are hashed like any body
+            body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+
+            def live():
+                response = live_adapter.send(request, stream=False, timeout=timeout, verify=verify,
+                                             cert=cert, proxies=proxies)
+                return response.status_code, _clean_headers(dict(response.headers)), response.content
+
+            status, headers, content = handle(request.method, request.url, body, live)
+            response = requests.Response()
+            response.status_code = status
+            response.headers = CaseInsensitiveDict(headers)
+            response.headers["Content-Length"] = str(len(content))
+            response.raw = io.BytesIO(content)
+            response.encoding = get_encoding_from_headers(response.headers)
+            response.url = request.url
+            response.request = request
+            response.reason = "OK" if status < 400 else "Error"
+            return response
+
+        def close(self):
+            live_adapter.close()
+
+    return _Adapter()
+
+
+# =============================================================================
+# LATENCY
+# =============================================================================
+
+def _load_latency_profiles():
+    global _latency_profiles
+    if _latency_profiles is None:
+        try:
+            with open(LATENCY_PATH) as f:
+                _latency_profiles = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[Backend] No usable {LATENCY_PATH.name} ({e}) — synthetic calls are instant")
+            _latency_profiles = {}
+    return _latency_profiles
+
+
+def modelled_latency(profile, **units):
+    """
+    Seconds a real call would take: base + per-unit costs, with multiplicative jitter.
+
+    units: output_tokens, characters, video_seconds, ... matched against
+           per_1k_<unit> / per_<unit> fields of the profile
+    """
+    profiles = _load_latency_profiles()
+    spec = profiles.get(profile) or profiles.get("default") or {}
+    seconds = spec.get("base", 0.0)
+    for unit, amount in units.items():
+        seconds += amount / 1000 * spec.get(f"per_1k_{unit}", 0.0) + amount * spec.get(f"per_{unit}", 0.0)
+    jitter = spec.get("jitter", 0.0)
+    with _lock:
+        factor = _rng.uniform(1 - jitter, 1 + jitter) if jitter else 1.0
+    return max(0.0, seconds * factor)
+
+
+def _sleep(seconds):
+    if LATENCY_SCALE > 0 and seconds > 0:
+        if getattr(_deferred, "seconds", None) is not None:
+            _deferred.seconds += seconds * LATENCY_SCALE     # handle_async() awaits it instead
+        else:
+            time.sleep(seconds * LATENCY_SCALE)
+
+
+# =============================================================================
+# SYNTHETIC — GEMINI
+# =============================================================================
+
+_PROSE = ("the wind pushed snow across the clearing while he notched the next spruce log and "
+          "checked the line of the wall against the frozen ground before the light went grey").split()
+
+
+def _prose(seed, tokens):
+    rng = random.Random(seed)
+    words = [rng.choice(_PROSE) for _ in range(max(12, int(tokens * 0.75)))]
+    sentences = (" ".join(words[i:i + 12]).capitalize() for i in range(0, len(words), 12))
+    return ". ".join(sentences) + "."
+
+
+def _fill_placeholders(block):
+    """Turn a prompt's output template ("<number>", "a" | "b", ...) into parseable JSON."""
+    s = re.sub(r"(?m)^\s*//[^\n]*$|\s//\s[^\n]*", "", block)
+    s = re.sub(r'("[^"\n]*")(?:\s*\|\s*"[^"\n]*")+', r"\1", s)
+    s = re.sub(r'"<([^"<>]*)>"', lambda m: json.dumps(f"synthetic {m.group(1)[:40]}".strip()), s)
+    s = re.sub(r"<\s*(true|false)\b[^<>]*>", lambda m: m.group(1), s)
+    s = re.sub(r"<[^<>\n]*\b(number|int|integer|count|seconds|pct|percent|float|score)\b[^<>\n]*>", "1", s, flags=re.I)
+    s = re.sub(r"<[^<>\n]*>", '"synthetic"', s)
+    s = re.sub(r"\.\.\.|…", "", s)
+    for _ in range(3):
+        s = re.sub(r",\s*(?=[}\]])", "", s)
+        s = re.sub(r",\s*,", ",", s)
+        s = re.sub(r"\[\s*,", "[", s)
+    return s
+
+
+def _top_level_blocks(prompt):
+    """Balanced top-level {...} and [...] spans of a prompt."""
+    closers = {"{": "}", "[": "]"}
+    blocks, stack, start = [], [], None
+    for i, ch in enumerate(prompt):
+        if ch in closers:
+            if not stack:
+                start = i
+            stack.append(closers[ch])
+        elif stack and ch == stack[-1]:
+            stack.pop()
+            if not stack:
+                blocks.append(prompt[start:i + 1])
+    return blocks
+
+
+def template_from_prompt(prompt):
+    """
+    The JSON output template a prompt asks for: the largest top-level object
+    (or array of objects) that parses once its placeholders are filled.
+    None if there is none.
+    """
+    best = None
+    for block in _top_level_blocks(prompt):
+        try:
+            value = json.loads(_fill_placeholders(block))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, list) and not (value and all(isinstance(item, dict) for item in value)):
+            continue
+        if value and (best is None or len(block) > best[0]):
+            best = (len(block), value)
+    return best[1] if best else None
+
+
+def _expand_lists(value, depth=0):
+    """Repeat template list items up to SYNTHETIC_LIST_LENGTH, bumping numbering fields."""
+    if isinstance(value, dict):
+        return {k: _expand_lists(v, depth + 1) for k, v in value.items()}
+    if not isinstance(value, list) or not value:
+        return value
+    items = [_expand_lists(item, depth + 1) for item in value]
+    if isinstance(items[-1], dict) and depth < 4:
+        while len(items) < SYNTHETIC_LIST_LENGTH:
+            clone = json.loads(json.dumps(items[-1]))
+            for k, v in clone.items():
+                if isinstance(v, int) and not isinstance(v, bool) and re.search(r"num|number|index|order|^id$", k):
+                    clone[k] = v + 1
+            items.append(clone)
+    return items
+
+
+def prompt_names(prompt):
+    """Proper names a prompt lists (bullet items, @mentions) — what a model would echo back."""
+    names = re.findall(r"(?m)^\s*[-•*]\s+@?([A-Z][\w'’]*(?: [A-Z][\w'’]*){0,3})\s*(?:\(|—| - |$)", prompt)
+    names += re.findall(r"@([A-Z][\w'’]*(?: [A-Z][\w'’]*)?)", prompt)
+    return list(dict.fromkeys(names))
+
+
+def _apply_names(value, names):
+    """Give each object in a fake answer one of the prompt's names for its name/label (and id) fields."""
+    if not names:
+        return value
+    cycle = itertools.cycle(names)
+
+    def walk(node):
+        if isinstance(node, list):
+            return [walk(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        named = [key for key, sub in node.items() if isinstance(sub, str) and _NAME_KEYS.match(key)]
+        name = next(cycle) if named else None
+        result = {}
+        for key, sub in node.items():
+            if key in named:
+                result[key] = name
+            elif name and key == "id" and isinstance(sub, str):
+                result[key] = re.sub(r"\W+", "_", name.lower()).strip("_")
+            else:
+                result[key] = walk(sub)
+        return result
+    return walk(value)
+
+
+def fake_from_schema(schema, root=None, name="value", index=0):
+    """A value matching a Gemini Schema (OBJECT/STRING/...) or JSON Schema ($ref, anyOf)."""
+    root = root or schema
+    if "$ref" in schema:
+        ref = schema["$ref"].split("/")[-1]
+        defs = root.get("$defs") or root.get("definitions") or {}
+        return fake_from_schema(defs.get(ref, {}), root, name, index)
+    for union in ("anyOf", "oneOf", "any_of"):
+        if schema.get(union):
+            options = [o for o in schema[union] if str(o.get("type", "")).lower() != "null"] or schema[union]
+            return fake_from_schema(options[0], root, name, index)
+    if schema.get("enum"):
+        return schema["enum"][0]
+    kind = str(schema.get("type", "object" if "properties" in schema else "string")).lower()
+    if kind == "object":
+        return {key: fake_from_schema(sub, root, key, index) for key, sub in (schema.get("properties") or {}).items()}
+    if kind == "array":
+        count = max(int(schema.get("minItems", schema.get("min_items", 0)) or 0), SYNTHETIC_LIST_LENGTH)
+        return [fake_from_schema(schema.get("items") or {}, root, name, i) for i in range(count)]
+    if kind == "integer":
+        return index + 1
+    if kind == "number":
+        return float(index + 1)
+    if kind == "boolean":
+        return True
+    return f"synthetic {name} {index + 1}"
+
+
+def _placeholder_png(seed, aspect_ratio):
+    from PIL import Image
+
+    try:
+        w, h = (float(x) for x in str(aspect_ratio or "3:2").split(":"))
+    except ValueError:
+        w, h = 3.0, 2.0
+    scale = SYNTHETIC_IMAGE_LONG_SIDE / max(w, h)
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    rng = random.Random(seed)
+    top, bottom = [rng.randint(30, 200) for _ in range(3)], [rng.randint(30, 200) for _ in range(3)]
+    image = Image.new("RGB", size)
+    gradient = Image.linear_gradient("L").resize(size)
+    image.paste(Image.composite(Image.new("RGB", size, tuple(bottom)), Image.new("RGB", size, tuple(top)), gradient))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _gemini_answer(model, request, body):
+    """(GenerateContentResponse JSON, modelled seconds) for one generateContent request."""
+    config = request.get("generationConfig") or {}
+    prompt = "\n".join(
+        part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", [])
+    )
+    prompt_tokens = len(prompt) // 4 + 1 + 258 * sum(
+        1 for content in request.get("contents", []) for part in content.get("parts", []) if "inlineData" in part
+    )
+    seed = hashlib.sha256(body or b"").hexdigest()
+    max_tokens = config.get("maxOutputTokens") or SYNTHETIC_TEXT_TOKENS
+
+    modalities = [m.upper() for m in config.get("responseModalities") or []]
+    if "IMAGE" in modalities:
+        png = _placeholder_png(seed, (config.get("imageConfig") or {}).get("aspectRatio"))
+        parts = [{"inlineData": {"mimeType": "image/png", "data": base64.b64encode(png).decode("ascii")}}]
+        output_tokens = 1290
+        latency = modelled_latency(model, images=1)
+    else:
+        schema = config.get("responseJsonSchema") or config.get("responseSchema")
+        wants_json = config.get("responseMimeType") == "application/json" or "JSON" in prompt
+        if schema:
+            text = json.dumps(_apply_names(fake_from_schema(schema), prompt_names(prompt)), ensure_ascii=False)
+        elif wants_json and (template := template_from_prompt(prompt)) is not None:
+            text = json.dumps(_apply_names(_expand_lists(template), prompt_names(prompt)), ensure_ascii=False, indent=1)
+        elif config.get("responseMimeType") == "application/json":
+            text = "{}"
+        else:
+            text = _prose(seed, min(max_tokens, SYNTHETIC_TEXT_TOKENS))
+        parts = [{"text": text}]
+        output_tokens = len(text) // 4 + 1
+        latency = modelled_latency(model, output_tokens=output_tokens)
+
+    return {
+        "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                          "totalTokenCount": prompt_tokens + output_tokens},
+        "modelVersion": model,
+    }, latency
+
+
+def _gemini_response(url, body):
+    if ":batchGenerateContent" in url or "/batches/" in url:
+        return _gemini_batch_response(url, body)
+    model = re.search(r"models/([^:/]+)", url)
+    answer, latency = _gemini_answer(model.group(1) if model else "gemini", json.loads(body or b"{}"), body)
+    _sleep(latency)
+    return _json(answer)
+
+
+def _batch_operation(batch_id, job, done):
+    state = job["state"] if job["state"] == "BATCH_STATE_CANCELLED" else (
+        "BATCH_STATE_SUCCEEDED" if done else "BATCH_STATE_RUNNING")
+    metadata = {"@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch",
+                "name": f"batches/{batch_id}", "displayName": job["display_name"], "model": f"models/{job['model']}",
+                "state": state}
+    if state == "BATCH_STATE_SUCCEEDED":
+        metadata["output"] = {"inlinedResponses": {"inlinedResponses": job["responses"]}}
+    return {"name": f"batches/{batch_id}", "metadata": metadata, "done": state != "BATCH_STATE_RUNNING"}
+
+
+def _gemini_batch_response(url, body):
+    """
+    Fake Gemini Batch API: batchGenerateContent answers every inlined request
+    up front, and batches/<id> reports RUNNING until a modelled turnaround
+    (the "gemini-batch" latency profile plus the slowest request) has passed.
+    """
+    _sleep(modelled_latency("fal"))   # one control-plane round-trip
+    match = re.search(r"batches/([^/:?]+)(:cancel)?", url)
+    if match:
+        batch_id, cancel = match.groups()
+        with _lock:
+            job = _batch_jobs.get(batch_id)
+            if job is None:
+                return _json({"error": {"code": 404, "message": f"batches/{batch_id} not found", "status": "NOT_FOUND"}}, 404)
+            if cancel:
+                job["state"] = "BATCH_STATE_CANCELLED"
+        return _json(_batch_operation(batch_id, job, time.monotonic() >= job["ready_at"]))
+
+    model = re.search(r"models/([^:/]+)", url).group(1)
+    batch = json.loads(body or b"{}").get("batch", {})
+    responses, slowest = [], 0.0
+    for item in (batch.get("inputConfig", {}).get("requests", {}).get("requests") or []):
+        request = item.get("request", {})
+        answer, latency = _gemini_answer(model, request, json.dumps(request, sort_keys=True).encode("utf-8"))
+        slowest = max(slowest, latency)
+        responses.append({"response": answer, **({"metadata": item["metadata"]} if "metadata" in item else {})})
+    batch_id = uuid.uuid4().hex[:12]
+    job = {"model": model, "display_name": batch.get("displayName", batch_id), "state": "BATCH_STATE_PENDING",
+           "responses": responses,
+           "ready_at": time.monotonic() + (modelled_latency("gemini-batch") + slowest) * max(LATENCY_SCALE, 0)}
+    with _lock:
+        _batch_jobs[batch_id] = job
+    return _json(_batch_operation(batch_id, job, False))
+
+
+# =============================================================================
+# SYNTHETIC — ELEVENLABS + FAL
+# =============================================================================
+
+def silent_mp3(seconds):
+    """MP3 bytes of digital silence (valid frames, so scan_mp3_file measures the duration)."""
+    from episode_audio import silent_frame
+
+    frame, samples = silent_frame(_MP3_HEADER)
+    return frame * max(1, round(seconds * 44100 / samples))
+
+
+def _elevenlabs_response(url, body):
+    if "/text-to-speech/" not in url:
+        return 200, {"content-type": "application/json"}, b"{}"
+    text = json.loads(body or b"{}").get("text", "")
+    seconds = max(1.0, len(text.split()) / SYNTHETIC_SPEECH_WPS)
+    _sleep(modelled_latency("elevenlabs", characters=len(text)))
+    return 200, {"content-type": "audio/mpeg", "request-id": uuid.uuid4().hex}, silent_mp3(seconds)
+
+
+def _placeholder_video(seconds):
+    """A black clip from ffmpeg when available, else a bare MP4 header (enough for download paths)."""
+    seconds = max(1, int(round(seconds)))
+    if seconds not in _video_cache:
+        from audio_utils import FFMPEG_BIN
+        try:
+            result = subprocess.run(
+                [FFMPEG_BIN, "-v", "error", "-f", "lavfi", "-i", f"color=c=black:s=320x180:r=24:d={seconds}",
+                 "-c:v", "libx264", "-pix_fmt", "yuv420p", "-movflags", "frag_keyframe+empty_moov", "-f", "mp4", "pipe:1"],
+                capture_output=True, timeout=60,
+            )
+            video = result.stdout if result.returncode == 0 and result.stdout else None
+        except (OSError, subprocess.TimeoutExpired):
+            video = None
+        _video_cache[seconds] = video or (b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom" + bytes(1024))
+    return _video_cache[seconds]
+
+
+def _json(data, status=200):
+    return status, {"content-type": "application/json"}, json.dumps(data).encode("utf-8")
+
+
+def _fal_response(method, url, body):
+    parts = urlsplit(url)
+    path = parts.path.strip("/")
+    _sleep(modelled_latency("fal"))
+
+    if parts.hostname == SYNTHETIC_HOST:
+        if path.startswith("videos/"):
+            request_id = path.split("/")[1].split(".")[0]
+            job = _fal_jobs.get(request_id, {"duration": 5})
+            return 200, {"content-type": "video/mp4"}, b"" if method == "HEAD" else _placeholder_video(job["duration"])
+        return 200, {"content-type": "application/octet-stream"}, b""
+
+    if path.startswith("storage/upload/initiate"):
+        file_id = uuid.uuid4().hex
+        return _json({"upload_url": f"https://{SYNTHETIC_HOST}/upload/{file_id}",
+                      "file_url": f"https://{SYNTHETIC_HOST}/files/{file_id}"})
+
+    match = re.match(r"(.+)/requests/([^/]+)(/status|/cancel)?$", path)
+    if match:
+        model_id, request_id, action = match.groups()
+        job = _fal_jobs.get(request_id)
+        if not job:
+            return _json({"detail": "Request not found"}, 404)
+        done = time.monotonic() >= job["ready_at"]
+        if action == "/status":
+            return _json({"status": "COMPLETED" if done else "IN_PROGRESS", "request_id": request_id, "logs": []})
+        if not done:
+            return _json({"detail": "Request is still in progress"}, 400)
+        video = _placeholder_video(job["duration"])
+        return _json({"video": {"url": f"https://{SYNTHETIC_HOST}/videos/{request_id}.mp4",
+                                "file_size": len(video), "content_type": "video/mp4"}})
+
+    if method == "POST":
+        payload = json.loads(body or b"{}")
+        duration = float(re.sub(r"[^\d.]", "", str(payload.get("duration", "5"))) or 5)
+        request_id = str(uuid.uuid4())
+        render = modelled_latency("fal-render", video_seconds=duration) * max(LATENCY_SCALE, 0)
+        with _lock:
+            _fal_jobs[request_id] = {"ready_at": time.monotonic() + render, "duration": duration}
+        base = f"https://{parts.hostname}/{path}"
+        return _json({"request_id": request_id, "status_url": f"{base}/requests/{request_id}/status",
+                      "response_url": f"{base}/requests/{request_id}"})
+
+    return _json({"detail": f"synthetic backend has no answer for {method} {path}"}, 404)
+
+
+def _synthesize(provider, method, url, body):
+    if provider == "gemini":
+        return _gemini_response(url, body)
+    if provider == "elevenlabs":
+        return _elevenlabs_response(url, body)
+    if provider == "fal":
+        return _fal_response(method, url, body)
+    raise ProviderBackendError(f"Synthetic backend does not serve {method} {url}")
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    prompt = """Describe the scene state. Return JSON:
+{
+    "scene": 3,
+    "environment": {"ground_cleared_pct": <number>, "structures_built": [<list of permanent additions>]},
+    "type": "narrated" | "bridge",
+    "storyboard": [{"scene_number": 1, "action": "<what happens>"}, ...],
+    "location_changed": <true if new image needed, false if reuse previous>
+}"""
+    print(json.dumps(_expand_lists(template_from_prompt(prompt)), indent=2))
+    print(len(silent_mp3(3.0)), "bytes of silent MP3 for 3 s")
+    print(fake_from_schema({"type": "OBJECT", "properties": {"characters": {"type": "ARRAY", "items": {
+        "type": "OBJECT", "properties": {"name": {"type": "STRING"}, "age": {"type": "INTEGER"}}}}}}))
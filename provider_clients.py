@@ -0,0 +1,284 @@
+"""
+The Last Shelter — Provider Clients
+
+One shared, thread-safe, keep-alive client per provider. Every module asks
+here instead of constructing its own, so the fan-out loops (scene images,
+TTS segments, fal status polls) reuse warm connections instead of paying a
+TLS handshake per call.
+
+    gemini()      — google-genai Client (.aio shares its async pool)
+    gemini_generate() — generate_content() through the model's rate limiter
+    elevenlabs()  — ElevenLabs client on a pooled httpx transport
+    http()        — requests.Session with pooled adapters and default timeouts
+                    (fal.ai queue, storage uploads, CDN downloads)
+
+and the asyncio side used on provider_loop for fan-out:
+
+    gemini_generate_async() — awaitable gemini_generate()
+                              (hedge=True: duplicate past p90 latency, first answer wins;
+                               in batch_mode: queued into a Gemini Batch API job)
+    elevenlabs_async()      — AsyncElevenLabs on a pooled async transport
+    http_async()            — httpx.AsyncClient (fal.ai status polls)
+
+Clients are created lazily on first use, exactly once per process. With
+PROVIDER_BACKEND set (record / replay / synthetic), each client's transport
+goes through provider_backend instead of straight to the network.
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import batch_mode
+import hedging
+import rate_limiter
+import provider_backend
+import provider_loop
+import telemetry
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Gemini request timeout (milliseconds — google-genai HttpOptions unit)
+GEMINI_TIMEOUT_MS = 300_000
+# Rough input-token cost of one image part (for the TPM bucket)
+GEMINI_IMAGE_TOKENS = 258
+
+# ElevenLabs: long narration segments can take a few minutes to synthesize
+ELEVENLABS_TIMEOUT = 300
+ELEVENLABS_MAX_CONNECTIONS = 16
+
+# Plain HTTP (fal.ai queue + storage + CDN)
+HTTP_POOL_HOSTS = 8          # distinct hosts kept warm
+HTTP_POOL_MAXSIZE = 32       # concurrent connections per host
+HTTP_TIMEOUT = (10, 60)      # (connect, read) seconds, used when the caller passes none
+HTTP_RETRIES = 3             # idempotent requests only — never retries a POST submit
+
+# Async clients (provider_loop): one connection pool per client, sized for
+# hundreds of coroutines in flight — rate_limiter still caps what is sent
+ASYNC_MAX_CONNECTIONS = 256
+ASYNC_MAX_KEEPALIVE = 64
+
+_lock = threading.Lock()
+_gemini = None
+_elevenlabs = None
+_http = None
+_elevenlabs_async = None
+_http_async = None
+
+
+# =============================================================================
+# GEMINI
+# =============================================================================
+
+def gemini():
+    """Shared google-genai client."""
+    global _gemini
+    if _gemini is None:
+        with _lock:
+            if _gemini is None:
+                from google import genai
+                from google.genai import types
+
+                api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
+                if not api_key and provider_backend.offline():
+                    api_key = "offline"
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY must be set")
+                import httpx
+
+                http_options = {"timeout": GEMINI_TIMEOUT_MS, "async_client_args": {"transport": _async_transport()}}
+                if provider_backend.active():
+                    http_options["client_args"] = {"transport": provider_backend.httpx_transport(httpx.HTTPTransport())}
+                _gemini = genai.Client(
+                    api_key=api_key,
+                    http_options=types.HttpOptions(**http_options),
+                )
+    return _gemini
+
+
+def _estimate_tokens(contents):
+    """Rough input tokens of generate_content() contents (~4 chars per token)."""
+    if isinstance(contents, str):
+        return len(contents) // 4 + 1
+    if isinstance(contents, (list, tuple)):
+        return sum(_estimate_tokens(part) for part in contents)
+    return GEMINI_IMAGE_TOKENS
+
+
+def _gemini_usage(response):
+    """Token counts and generated images of a generate_content() response (for telemetry + TPM)."""
+    meta = getattr(response, "usage_metadata", None)
+    images = 0
+    for candidate in getattr(response, "candidates", None) or []:
+        parts = getattr(getattr(candidate, "content", None), "parts", None) or []
+        images += sum(1 for part in parts if getattr(part, "inline_data", None))
+    return {
+        "input_tokens": getattr(meta, "prompt_token_count", None),
+        "output_tokens": (getattr(meta, "candidates_token_count", 0) or 0)
+                         + (getattr(meta, "thoughts_token_count", 0) or 0),
+        "images": images,
+    }
+
+
+def gemini_generate(model, contents, config=None, hedge=False):
+    """
+    client.models.generate_content() under the model's RPM/TPM limits.
+
+    Rate limits and transient errors are retried with backoff by rate_limiter,
+    so callers only see errors that survived every retry. With hedge=True the
+    call goes through provider_loop so it can be hedged (see hedging); in
+    batch mode it waits there for its batch job (see batch_mode).
+    """
+    if (batch_mode.active() or hedge and hedging.HEDGING_ENABLED) and not provider_loop.on_loop():
+        with telemetry.attribute():
+            return provider_loop.run(gemini_generate_async(model, contents, config, hedge=hedge))
+    return rate_limiter.call(
+        model, gemini().models.generate_content,
+        model=model, contents=contents, config=config,
+        tokens=_estimate_tokens(contents), meter=_gemini_usage,
+    )
+
+
+async def gemini_generate_async(model, contents, config=None, hedge=False):
+    """
+    gemini_generate() for coroutines on provider_loop (client.aio, same limits and retries).
+
+    hedge=True fires a duplicate request if this one runs past the model's
+    p90 latency and keeps whichever answers first (hedging.hedged()). In
+    batch mode the request joins the model's next Batch API job instead
+    (batch_mode.submit()) and is neither rate limited nor hedged here.
+    """
+    if batch_mode.active():
+        return await batch_mode.submit(gemini().aio, model, contents, config, meter=_gemini_usage)
+    def request(admitted):
+        return rate_limiter.call_async(
+            model, gemini().aio.models.generate_content,
+            model=model, contents=contents, config=config,
+            tokens=_estimate_tokens(contents), meter=_gemini_usage, admitted=admitted,
+        )
+    if hedge:
+        return await hedging.hedged(model, request)
+    return await request(None)
+
+
+# =============================================================================
+# ELEVENLABS
+# =============================================================================
+
+def elevenlabs():
+    """Shared ElevenLabs client (pooled httpx transport, long read timeout)."""
+    global _elevenlabs
+    if _elevenlabs is None:
+        with _lock:
+            if _elevenlabs is None:
+                import httpx
+                from elevenlabs.client import ElevenLabs
+
+                api_key = os.getenv("ELEVENLABS_API_KEY")
+                if not api_key and provider_backend.offline():
+                    api_key = "offline"
+                if not api_key:
+                    raise ValueError("ELEVENLABS_API_KEY not set in environment")
+                limits = httpx.Limits(
+                    max_connections=ELEVENLABS_MAX_CONNECTIONS,
+                    max_keepalive_connections=ELEVENLABS_MAX_CONNECTIONS,
+                )
+                backend = {}
+                if provider_backend.active():
+                    backend["transport"] = provider_backend.httpx_transport(httpx.HTTPTransport(limits=limits))
+                transport = httpx.Client(
+                    timeout=httpx.Timeout(ELEVENLABS_TIMEOUT, connect=10),
+                    limits=limits,
+                    **backend,
+                )
+                _elevenlabs = ElevenLabs(api_key=api_key, httpx_client=transport, timeout=ELEVENLABS_TIMEOUT)
+    return _elevenlabs
+
+
+def elevenlabs_async():
+    """Shared AsyncElevenLabs client for provider_loop (one pool for every TTS coroutine)."""
+    global _elevenlabs_async
+    if _elevenlabs_async is None:
+        with _lock:
+            if _elevenlabs_async is None:
+                import httpx
+                from elevenlabs.client import AsyncElevenLabs
+
+                api_key = os.getenv("ELEVENLABS_API_KEY")
+                if not api_key and provider_backend.offline():
+                    api_key = "offline"
+                if not api_key:
+                    raise ValueError("ELEVENLABS_API_KEY not set in environment")
+                transport = httpx.AsyncClient(
+                    timeout=httpx.Timeout(ELEVENLABS_TIMEOUT, connect=10),
+                    transport=_async_transport(),
+                )
+                _elevenlabs_async = AsyncElevenLabs(api_key=api_key, httpx_client=transport, timeout=ELEVENLABS_TIMEOUT)
+    return _elevenlabs_async
+
+
+# =============================================================================
+# HTTP
+# =============================================================================
+
+class _PooledSession(requests.Session):
+    """requests.Session that applies HTTP_TIMEOUT when a call doesn't set one."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+def http():
+    """Shared keep-alive requests session."""
+    global _http
+    if _http is None:
+        with _lock:
+            if _http is None:
+                retry = Retry(
+                    total=HTTP_RETRIES,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 502, 503, 504),
+                    allowed_methods=frozenset({"GET", "HEAD", "PUT"}),
+                    respect_retry_after_header=True,
+                )
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+                if provider_backend.active():
+                    adapter = provider_backend.requests_adapter(adapter)
+                session = _PooledSession()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http = session
+    return _http
+
+
+def http_async():
+    """Shared httpx.AsyncClient for provider_loop (fal.ai status polls, result fetches)."""
+    global _http_async
+    if _http_async is None:
+        with _lock:
+            if _http_async is None:
+                import httpx
+
+                connect, read = HTTP_TIMEOUT
+                _http_async = httpx.AsyncClient(
+                    timeout=httpx.Timeout(read, connect=connect),
+                    transport=_async_transport(retries=HTTP_RETRIES),
+                    follow_redirects=True,
+                )
+    return _http_async
+
+
+def _async_transport(retries=0):
+    """Pooled async transport, routed through provider_backend when it is active."""
+    import httpx
+
+    limits = httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_KEEPALIVE)
+    transport = httpx.AsyncHTTPTransport(limits=limits, retries=retries)
+    if provider_backend.active():
+        transport = provider_backend.async_httpx_transport(transport)
+    return transport
@@ -0,0 +1,122 @@
+"""
+The Last Shelter — Provider Event Loop
+
+One asyncio event loop, on one daemon thread, that carries the heavy
+provider fan-out: per-scene location images, per-scene video prompts,
+per-segment TTS and fal.ai status polling. A request that is waiting on the
+network costs a coroutine here instead of a worker thread, so a single
+process can keep hundreds of calls in flight — the per-model limits in
+rate_limiter still decide how many actually go out at once.
+
+Worker threads (Flask job threads, CLI scripts) stay synchronous and hand
+work over with:
+
+    provider_loop.run(coro)          — run one coroutine, block for its result
+    provider_loop.run_all(coros)     — run many concurrently, results in order
+                                       (exceptions are returned in place of
+                                       results unless return_exceptions=False)
+
+telemetry / tracing context (project, stage, job, span) rides along with
+the coroutine, so usage and spans are still attributed to the calling job.
+Disk and CPU work inside a coroutine (saving images, MP3 muxing) goes
+through asyncio.to_thread() so it never stalls the loop.
+"""
+import asyncio
+import threading
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+LOOP_THREAD_NAME = "provider-io"
+# Threads available to asyncio.to_thread() for disk/CPU work off the loop
+OFFLOAD_THREADS = 8
+
+_lock = threading.Lock()
+_loop = None
+_thread = None
+
+
+# =============================================================================
+# LOOP
+# =============================================================================
+
+def loop():
+    """The shared provider event loop, started on first use."""
+    global _loop, _thread
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                new_loop = asyncio.new_event_loop()
+                new_loop.set_default_executor(ThreadPoolExecutor(OFFLOAD_THREADS, thread_name_prefix="provider-offload"))
+                ready = threading.Event()
+
+                def serve():
+                    asyncio.set_event_loop(new_loop)
+                    new_loop.call_soon(ready.set)
+                    new_loop.run_forever()
+
+                _thread = threading.Thread(target=serve, name=LOOP_THREAD_NAME, daemon=True)
+                _thread.start()
+                ready.wait()
+                _loop = new_loop
+                print(f"[ProviderLoop] Event loop started on thread '{LOOP_THREAD_NAME}'")
+    return _loop
+
+
+def on_loop():
+    """True when called from the provider loop thread itself."""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def run(coro, timeout=None):
+    """
+    Run a coroutine on the provider loop and block until it finishes.
+
+    Must not be called from a coroutine on the loop (it would wait on itself);
+    there, just await the coroutine.
+    """
+    if on_loop():
+        coro.close()
+        raise RuntimeError("provider_loop.run() called from the provider loop — await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coro, loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+async def gather(coros, return_exceptions=True):
+    """asyncio.gather() over an iterable; by default exceptions come back in place of results."""
+    return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+
+
+def run_all(coros, timeout=None, return_exceptions=True):
+    """Run coroutines concurrently on the provider loop; results (or exceptions) in input order."""
+    coros = list(coros)
+    if not coros:
+        return []
+    return run(gather(coros, return_exceptions), timeout)
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import time
+    import telemetry
+
+    async def fake_call(n):
+        await asyncio.sleep(0.5)
+        if n == 7:
+            raise ValueError("boom")
+        return n * n, telemetry.current()["stage"], threading.current_thread().name
+
+    started = time.perf_counter()
+    with telemetry.context(project="demo", stage="loop_demo"):
+        results = run_all(fake_call(n) for n in range(300))
+    elapsed = time.perf_counter() - started
+    errors = [r for r in results if isinstance(r, Exception)]
+    print(f"300 calls in {elapsed:.2f}s on {threading.active_count()} threads, {len(errors)} error(s): {errors}")
+    print("first result:", results[0])
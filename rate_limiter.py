@@ -0,0 +1,465 @@
+"""
+The Last Shelter — Provider Rate Limiter
+
+One limiter per model/provider key, shared by every thread in the process:
+
+    rate_limiter.call("gemini-2.5-flash", fn, *args, tokens=1200, **kwargs)
+
+- Token buckets for requests/minute (RPM) and tokens/minute (TPM)
+- A concurrency cap on in-flight calls
+- Retries with exponential backoff + full jitter, honoring Retry-After
+  (header, or Gemini's retryDelay) on 429/5xx/transport errors
+- AIMD learning: every 429 cuts the key's rate to what was actually being
+  achieved and remembers that as its ceiling; clean streaks creep back up,
+  and the ceiling relaxes toward the configured limit over time
+- Every settled call (latency, retries, queue wait, usage) is reported to telemetry
+
+Limits live in config/rate_limits.json (per key, with a "default" entry).
+Keys missing from the file use the defaults the caller passes, then "default".
+"""
+import re
+import json
+import asyncio
+import time
+import random
+import threading
+from collections import deque
+from pathlib import Path
+
+import telemetry
+import tracing
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+CONFIG_PATH = Path(__file__).parent / "config" / "rate_limits.json"
+
+# Retries for rate-limited / transient failures before giving up
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0           # seconds, doubled per attempt
+BACKOFF_MAX = 60.0
+
+# AIMD: on a 429 drop to this share of the rate that was being achieved...
+THROTTLE_DECREASE = 0.7
+# ...then win back this share of the configured rate after every clean streak
+RECOVERY_STEP = 0.05
+RECOVERY_STREAK = 20
+# Learned ceilings relax 10% toward the configured limit after this long without a 429
+CEILING_RELAX_SECONDS = 600
+
+# Token-bucket burst: at most this many seconds' worth of quota at once
+BURST_SECONDS = 10
+
+# Coroutines waiting on a full concurrency cap re-check this often
+ASYNC_POLL_SECONDS = 0.05
+ASYNC_POLL_MAX = 1.0
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+_RETRY_MARKERS = ("UNAVAILABLE", "DEADLINE_EXCEEDED", "rate limit", "Too Many Requests")
+# requests / httpx transport failures (class names, so neither library has to be imported)
+_TRANSIENT_ERRORS = ("ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout", "ChunkedEncodingError",
+                     "RemoteProtocolError", "ReadError", "ConnectError", "TimeoutException")
+
+
+# =============================================================================
+# ERROR CLASSIFICATION
+# =============================================================================
+
+def _status_of(error):
+    """HTTP status carried by a provider SDK / requests exception, if any."""
+    for attr in ("status_code", "code", "status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    if isinstance(value, int):
+        return value
+    match = re.search(r"\b(429|500|502|503|504)\b", str(error)[:300])
+    return int(match.group(1)) if match else None
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait (Retry-After header or Gemini retryDelay), or None."""
+    for source in (getattr(error, "headers", None), getattr(getattr(error, "response", None), "headers", None)):
+        try:
+            value = source and source.get("retry-after")
+        except Exception:
+            value = None
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(error))
+    return float(match.group(1)) if match else None
+
+
+def is_rate_limit(error):
+    return _status_of(error) == 429 or "RESOURCE_EXHAUSTED" in str(error)[:500]
+
+
+def is_retryable(error, statuses=RETRY_STATUSES):
+    """Worth retrying: a listed status, a rate-limit message, or (if 5xx are listed) a transport error."""
+    status = _status_of(error)
+    if status is not None:
+        return status in statuses
+    if 429 in statuses and is_rate_limit(error):
+        return True
+    if 503 not in statuses:
+        return False
+    if type(error).__name__ in _TRANSIENT_ERRORS:
+        return True
+    text = str(error)[:500]
+    return any(marker in text for marker in _RETRY_MARKERS)
+
+
+# =============================================================================
+# LIMITER
+# =============================================================================
+
+class _Bucket:
+    """Token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute):
+        self.rate = float(rate_per_minute)
+        self.capacity = max(1.0, self.rate * BURST_SECONDS / 60)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` tokens are available (0 = now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)     # a huge request waits for a full bucket, not forever
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) * 60 / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def set_rate(self, rate_per_minute):
+        self._refill(time.monotonic())
+        self.rate = max(0.1, float(rate_per_minute))
+        self.capacity = max(1.0, self.rate * BURST_SECONDS / 60)
+        self.tokens = min(self.tokens, self.capacity)
+
+
+class Limiter:
+    """RPM/TPM buckets + concurrency cap + 429 learning for one key."""
+
+    def __init__(self, key, rpm=None, tpm=None, concurrency=None):
+        self.key = key
+        self.configured_rpm = rpm
+        self.configured_concurrency = concurrency
+        self.rpm = _Bucket(rpm) if rpm else None
+        self.tpm = _Bucket(tpm) if tpm else None
+        self.concurrency = concurrency
+        self.ceiling_rpm = rpm
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.streak = 0
+        self.last_throttle = 0.0
+        self.ceiling_relaxed_at = 0.0
+        self.recent = deque()        # monotonic times of recent calls (last 60s)
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "failures": 0, "waited_seconds": 0.0}
+        self._cond = threading.Condition()
+
+    # --- acquire / release ---
+
+    def _admit(self, tokens, now):
+        """
+        Take a slot if the call may start now (lock held).
+
+        Returns None when admitted, else seconds until it might be
+        (0 = unknown: waiting on the concurrency cap, retry on release).
+        """
+        waits = [self.blocked_until - now]
+        if self.concurrency and self.in_flight >= self.concurrency:
+            waits.append(None)
+        if self.rpm:
+            waits.append(self.rpm.wait_time(1, now))
+        if self.tpm and tokens:
+            waits.append(self.tpm.wait_time(tokens, now))
+        if None not in waits and max(waits) <= 0:
+            if self.rpm:
+                self.rpm.take(1)
+            if self.tpm and tokens:
+                self.tpm.take(tokens)
+            self.in_flight += 1
+            self.recent.append(now)
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            self.stats["calls"] += 1
+            return None
+        timed = [w for w in waits if w is not None and w > 0]
+        return min(timed) if timed else 0.0
+
+    def acquire(self, tokens=0):
+        """Block until the call may start. Returns seconds waited."""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._admit(tokens, now)
+                if wait is None:
+                    break
+                self._cond.wait(wait or None)
+            waited = now - start
+            self.stats["waited_seconds"] += waited
+            return waited
+
+    async def acquire_async(self, tokens=0):
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the thread."""
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                wait = self._admit(tokens, now)
+                if wait is None:
+                    waited = now - start
+                    self.stats["waited_seconds"] += waited
+                    return waited
+            # Releases notify threads, not the event loop — poll the concurrency cap
+            await asyncio.sleep(min(wait, ASYNC_POLL_MAX) if wait else ASYNC_POLL_SECONDS)
+
+    def release(self, success=True, tokens_estimated=0, tokens_used=None):
+        with self._cond:
+            self.in_flight -= 1
+            if self.tpm and tokens_used is not None:
+                # Settle the estimate against what the provider actually counted
+                self.tpm.tokens -= tokens_used - min(tokens_estimated, self.tpm.capacity)
+            if success:
+                self._on_success()
+            self._cond.notify_all()
+
+    def saturated(self):
+        """True while every concurrency slot is taken."""
+        with self._cond:
+            return bool(self.concurrency) and self.in_flight >= self.concurrency
+
+    # --- learning ---
+
+    def _on_success(self):
+        self.streak += 1
+        now = time.monotonic()
+        if (self.configured_rpm and self.ceiling_rpm < self.configured_rpm
+                and now - max(self.last_throttle, self.ceiling_relaxed_at) > CEILING_RELAX_SECONDS):
+            self.ceiling_rpm = min(self.configured_rpm, self.ceiling_rpm * 1.1)
+            self.ceiling_relaxed_at = now
+        if self.streak >= RECOVERY_STREAK:
+            self.streak = 0
+            if self.rpm and self.rpm.rate < self.ceiling_rpm:
+                self.rpm.set_rate(min(self.ceiling_rpm, self.rpm.rate + self.configured_rpm * RECOVERY_STEP))
+            if self.configured_concurrency and self.concurrency < self.configured_concurrency:
+                self.concurrency += 1
+
+    def throttled(self, wait_seconds):
+        """A 429: back off everyone on this key and learn a lower ceiling."""
+        with self._cond:
+            now = time.monotonic()
+            self.stats["throttled"] += 1
+            self.streak = 0
+            self.last_throttle = now
+            self.blocked_until = max(self.blocked_until, now + wait_seconds)
+            if self.rpm:
+                # Calls/minute actually achieved over the last (up to) 60 seconds
+                window = [t for t in self.recent if now - t <= 60]
+                span = max(1.0, now - window[0]) if window else 60.0
+                achieved = len(window) * 60 / span if span >= 60 or len(window) > 1 else self.rpm.rate
+                current = min(self.rpm.rate, achieved)
+                self.ceiling_rpm = max(1.0, current)
+                self.rpm.set_rate(max(1.0, current * THROTTLE_DECREASE))
+            if self.concurrency and self.concurrency > 1:
+                self.concurrency -= 1
+            learned = f"rpm → {self.rpm.rate:.0f} (ceiling {self.ceiling_rpm:.0f})" if self.rpm else ""
+            print(f"[RateLimit] {self.key}: 429 — pausing {wait_seconds:.1f}s, {learned} concurrency → {self.concurrency}")
+            self._cond.notify_all()
+
+    def count(self, stat):
+        with self._cond:
+            self.stats[stat] += 1
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "rpm": round(self.rpm.rate, 1) if self.rpm else None,
+                "ceiling_rpm": round(self.ceiling_rpm, 1) if self.ceiling_rpm else None,
+                "configured_rpm": self.configured_rpm,
+                "tpm": self.tpm.rate if self.tpm else None,
+                "concurrency": self.concurrency,
+                "in_flight": self.in_flight,
+                **{k: round(v, 2) if isinstance(v, float) else v for k, v in self.stats.items()},
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_config = None
+
+
+def _load_config():
+    global _config
+    if _config is None:
+        try:
+            with open(CONFIG_PATH) as f:
+                _config = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[RateLimit] No usable {CONFIG_PATH.name} ({e}) — using built-in defaults")
+            _config = {}
+    return _config
+
+
+def limiter(key, defaults=None):
+    """
+    Shared Limiter for a key (model ID or provider name).
+
+    Args:
+        defaults: rpm/tpm/concurrency used when config/rate_limits.json has no entry for key
+    """
+    if key not in _limiters:
+        with _limiters_lock:
+            if key not in _limiters:
+                config = _load_config()
+                settings = config.get(key) or defaults or config.get("default") or {}
+                _limiters[key] = Limiter(
+                    key, rpm=settings.get("rpm"), tpm=settings.get("tpm"), concurrency=settings.get("concurrency"),
+                )
+    return _limiters[key]
+
+
+def _failed(lim, key, error, attempt, started, queued, began, retry_statuses, max_retries):
+    """
+    Settle a failed attempt. Re-raises once retries are exhausted or the error
+    isn't retryable; otherwise returns the backoff (seconds) to sleep before the next
+    attempt — 0 after a 429, whose pause is paid inside the next acquire().
+    """
+    lim.release(success=False)
+    if attempt >= max_retries or not is_retryable(error, retry_statuses):
+        lim.count("failures")
+        telemetry.record(key, time.monotonic() - started, ok=False, retries=attempt,
+                         queue_seconds=queued, error=type(error).__name__)
+        tracing.record_span(key, began, retries=attempt, queue_seconds=round(queued, 3),
+                            error=type(error).__name__)
+        raise error
+    hinted = retry_after(error)
+    backoff = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    wait = max(hinted or 0, backoff)
+    lim.count("retries")
+    if is_rate_limit(error):
+        lim.throttled(wait)
+        return 0.0
+    return wait
+
+
+def _succeeded(lim, key, result, tokens, meter, attempt, started, queued, began):
+    latency = time.monotonic() - started
+    usage = {}
+    if meter:
+        try:
+            usage = meter(result) or {}
+        except Exception:
+            usage = {}
+    lim.release(success=True, tokens_estimated=tokens, tokens_used=usage.get("input_tokens"))
+    telemetry.record(key, latency, retries=attempt, queue_seconds=queued, usage=usage)
+    tracing.record_span(key, began, retries=attempt, queue_seconds=round(queued, 3), **usage)
+
+
+def call(key, fn, *args, tokens=0, meter=None, defaults=None, retry_statuses=RETRY_STATUSES,
+         max_retries=MAX_RETRIES, **kwargs):
+    """
+    Run fn(*args, **kwargs) under the key's limits, retrying rate limits and transient errors.
+
+    Args:
+        key: Limiter key (model ID, "elevenlabs", "fal", ...)
+        tokens: Estimated tokens this call spends against the TPM bucket
+        meter: Optional fn(result) -> usage dict (input_tokens, output_tokens, images,
+               characters, video_seconds) for telemetry; input_tokens also settles
+               the TPM estimate
+        defaults: Limits for keys not in config/rate_limits.json
+        retry_statuses: HTTP statuses worth retrying — pass (429,) for non-idempotent calls
+
+    Returns:
+        Whatever fn returns; re-raises the last error once retries are exhausted
+    """
+    lim = limiter(key, defaults)
+    attempt = 0
+    queued = 0.0
+    began = time.perf_counter()
+    while True:
+        queued += lim.acquire(tokens)
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            wait = _failed(lim, key, e, attempt, started, queued, began, retry_statuses, max_retries)
+            time.sleep(wait)
+            queued += wait
+            attempt += 1
+            continue
+        _succeeded(lim, key, result, tokens, meter, attempt, started, queued, began)
+        return result
+
+
+async def call_async(key, fn, *args, tokens=0, meter=None, defaults=None, retry_statuses=RETRY_STATUSES,
+                     max_retries=MAX_RETRIES, admitted=None, **kwargs):
+    """
+    call() for coroutine functions: `await call_async(key, client.aio.models.generate_content, ...)`.
+
+    Same limiter (shared with threaded callers), retries, telemetry and trace spans;
+    waits are asyncio sleeps, so hundreds of calls can queue on one event loop.
+    `admitted` (an asyncio.Event) is set when the first attempt is let through.
+    A cancelled call (e.g. the losing half of a hedge) gives its slot back.
+    """
+    lim = limiter(key, defaults)
+    attempt = 0
+    queued = 0.0
+    began = time.perf_counter()
+    while True:
+        queued += await lim.acquire_async(tokens)
+        if admitted is not None:
+            admitted.set()
+        started = time.monotonic()
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            lim.release(success=False)
+            raise
+        except Exception as e:
+            wait = _failed(lim, key, e, attempt, started, queued, began, retry_statuses, max_retries)
+            await asyncio.sleep(wait)
+            queued += wait
+            attempt += 1
+            continue
+        _succeeded(lim, key, result, tokens, meter, attempt, started, queued, began)
+        return result
+
+
+def snapshot():
+    """Current limits and counters for every key that has been used."""
+    return {key: lim.snapshot() for key, lim in sorted(_limiters.items())}
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    class _Fake429(Exception):
+        status_code = 429
+        headers = {"retry-after": "0.2"}
+
+    calls = {"n": 0}
+
+    def flaky():
+        calls["n"] += 1
+        if calls["n"] % 7 == 0:
+            raise _Fake429("Too Many Requests")
+        return calls["n"]
+
+    start = time.time()
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: call("demo", flaky, defaults={"rpm": 600, "concurrency": 4}), range(40)))
+    print(f"{len(results)} calls in {time.time() - start:.1f}s")
+    print(json.dumps(snapshot(), indent=2))
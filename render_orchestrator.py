@@ -0,0 +1,347 @@
+"""
+The Last Shelter — Render Orchestrator
+
+Renders every clip of a production block (intro, chapter_N, break_N, close)
+through Kling on fal.ai as one batch instead of submit → wait → download per
+clip:
+
+1. Submit clips up to a concurrency limit (fal queue slots)
+2. One loop tracks every in-flight request: completion webhooks when
+   FAL_WEBHOOK_URL is set (polling only as a late fallback), otherwise
+   polling with per-request adaptive backoff — every request that is due
+   is polled at once on provider_loop
+3. Finished clips download in parallel while the rest keep rendering
+
+State is saved to production/<block>/render_state.json on every transition,
+so a restarted server resumes in-flight renders by request ID instead of
+paying for them twice.
+
+Layout:
+    production/<block>/
+    ├── storyboard.json
+    ├── images/scene_XX.png      # start frames
+    ├── clips/scene_XX.mp4       # rendered clips
+    └── render_state.json
+"""
+import os
+import re
+import json
+import time
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import fal_client
+import provider_loop
+import webhooks
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Concurrent fal requests per block (fal account concurrency limit)
+RENDER_MAX_CONCURRENT = int(os.getenv("FAL_MAX_CONCURRENT", "8"))
+# Parallel clip downloads, and byte ranges per large clip
+RENDER_DOWNLOAD_WORKERS = 4
+RENDER_DOWNLOAD_RANGES = 4
+# Give up on a clip that has not finished this long after submission
+RENDER_CLIP_TIMEOUT = 1800
+# Resubmit a failed clip this many times before marking it failed
+RENDER_MAX_ATTEMPTS = 2
+
+KLING_MIN_DURATION = 3
+KLING_MAX_DURATION = 15
+
+# Clip lifecycle
+PENDING, SUBMITTED, COMPLETED, DOWNLOADED, FAILED = "pending", "submitted", "completed", "downloaded", "failed"
+
+
+# =============================================================================
+# PLAN
+# =============================================================================
+
+def _clip_duration(scene):
+    """Kling duration from a storyboard duration like '10s' or 8."""
+    match = re.search(r"\d+", str(scene.get("duration", "")))
+    seconds = int(match.group()) if match else 5
+    return max(KLING_MIN_DURATION, min(KLING_MAX_DURATION, seconds))
+
+
+def _clip_prompt(scene):
+    prompt = scene.get("prompt") or {}
+    if isinstance(prompt, str):
+        return prompt
+    text = prompt.get("prompt_text", "") or scene.get("visual_description", "")
+    if prompt.get("sfx"):
+        text += f" Audio: {prompt['sfx']}"
+    return text
+
+
+def plan_block(block_dir, scene_numbers=None):
+    """
+    List the renderable clips of a block from its storyboard.
+
+    A scene is renderable when it has a start frame on disk and a prompt.
+
+    Returns:
+        List of dicts: scene_number, prompt, start_image, duration, output
+    """
+    block_dir = Path(block_dir)
+    with open(block_dir / "storyboard.json") as f:
+        storyboard = json.load(f)
+    if isinstance(storyboard, dict):   # chapter packages save a bare list
+        storyboard = storyboard.get("storyboard") or storyboard.get("scenes") or []
+
+    clips = []
+    for index, scene in enumerate(storyboard):
+        # _normalize_storyboard() renames scene_number to scene_num
+        number = int(scene.get("scene_number") or scene.get("scene_num") or index + 1)
+        if scene_numbers and number not in scene_numbers:
+            continue
+        image = scene.get("scene_image")
+        prompt = _clip_prompt(scene)
+        if not image or not prompt or not (block_dir / "images" / image).exists():
+            continue
+        clips.append({
+            "scene_number": number,
+            "prompt": prompt,
+            "start_image": str(block_dir / "images" / image),
+            "duration": _clip_duration(scene),
+            "output": str(block_dir / "clips" / f"scene_{number:02d}.mp4"),
+        })
+    return clips
+
+
+# =============================================================================
+# STATE
+# =============================================================================
+
+class RenderState:
+    """render_state.json — one entry per clip, saved atomically on every change."""
+
+    def __init__(self, block_dir):
+        self.path = Path(block_dir) / "render_state.json"
+        self._lock = threading.Lock()
+        self.data = {"clips": {}}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.data = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                pass
+        self.data.setdefault("clips", {})
+
+    def clip(self, scene_number):
+        return self.data["clips"].get(str(scene_number), {})
+
+    def update(self, scene_number, **fields):
+        with self._lock:
+            entry = self.data["clips"].setdefault(str(scene_number), {})
+            entry.update(fields)
+            entry["updated_at"] = time.time()
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            return dict(entry)
+
+    def summary(self):
+        counts = {}
+        for entry in self.data["clips"].values():
+            counts[entry.get("status", PENDING)] = counts.get(entry.get("status", PENDING), 0) + 1
+        return counts
+
+
+def load_render_state(block_dir):
+    """Current render_state.json contents (empty if the block was never rendered)."""
+    return RenderState(block_dir).data
+
+
+# =============================================================================
+# ORCHESTRATOR
+# =============================================================================
+
+def render_block(block_dir, scene_numbers=None, max_concurrent=None, force=False, progress_callback=None):
+    """
+    Render all clips of a block via Kling on fal.ai, resuming any previous run.
+
+    Args:
+        block_dir: production/<block> directory
+        scene_numbers: Optional subset of scene numbers to render
+        max_concurrent: In-flight fal requests (default RENDER_MAX_CONCURRENT)
+        force: Re-render clips that were already downloaded
+        progress_callback: Optional callback(message, type)
+
+    Returns:
+        Dict with counts per status and the per-clip state
+    """
+    block_dir = Path(block_dir)
+    max_concurrent = max_concurrent or RENDER_MAX_CONCURRENT
+    state = RenderState(block_dir)
+    clips = plan_block(block_dir, scene_numbers)
+
+    def log(message, msg_type="info"):
+        print(f"[Render] {message}")
+        if progress_callback:
+            progress_callback(message, msg_type)
+
+    if not clips:
+        log("No renderable scenes (need scene_image + prompt)", "error")
+        return {"counts": {}, "clips": state.data["clips"]}
+
+    pending = []        # clips waiting for a queue slot
+    in_flight = {}      # scene_number -> {"clip", "next_poll", "interval", "status"}
+    downloads = {}      # scene_number -> Future
+
+    # --- Resume from saved state ---
+    for clip in clips:
+        number = clip["scene_number"]
+        entry = state.clip(number)
+        status = entry.get("status")
+        if force and status in (DOWNLOADED, COMPLETED, FAILED):
+            status = None
+        if status == DOWNLOADED and Path(entry.get("local_path", "")).exists():
+            continue
+        if status == SUBMITTED and entry.get("request_id"):
+            in_flight[number] = {"clip": clip, "next_poll": 0, "interval": 0, "status": entry.get("fal_status", "")}
+        elif status in (COMPLETED, DOWNLOADED) and entry.get("video_url"):
+            pending.append(dict(clip, video_url=entry["video_url"]))
+        else:
+            state.update(number, status=PENDING, attempts=0, error=None)
+            pending.append(clip)
+
+    already_done = len(clips) - len(pending) - len(in_flight)
+    log(f"🎬 Rendering {len(clips)} clips ({already_done} done, {len(in_flight)} resuming, "
+        f"{len(pending)} to go) — {max_concurrent} concurrent", "batch")
+
+    pool = ThreadPoolExecutor(max_workers=RENDER_DOWNLOAD_WORKERS)
+
+    def download(clip, video_url):
+        number = clip["scene_number"]
+        local_path = fal_client.download_video(
+            video_url, clip["output"],
+            expected_size=state.clip(number).get("video_size"),
+            parallel_ranges=RENDER_DOWNLOAD_RANGES,
+        )
+        state.update(number, status=DOWNLOADED, local_path=local_path)
+        log(f"  💾 scene_{number:02d}.mp4 saved", "success")
+
+    def start_download(clip, video_url):
+        downloads[clip["scene_number"]] = pool.submit(download, clip, video_url)
+
+    def fail(clip, error):
+        number = clip["scene_number"]
+        attempts = state.clip(number).get("attempts", 0)
+        if attempts < RENDER_MAX_ATTEMPTS:
+            state.update(number, status=PENDING, error=str(error)[:300])
+            pending.append(clip)
+            log(f"  ⚠️ Scene {number} failed ({error}) — retrying", "warning")
+        else:
+            state.update(number, status=FAILED, error=str(error)[:300])
+            log(f"  ❌ Scene {number} failed: {error}", "error")
+
+    try:
+        while pending or in_flight:
+            now = time.time()
+
+            # --- Fill free queue slots ---
+            while pending and len(in_flight) < max_concurrent:
+                clip = pending.pop(0)
+                number = clip["scene_number"]
+                if clip.get("video_url"):
+                    start_download(clip, clip["video_url"])
+                    continue
+                try:
+                    submission = fal_client.submit_video_generation(
+                        prompt=clip["prompt"],
+                        start_image_path=clip["start_image"],
+                        duration=clip["duration"],
+                    )
+                except Exception as e:
+                    state.update(number, attempts=state.clip(number).get("attempts", 0) + 1)
+                    fail(clip, e)
+                    continue
+                state.update(
+                    number, status=SUBMITTED, request_id=submission["request_id"],
+                    status_url=submission.get("status_url"), response_url=submission.get("response_url"),
+                    submitted_at=time.time(), attempts=state.clip(number).get("attempts", 0) + 1,
+                )
+                # With webhooks on, polling is only a late fallback
+                first_poll = webhooks.WEBHOOK_POLL_FALLBACK if webhooks.enabled() else fal_client.POLL_MIN_INTERVAL
+                in_flight[number] = {"clip": clip, "next_poll": time.time() + first_poll,
+                                     "interval": 0, "status": "IN_QUEUE"}
+                log(f"  📤 Scene {number} submitted ({clip['duration']}s)")
+
+            # --- Collect webhook deliveries, poll whichever requests are due (all at once) ---
+            updates = {}        # scene_number -> (status_data, delivered result or None)
+            due = []
+            for number, track in in_flight.items():
+                delivered = webhooks.result(state.clip(number)["request_id"])
+                if delivered:
+                    updates[number] = ({"status": delivered["status"], "error": delivered.get("error")},
+                                       delivered["payload"])
+                elif track["next_poll"] <= now:
+                    due.append(number)
+            polled = provider_loop.run_all(
+                fal_client.check_status_async(state.clip(number)["request_id"],
+                                              status_url=state.clip(number).get("status_url"))
+                for number in due
+            )
+            for number, status_data in zip(due, polled):
+                if isinstance(status_data, Exception):
+                    status_data = {"status": in_flight[number]["status"], "error": str(status_data)}
+                updates[number] = (status_data, None)
+
+            for number, (status_data, result) in updates.items():
+                track = in_flight[number]
+                entry = state.clip(number)
+                clip = track["clip"]
+                status = status_data.get("status", "UNKNOWN")
+                changed = status != track["status"]
+                track["status"] = status
+                if changed:
+                    state.update(number, fal_status=status)
+
+                if status == "COMPLETED":
+                    del in_flight[number]
+                    try:
+                        result = result or fal_client.get_result(entry["request_id"], response_url=entry.get("response_url"))
+                        video_url = (result.get("video") or {}).get("url")
+                        if not video_url:
+                            raise Exception(f"No video URL in result: {str(result)[:200]}")
+                    except Exception as e:
+                        fail(clip, e)
+                        continue
+                    state.update(number, status=COMPLETED, video_url=video_url,
+                                 video_size=(result.get("video") or {}).get("file_size"))
+                    log(f"  ✅ Scene {number} rendered — downloading")
+                    start_download(clip, video_url)
+                elif status in ("FAILED", "CANCELLED"):
+                    del in_flight[number]
+                    fail(clip, status_data.get("error", status))
+                elif time.time() - entry.get("submitted_at", now) > RENDER_CLIP_TIMEOUT:
+                    del in_flight[number]
+                    fail(clip, f"timed out after {RENDER_CLIP_TIMEOUT}s")
+                else:
+                    track["interval"] = fal_client.next_poll_interval(track["interval"], changed)
+                    track["next_poll"] = time.time() + track["interval"]
+
+            # --- Sleep until the next poll is due or a webhook arrives ---
+            if in_flight and not (pending and len(in_flight) < max_concurrent):
+                wait = min(t["next_poll"] for t in in_flight.values()) - time.time()
+                if wait > 0:
+                    webhooks.wait_any(wait)
+
+        for number, future in downloads.items():
+            try:
+                future.result()
+            except Exception as e:
+                state.update(number, status=COMPLETED, error=f"download failed: {e}"[:300])
+                log(f"  ❌ Scene {number} download failed: {e}", "error")
+    finally:
+        pool.shutdown(wait=True)
+
+    counts = state.summary()
+    log(f"🎬 Render finished: {counts.get(DOWNLOADED, 0)}/{len(clips)} clips ready"
+        + (f", {counts[FAILED]} failed" if counts.get(FAILED) else ""), "success")
+    return {"counts": counts, "clips": state.data["clips"]}
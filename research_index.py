@@ -0,0 +1,388 @@
+"""
+The Last Shelter — Research Index
+
+Offline full-text index over the survival literature in resources/*_full.txt
+(Hatchet, Proenneke, Wild, ...). Used to ground story retries and encyclopedia
+research with real passages instead of Google Search round-trips.
+
+Layout (built once, rebuilt automatically when a source book changes):
+    resources/.research_index/
+    ├── meta.json        # source signature, chunk count, avg chunk length
+    ├── lexicon.json     # term -> [postings offset, document frequency]
+    ├── postings.bin     # uint32 pairs (chunk_id, term_frequency), memory-mapped
+    ├── chunks.bin       # UTF-8 passage text, memory-mapped
+    └── chunk_table.bin  # per chunk: uint64 start, uint32 length, uint32 word_count, uint32 source_id
+
+Usage:
+    passages = research_index.search("saddle notch log cabin", top_k=5)
+    prompt += research_index.format_passages(passages)
+"""
+import os
+import re
+import json
+import math
+import mmap
+import heapq
+import shutil
+import struct
+import threading
+from array import array
+from pathlib import Path
+from collections import Counter, defaultdict
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+BASE_DIR = Path(__file__).parent
+RESOURCES_DIR = BASE_DIR / "resources"
+INDEX_DIR = RESOURCES_DIR / ".research_index"
+SOURCE_GLOB = "*_full.txt"
+
+INDEX_VERSION = 1
+
+# Passage chunking — ~180 words per passage, overlapping so a technique
+# described across a chunk boundary is still retrievable as one passage
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SOURCE_TITLES = {
+    "darkest_places_full.txt": "The Darkest Places (Outside Magazine)",
+    "greatest_survival_full.txt": "The Greatest Survival Stories of All Time (Cara Tabachnick)",
+    "hatchet_full.txt": "Hatchet (Gary Paulsen)",
+    "proenneke_handcrafted_full.txt": "The Handcrafted Life of Dick Proenneke (Monroe Robinson)",
+    "walk_in_woods_full.txt": "A Walk in the Woods (Bill Bryson)",
+    "wild_full.txt": "Wild (Cheryl Strayed)",
+}
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers herself him himself his how i if in into is it its itself
+just me more most my myself no nor not now of off on once only or other our ours ourselves out
+over own same she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours yourself yourselves said one two also
+""".split())
+
+_CHUNK_RECORD = struct.Struct("<QIII")  # start, length, word_count, source_id
+_POSTING = struct.Struct("<II")         # chunk_id, term_frequency
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+# =============================================================================
+# TOKENIZATION
+# =============================================================================
+
+def _stem(word):
+    """Light suffix stripping so 'notching', 'notched' and 'notches' meet at 'notch'."""
+    if len(word) <= 4:
+        return word
+    for suffix, replacement in (("ies", "y"), ("sses", "ss"), ("ing", ""), ("ed", ""), ("es", ""), ("s", "")):
+        if word.endswith(suffix) and not word.endswith("ss"):
+            stem = word[:-len(suffix)] + replacement
+            if len(stem) >= 3:
+                return stem
+    return word
+
+
+def tokenize(text):
+    """Lowercase, drop stopwords and single characters, stem."""
+    tokens = []
+    for word in _WORD_RE.findall(text.lower()):
+        word = word.split("'")[0]
+        if len(word) < 2 or word in STOPWORDS or word.isdigit():
+            continue
+        tokens.append(_stem(word))
+    return tokens
+
+
+def _clean_book_text(raw):
+    """Re-flow hard-wrapped book text: join lines, repair hyphenated line breaks."""
+    text = raw.replace("\r\n", "\n")
+    text = re.sub(r"-\s*\n\s*", "", text)      # hyphenation at line end
+    text = re.sub(r"\s*\n\s*", " ", text)        # hard wraps
+    text = re.sub(r"\s{2,}", " ", text)
+    return text.strip()
+
+
+def chunk_text(raw, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Split a book into overlapping passages on sentence boundaries."""
+    sentences = [s for s in _SENTENCE_RE.split(_clean_book_text(raw)) if s.strip()]
+    chunks = []
+    current = []
+    current_words = 0
+
+    for sentence in sentences:
+        words = len(sentence.split())
+        current.append(sentence)
+        current_words += words
+        if current_words >= chunk_words:
+            chunks.append(" ".join(current))
+            # Carry the tail sentences forward as overlap
+            carry = []
+            carry_words = 0
+            for s in reversed(current):
+                carry_words += len(s.split())
+                if carry_words > overlap:
+                    break
+                carry.insert(0, s)
+            current = carry
+            current_words = sum(len(s.split()) for s in carry)
+
+    if current and (not chunks or current_words > overlap):
+        chunks.append(" ".join(current))
+    return chunks
+
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def _source_files():
+    return sorted(RESOURCES_DIR.glob(SOURCE_GLOB))
+
+
+def _source_signature(files):
+    return [{"name": p.name, "size": p.stat().st_size, "mtime": int(p.stat().st_mtime)} for p in files]
+
+
+def build_index(progress_callback=None):
+    """
+    Chunk every source book and write the on-disk inverted index.
+
+    Writes into a temp directory and swaps it in, so readers never see a half-built index.
+
+    Returns:
+        Dict with chunk/term counts
+    """
+    files = _source_files()
+    tmp_dir = INDEX_DIR.with_name(INDEX_DIR.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    postings = defaultdict(list)  # term -> [(chunk_id, tf)]
+    chunk_records = []
+    total_words = 0
+    offset = 0
+    chunk_id = 0
+
+    with open(tmp_dir / "chunks.bin", "wb") as chunks_out:
+        for source_id, path in enumerate(files):
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                passages = chunk_text(f.read())
+
+            if progress_callback:
+                progress_callback(f"📚 Indexing {path.name}: {len(passages)} passages", "info")
+
+            for passage in passages:
+                terms = tokenize(passage)
+                if not terms:
+                    continue
+                for term, tf in Counter(terms).items():
+                    postings[term].append((chunk_id, min(tf, 0xFFFFFFFF)))
+
+                encoded = passage.encode("utf-8")
+                chunks_out.write(encoded)
+                chunk_records.append(_CHUNK_RECORD.pack(offset, len(encoded), len(terms), source_id))
+                offset += len(encoded)
+                total_words += len(terms)
+                chunk_id += 1
+
+    with open(tmp_dir / "chunk_table.bin", "wb") as f:
+        f.write(b"".join(chunk_records))
+
+    lexicon = {}
+    with open(tmp_dir / "postings.bin", "wb") as f:
+        position = 0
+        for term in sorted(postings):
+            plist = postings[term]
+            f.write(b"".join(_POSTING.pack(cid, tf) for cid, tf in plist))
+            lexicon[term] = [position, len(plist)]
+            position += len(plist)
+
+    with open(tmp_dir / "lexicon.json", "w") as f:
+        json.dump(lexicon, f, separators=(",", ":"))
+
+    meta = {
+        "version": INDEX_VERSION,
+        "sources": _source_signature(files),
+        "chunk_count": chunk_id,
+        "avg_chunk_words": round(total_words / max(1, chunk_id), 3),
+        "term_count": len(lexicon),
+        "chunk_words": CHUNK_WORDS,
+        "chunk_overlap": CHUNK_OVERLAP,
+    }
+    with open(tmp_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+    if INDEX_DIR.exists():
+        shutil.rmtree(INDEX_DIR)
+    os.replace(tmp_dir, INDEX_DIR)
+
+    if progress_callback:
+        progress_callback(f"✅ Research index built: {chunk_id} passages, {len(lexicon)} terms", "success")
+
+    return {"chunk_count": chunk_id, "term_count": len(lexicon)}
+
+
+# =============================================================================
+# QUERY
+# =============================================================================
+
+class ResearchIndex:
+    """Read-only view over a built index. Postings and passages stay memory-mapped."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        index_dir = Path(index_dir)
+        with open(index_dir / "meta.json") as f:
+            self.meta = json.load(f)
+        with open(index_dir / "lexicon.json") as f:
+            self.lexicon = json.load(f)
+
+        self._files = []
+        self.postings = self._map(index_dir / "postings.bin")
+        self.chunks = self._map(index_dir / "chunks.bin")
+        self.chunk_table = self._map(index_dir / "chunk_table.bin")
+
+        self.sources = [s["name"] for s in self.meta.get("sources", [])]
+        self.chunk_count = self.meta.get("chunk_count", 0)
+        self.avg_chunk_words = self.meta.get("avg_chunk_words", 1) or 1
+
+    def _map(self, path):
+        f = open(path, "rb")
+        self._files.append(f)
+        if os.path.getsize(path) == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _chunk_record(self, chunk_id):
+        return _CHUNK_RECORD.unpack_from(self.chunk_table, chunk_id * _CHUNK_RECORD.size)
+
+    def passage(self, chunk_id):
+        start, length, _, source_id = self._chunk_record(chunk_id)
+        name = self.sources[source_id] if source_id < len(self.sources) else "unknown"
+        return {
+            "chunk_id": chunk_id,
+            "source": name,
+            "title": SOURCE_TITLES.get(name, name.replace("_full.txt", "").replace("_", " ").title()),
+            "text": self.chunks[start:start + length].decode("utf-8", errors="ignore"),
+        }
+
+    def search(self, query, top_k=5, max_per_source=2):
+        """
+        BM25 ranking of passages for a free-text query.
+
+        Args:
+            query: Free text (topic name, story title, failed check names...)
+            top_k: Number of passages to return
+            max_per_source: Cap per book so one long book can't crowd out the rest
+
+        Returns:
+            List of passage dicts with score and coverage (share of query terms matched), best first
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.chunk_count:
+            return []
+
+        scores = defaultdict(float)
+        matched = Counter()
+        for term in terms:
+            entry = self.lexicon.get(term)
+            if not entry:
+                continue
+            position, df = entry
+            idf = math.log(1 + (self.chunk_count - df + 0.5) / (df + 0.5))
+            raw = array("I")
+            raw.frombytes(self.postings[position * _POSTING.size:(position + df) * _POSTING.size])
+            for i in range(0, len(raw), 2):
+                chunk_id, tf = raw[i], raw[i + 1]
+                doc_len = self._chunk_record(chunk_id)[2]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len / self.avg_chunk_words)
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+                matched[chunk_id] += 1
+
+        results = []
+        per_source = Counter()
+        for chunk_id, score in heapq.nlargest(top_k * 4, scores.items(), key=lambda kv: kv[1]):
+            passage = self.passage(chunk_id)
+            if per_source[passage["source"]] >= max_per_source:
+                continue
+            per_source[passage["source"]] += 1
+            passage["score"] = round(score, 3)
+            passage["coverage"] = round(matched[chunk_id] / len(terms), 2)
+            results.append(passage)
+            if len(results) >= top_k:
+                break
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _is_stale():
+    meta_path = INDEX_DIR / "meta.json"
+    if not meta_path.exists():
+        return True
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return True
+    return meta.get("version") != INDEX_VERSION or meta.get("sources") != _source_signature(_source_files())
+
+
+def get_index():
+    """Return the shared index, building it on first use (or when a source book changed)."""
+    global _index
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            if _is_stale():
+                print("[Research] Building offline research index...")
+                build_index()
+            _index = ResearchIndex()
+    return _index
+
+
+def search(query, top_k=5, max_per_source=2):
+    """Search the offline research library. Returns [] if the index can't be loaded."""
+    try:
+        return get_index().search(query, top_k=top_k, max_per_source=max_per_source)
+    except Exception as e:
+        print(f"[Research] Local search failed: {e}")
+        return []
+
+
+def format_passages(passages, max_chars=900):
+    """Render passages as a prompt block of numbered, attributed excerpts."""
+    if not passages:
+        return ""
+    blocks = []
+    for i, p in enumerate(passages, 1):
+        text = p["text"]
+        if len(text) > max_chars:
+            text = text[:max_chars].rsplit(" ", 1)[0] + "…"
+        blocks.append(f"[{i}] {p['title']}:\n\"{text}\"")
+    return "\n\n".join(blocks)
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        print(json.dumps(build_index(lambda m, t: print(m)), indent=2))
+    elif len(sys.argv) > 1:
+        for p in search(" ".join(sys.argv[1:])):
+            print(f"--- {p['title']} (score {p['score']})\n{p['text'][:400]}\n")
+    else:
+        print("Usage: python research_index.py build | <query>")
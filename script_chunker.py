@@ -0,0 +1,136 @@
+"""
+The Last Shelter — Script Chunker
+
+Splits long scripts into prompt-sized chunks for map-reduce LLM passes
+(knowledge audit, entity extraction) instead of truncating them. Each chunk
+goes out as its own call on provider_loop, so covering the whole script
+takes about as long as one chunk.
+
+Splitting prefers the biggest boundary that fits the token budget:
+
+    section  →  paragraph  →  sentence  →  word
+
+Whole sections are packed together until the next one would overflow the
+budget; a section that is too big on its own is cut at paragraph, then
+sentence, then word boundaries — never mid-word. Chunking is deterministic,
+so the same script always produces the same chunks (and the same cache keys).
+
+Usage:
+    chunks = script_chunker.chunk_sections(sections, max_tokens=2000, render=section_text)
+    chunks = script_chunker.split_text(long_text, max_tokens=3500)
+"""
+import re
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Rough English token density for Gemini (same heuristic the rate limiter's TPM estimate uses)
+CHARS_PER_TOKEN = 4
+SECTION_SEPARATOR = "\n\n"
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])[\"')\]]*\s+")
+
+
+def estimate_tokens(text):
+    """Approximate token count of text (~4 characters per token)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# =============================================================================
+# SPLITTING
+# =============================================================================
+
+def _pieces(text, level):
+    """text split at one boundary level: 0 = paragraph, 1 = sentence, 2 = word."""
+    if level == 0:
+        parts = _PARAGRAPH_RE.split(text)
+    elif level == 1:
+        parts = _SENTENCE_RE.split(text)
+    else:
+        parts = text.split()
+    return [p.strip() for p in parts if p.strip()]
+
+
+_JOINERS = ("\n\n", " ", " ")
+
+
+def _pack(pieces, budget, joiner):
+    """Greedily join pieces into chunks of at most budget characters (a lone oversized piece stays whole)."""
+    chunks = []
+    current = []
+    size = 0
+    for piece in pieces:
+        if current and size + len(joiner) + len(piece) > budget:
+            chunks.append(joiner.join(current))
+            current, size = [], 0
+        size += (len(joiner) if current else 0) + len(piece)
+        current.append(piece)
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+def _split(text, budget, level):
+    if len(text) <= budget or level > 2:
+        return [text]
+    pieces = []
+    for piece in _pieces(text, level):
+        # A piece that is too big on its own is cut at the next boundary level down
+        pieces.extend(_split(piece, budget, level + 1) if len(piece) > budget else [piece])
+    return _pack(pieces, budget, _JOINERS[level])
+
+
+def split_text(text, max_tokens):
+    """
+    Split text into chunks of at most ~max_tokens, at paragraph, then
+    sentence, then word boundaries. Returns [text] when it already fits
+    (and [""] for empty text, so callers always get one chunk).
+    """
+    text = (text or "").strip()
+    if not text:
+        return [""]
+    return _split(text, max_tokens * CHARS_PER_TOKEN, 0)
+
+
+def chunk_sections(sections, max_tokens, render=str):
+    """
+    Pack sections into chunks of at most ~max_tokens.
+
+    Args:
+        sections: Ordered items (section dicts, strings, ...)
+        max_tokens: Token budget per chunk
+        render: fn(section) -> text for one section
+
+    Returns:
+        List of chunk strings, in script order; consecutive small sections share
+        a chunk, oversized sections are split with split_text()
+    """
+    budget = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for section in sections:
+        text = (render(section) or "").strip()
+        if text:
+            pieces.extend(_split(text, budget, 0) if len(text) > budget else [text])
+    return _pack(pieces, budget, SECTION_SEPARATOR) or [""]
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import sys
+    import json
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "projects/60fb2ed6-he-built-an-incredible-log-cab/script.json"
+    budget = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with open(path) as f:
+        script = json.load(f)
+
+    def render(section):
+        return f"## {section.get('title', '')}\n{section.get('clean_text', '')}"
+
+    chunks = chunk_sections(script.get("sections", []), budget, render)
+    total = sum(estimate_tokens(render(s)) for s in script.get("sections", []))
+    print(f"{len(script.get('sections', []))} sections, ~{total} tokens → {len(chunks)} chunks (budget {budget})")
+    for i, chunk in enumerate(chunks, 1):
+        print(f"  chunk {i}: ~{estimate_tokens(chunk)} tokens | {chunk[:60]!r} … {chunk[-40:]!r}")
@@ -14,24 +14,47 @@ For each section, extracts:
 - clean_text: narration without stage directions
 - speaker: "jack" or "narrator"
 - day_markers: [DAY X] references
+- hash: content hash used to skip entity extraction for unchanged sections
+
+Entity extraction (characters/objects) runs per section and is cached in
+script.json under "section_entities", so a re-upload only sends the sections
+that actually changed to the LLM. Changed sections are split into
+token-budgeted chunks (script_chunker), every chunk is extracted at once on
+provider_loop, and _merge_entities() reduces the chunk results per section.
 """
 
 import re
 import json
-from story_engine import generate_json, GEMINI_MODEL_FLASH
+import hashlib
+from collections import defaultdict
+
+import provider_loop
+import script_chunker
+from story_engine import generate_json_async, GEMINI_MODEL_FLASH
+
+# Per-call token budget — sections longer than this are split, never truncated
+ENTITY_CHUNK_TOKENS = 3500
 
 
-def parse_script(raw_md: str) -> dict:
+def parse_script(raw_md: str, previous: dict = None, extract_entities: bool = True) -> dict:
     """
     Parse a raw .md script into structured sections.
     
+    Args:
+        raw_md: Raw script text
+        previous: Previously stored script.json — unchanged sections reuse its cached entities
+        extract_entities: If False, skip the LLM step and carry over the previous entity
+                          lists; call update_entities() later (e.g. from a background thread)
+    
     Returns:
         {
             "title": str,
             "total_duration": str,
             "sections": [...],
             "characters": [...],
-            "objects": [...]
+            "objects": [...],
+            "section_entities": {hash: {"characters": [...], "objects": [...]}},
+            "entities_pending": bool
         }
     """
     lines = raw_md.split("\n")
@@ -94,6 +117,7 @@ def parse_script(raw_md: str) -> dict:
     for section in sections:
         _process_section_body(section)
         del section["raw_body"]  # Remove raw body after processing
+        section["hash"] = section_hash(section)
     
     # Calculate total word count (narration only)
     word_count = 0
@@ -102,22 +126,152 @@ def parse_script(raw_md: str) -> dict:
         if clean:
             word_count += len(clean.split())
     
-    # Extract characters and objects intelligently using LLM
-    full_text = raw_md
-    extracted = _extract_entities_with_llm(full_text)
-    characters = extracted.get("characters", [])
-    objects = extracted.get("objects", [])
-    
-    return {
+    parsed = {
         "title": title,
         "total_duration": total_duration,
         "word_count": word_count,
         "sections": sections,
-        "characters": characters,
-        "objects": objects,
+        "characters": (previous or {}).get("characters", []),
+        "objects": (previous or {}).get("objects", []),
+        "section_entities": {},
+        "entities_pending": True,
+    }
+    
+    if extract_entities:
+        update_entities(parsed, previous)
+    else:
+        # Carry over cache entries for unchanged sections right away
+        cache = (previous or {}).get("section_entities", {})
+        parsed["section_entities"] = {s["hash"]: cache[s["hash"]] for s in sections if s["hash"] in cache}
+        parsed["entities_pending"] = bool(changed_sections(parsed))
+    
+    return parsed
+
+
+# =============================================================================
+# INCREMENTAL ENTITY EXTRACTION
+# =============================================================================
+
+def _section_entity_text(section: dict) -> str:
+    """Text the entity extractor sees for one section: header, directions, narration."""
+    parts = [section.get("title", "")]
+    parts += [f"[{sd}]" for sd in section.get("stage_directions", [])]
+    parts.append(section.get("clean_text", ""))
+    return "\n".join(p for p in parts if p)
+
+
+def section_hash(section: dict) -> str:
+    """Stable content hash of the parts of a section that can change its entities."""
+    return hashlib.sha1(_section_entity_text(section).encode("utf-8")).hexdigest()[:16]
+
+
+def changed_sections(parsed: dict) -> list:
+    """Sections whose entities are not in the section_entities cache yet."""
+    cache = parsed.get("section_entities", {})
+    return [s for s in parsed.get("sections", []) if (s.get("hash") or section_hash(s)) not in cache]
+
+
+def _merge_entities(results: list) -> dict:
+    """
+    Merge per-section entity lists into one deduplicated list per kind.
+    
+    Entities are matched case-insensitively (characters by name, objects by id);
+    mentions are summed across sections. Output order is deterministic:
+    most mentioned first, then alphabetical.
+    """
+    characters = {}
+    objects = {}
+    for result in results:
+        for c in result.get("characters", []):
+            name = str(c.get("name", "")).strip()
+            if not name:
+                continue
+            key = name.lower()
+            if key in characters:
+                characters[key]["mentions"] += int(c.get("mentions") or 1)
+            else:
+                characters[key] = {"name": name, "type": c.get("type", "character"),
+                                   "mentions": int(c.get("mentions") or 1)}
+        for o in result.get("objects", []):
+            name = str(o.get("name", "")).strip()
+            obj_id = str(o.get("id") or re.sub(r'[^a-z0-9]+', '_', name.lower())).strip("_").lower()
+            if not obj_id:
+                continue
+            if obj_id in objects:
+                objects[obj_id]["mentions"] += int(o.get("mentions") or 1)
+            else:
+                objects[obj_id] = {"id": obj_id, "name": name or obj_id.replace("_", " ").title(),
+                                   "mentions": int(o.get("mentions") or 1)}
+    
+    def order(item):
+        return (-item["mentions"], item.get("name", "").lower())
+    
+    return {
+        "characters": sorted(characters.values(), key=order),
+        "objects": sorted(objects.values(), key=order),
     }
 
 
+def _reduce_chunk_entities(results: list) -> dict:
+    """Merge the chunk results of one text; any failed chunk fails the whole text (no partial lists)."""
+    if not results or any(not isinstance(r, dict) or r.get("_failed") for r in results):
+        return {"characters": [], "objects": [], "_failed": True}
+    return _merge_entities(results)
+
+
+def update_entities(parsed: dict, previous: dict = None, progress_callback=None) -> dict:
+    """
+    Fill parsed["characters"] / parsed["objects"], only calling the LLM for
+    sections whose hash is not cached in parsed or previous "section_entities".
+    
+    Mutates and returns parsed. Sections that fail extraction are left out of
+    the cache so the next parse retries them.
+    """
+    cache = dict((previous or {}).get("section_entities", {}))
+    cache.update(parsed.get("section_entities", {}))
+    
+    sections = parsed.get("sections", [])
+    for s in sections:
+        s.setdefault("hash", section_hash(s))
+    
+    todo = [s for s in sections if s["hash"] not in cache]
+    # Identical sections (e.g. repeated break text) only need one call
+    todo = list({s["hash"]: s for s in todo}.values())
+    
+    if todo:
+        print(f"[Parser] Extracting entities for {len(todo)}/{len(sections)} changed sections...")
+        if progress_callback:
+            progress_callback(f"🔍 Extracting characters & objects from {len(todo)} changed section(s)...", "info")
+        
+        # Map: every chunk of every changed section in flight at once
+        jobs = [(s["hash"], chunk) for s in todo
+                for chunk in script_chunker.split_text(_section_entity_text(s), ENTITY_CHUNK_TOKENS)]
+        results = provider_loop.run_all(_extract_chunk_entities(chunk) for _, chunk in jobs)
+        
+        # Reduce: one merged, deduplicated entry per section
+        by_section = defaultdict(list)
+        for (section_id, _), result in zip(jobs, results):
+            by_section[section_id].append(result)
+        for section_id, chunk_results in by_section.items():
+            result = _reduce_chunk_entities(chunk_results)
+            if result.pop("_failed", False):
+                continue
+            cache[section_id] = result
+    else:
+        print(f"[Parser] All {len(sections)} sections unchanged — reusing cached entities")
+    
+    current = [s["hash"] for s in sections]
+    parsed["section_entities"] = {h: cache[h] for h in current if h in cache}
+    merged = _merge_entities([parsed["section_entities"][h] for h in current if h in parsed["section_entities"]])
+    parsed["characters"] = merged["characters"]
+    parsed["objects"] = merged["objects"]
+    parsed["entities_pending"] = False
+    
+    if progress_callback:
+        progress_callback(f"✅ {len(merged['characters'])} characters, {len(merged['objects'])} objects", "success")
+    return parsed
+
+
 def _parse_section_header(header: str) -> dict:
     """Parse a section header like 'PHASE 1: ARRIVAL AND DEVASTATION (1:30-3:30 | 2 min)'."""
     
@@ -256,15 +410,20 @@ def _extract_entities_with_llm(text: str) -> dict:
     """
     Use Gemini to intelligently extract characters and key objects from the script text.
     This replaces the legacy regex-based extraction.
-    """
-    # Truncate text if too long to save tokens, though usually scripts are short enough
-    # If the script is huge, we grab the first 15000 chars as it usually has all characters
-    truncated_text = text[:15000]
     
+    Text of any length is covered: it is chunked, the chunks are extracted
+    concurrently and the results merged.
+    """
+    chunks = script_chunker.split_text(text, ENTITY_CHUNK_TOKENS)
+    return _reduce_chunk_entities(provider_loop.run_all(_extract_chunk_entities(c) for c in chunks))
+
+
+async def _extract_chunk_entities(text: str) -> dict:
+    """One extraction call for one chunk (at most ENTITY_CHUNK_TOKENS of script text)."""
     prompt = f"""You are a story analyst. Read this script and extract exactly two lists of entities.
 
 SCRIPT TEXT:
-{truncated_text}
+{text}
 
 ═══ EXTRACT THE FOLLOWING ═══
 Analyze the script deeply and return a JSON with this EXACT structure:
@@ -294,7 +453,7 @@ RULES:
     
     try:
         print("[Parser] Running intelligent LLM extraction for entities...")
-        result = generate_json(prompt, temperature=0.2, model=GEMINI_MODEL_FLASH)
+        result = await generate_json_async(prompt, temperature=0.2, model=GEMINI_MODEL_FLASH)
         print(f"[Parser] LLM returned keys: {list(result.keys())}")
         return {
             "characters": result.get("characters", []),
@@ -304,7 +463,7 @@ RULES:
         import traceback
         print(f"[Parser] LLM extraction failed: {e}")
         traceback.print_exc()
-        return {"characters": [], "objects": []}
+        return {"characters": [], "objects": [], "_failed": True}
 
 
 
@@ -113,6 +113,9 @@ async function createProject() {
 
             // Load the new project
             await loadProject(data.project_id);
+
+            // Characters/objects are extracted in the background — refresh when ready
+            if (data.entities_pending) startProgressStream(data.project_id);
         }
     } catch (err) {
         console.error('Create project error:', err);
@@ -963,6 +966,8 @@ async function reuploadScript(input) {
         if (data.status === 'ok') {
             // Reload project to refresh everything
             await loadProject(projectId);
+            // Changed sections are still being scanned for characters/objects
+            if (data.entities_pending) startProgressStream(projectId);
         } else {
             alert('Error uploading script: ' + (data.error || 'Unknown error'));
         }
@@ -1609,7 +1614,7 @@ function renderVoice(narration, audioManifest) {
                     <span class="voice-chapter-words">${seg.words}w</span>
                     <span class="voice-chapter-status ${statusClass}" id="voice-status-${seg.id}">${statusIcon} ${statusText}</span>
                     <button class="voice-chapter-btn" id="voice-btn-${seg.id}"
-                        onclick="event.stopPropagation(); generateChapterAudio('${seg.id}', '${seg.segmentType}', ${idx})">${hasAudio ? '🔄 Regenerate' : '🎙️ Generate'}</button>
+                        onclick="event.stopPropagation(); generateChapterAudio('${seg.id}', '${seg.segmentType}', ${idx}, this.textContent.includes('Regenerate'))">${hasAudio ? '🔄 Regenerate' : '🎙️ Generate'}</button>
                     <a class="voice-download-btn" id="voice-dl-${seg.id}" style="display:${hasAudio ? 'inline-flex' : 'none'}" 
                         href="/api/project/${currentProject.metadata.id}/audio/${hasAudio ? audio.filename : ''}" download="${seg.downloadName || seg.id + '.mp3'}"
                         onclick="event.stopPropagation()">📥</a>
@@ -1617,10 +1622,7 @@ function renderVoice(narration, audioManifest) {
                 <div class="voice-chapter-body" id="voice-body-${seg.id}">
                     <div class="voice-chapter-text">${formatText(seg.text)}</div>
                     ${hasAudio ? `
-                        <div class="voice-audio-row">
-                            <audio controls src="/api/project/${currentProject.metadata.id}/audio/${audio.filename}"></audio>
-                            <span class="voice-audio-duration">${audio.duration_seconds || '?'}s</span>
-                        </div>
+                        <div class="voice-audio-row">${voiceAudioRowHtml(currentProject.metadata.id, seg.id, audio)}</div>
                     ` : ''}
                 </div>
             </div>`;
@@ -1628,11 +1630,14 @@ function renderVoice(narration, audioManifest) {
 
     // Store segments for later use
     window._voiceSegments = segments;
+    segments.forEach(seg => { _voiceSilences[seg.id] = (manifest[seg.id] || {}).silences || []; });
 
     // Show Download All button if any audio already exists
     const hasAnyAudio = segments.some(seg => !!(manifest[seg.id]));
     const dlAllBtn = document.getElementById('btnDownloadAllAudio');
     if (dlAllBtn && hasAnyAudio) dlAllBtn.style.display = '';
+    const episodeBtn = document.getElementById('btnEpisodeAudio');
+    if (episodeBtn && hasAnyAudio) episodeBtn.style.display = '';
 
     // Update total duration label
     setTimeout(() => updateVoiceTotalDuration(), 100);
@@ -1647,10 +1652,103 @@ function toggleVoiceChapter(segId) {
     } else {
         body.classList.add('expanded');
         toggle.textContent = '▼';
+        loadVoiceWaveform(segId);
+    }
+}
+
+// ─── Waveforms: drawn from the server's precomputed .peaks files, so previewing
+// a segment never downloads or decodes the MP3 until Play is pressed ───
+const _voicePeaks = {};      // "<project>/<filename>" -> { perSecond, pairs }
+const _voiceSilences = {};   // segId -> [{start_seconds, end_seconds}, ...]
+
+function voiceAudioRowHtml(projectId, segId, audio, cacheBust = '') {
+    return `
+        <canvas class="voice-waveform" id="voice-wave-${segId}" data-filename="${audio.filename}" title="Click to seek"></canvas>
+        <audio controls preload="none" id="voice-audio-${segId}" src="/api/project/${projectId}/audio/${audio.filename}${cacheBust}"></audio>
+        <span class="voice-audio-duration">${audio.duration_seconds || '?'}s</span>`;
+}
+
+async function loadVoiceWaveform(segId, force = false) {
+    const canvas = document.getElementById(`voice-wave-${segId}`);
+    if (!canvas || !currentProject) return;
+    const projectId = currentProject.metadata.id;
+    const key = `${projectId}/${canvas.dataset.filename}`;
+
+    if (force || !_voicePeaks[key]) {
+        try {
+            const res = await fetch(`/api/project/${projectId}/audio/${canvas.dataset.filename}/peaks`);
+            if (!res.ok) throw new Error(`HTTP ${res.status}`);
+            const buf = await res.arrayBuffer();
+            const view = new DataView(buf);
+            // Header: "TLSP", version, reserved, pairs/second (u16), pair count (u32)
+            _voicePeaks[key] = {
+                perSecond: view.getUint16(6, true),
+                pairs: new Uint8Array(buf, 12, view.getUint32(8, true) * 2),
+            };
+        } catch (err) {
+            canvas.style.display = 'none';
+            return;
+        }
+    }
+
+    const audio = document.getElementById(`voice-audio-${segId}`);
+    const peaks = _voicePeaks[key];
+    const redraw = () => drawVoiceWaveform(canvas, peaks, _voiceSilences[segId] || [], audio ? audio.currentTime : 0);
+    redraw();
+
+    if (!canvas.dataset.wired) {
+        canvas.dataset.wired = '1';
+        canvas.addEventListener('click', (e) => {
+            if (!audio) return;
+            const rect = canvas.getBoundingClientRect();
+            const seconds = (e.clientX - rect.left) / rect.width * (peaks.pairs.length / 2 / peaks.perSecond);
+            audio.currentTime = seconds;
+            audio.play();
+        });
+        if (audio) audio.addEventListener('timeupdate', redraw);
     }
 }
 
-async function generateChapterAudio(segId, segmentType, segIdx) {
+function drawVoiceWaveform(canvas, peaks, silences, playhead) {
+    const dpr = window.devicePixelRatio || 1;
+    const width = canvas.clientWidth * dpr;
+    const height = canvas.clientHeight * dpr;
+    if (!width || !height) return;
+    canvas.width = width;
+    canvas.height = height;
+    const ctx = canvas.getContext('2d');
+    const count = peaks.pairs.length / 2;
+    const duration = count / peaks.perSecond;
+    const mid = height / 2;
+
+    // Pauses — natural places to cut between scenes
+    ctx.fillStyle = 'rgba(255, 255, 255, 0.06)';
+    silences.forEach(s => {
+        const x0 = s.start_seconds / duration * width;
+        ctx.fillRect(x0, 0, Math.max(1, s.end_seconds / duration * width - x0), height);
+    });
+
+    // One column per pixel: max peak (light) with max RMS (solid) on top
+    for (let x = 0; x < width; x++) {
+        const from = Math.floor(x / width * count);
+        const to = Math.max(from + 1, Math.floor((x + 1) / width * count));
+        let peak = 0, rms = 0;
+        for (let i = from; i < to && i < count; i++) {
+            peak = Math.max(peak, peaks.pairs[i * 2]);
+            rms = Math.max(rms, peaks.pairs[i * 2 + 1]);
+        }
+        const played = duration && x / width * duration <= playhead;
+        ctx.fillStyle = played ? 'rgba(59, 158, 255, 0.45)' : 'rgba(122, 141, 160, 0.4)';
+        const ph = peak / 255 * mid;
+        ctx.fillRect(x, mid - ph, 1, ph * 2 || 1);
+        ctx.fillStyle = played ? '#3b9eff' : '#7a8da0';
+        const rh = rms / 255 * mid;
+        ctx.fillRect(x, mid - rh, 1, rh * 2 || 1);
+    }
+}
+
+// force=true asks for a fresh take; otherwise unchanged segments come from the server's audio cache
+async function generateChapterAudio(segId, segmentType, segIdx, force = false) {
     if (!currentProject) return;
     const projectId = currentProject.metadata.id;
 
@@ -1683,7 +1781,8 @@ async function generateChapterAudio(segId, segmentType, segIdx) {
                 voice_id: voiceId,
                 model: model,
                 speed: speed,
-                stability: stability
+                stability: stability,
+                force: force
             })
         });
 
@@ -1716,12 +1815,11 @@ async function generateChapterAudio(segId, segmentType, segIdx) {
             audioRow.className = 'voice-audio-row';
             body.appendChild(audioRow);
         }
-        audioRow.innerHTML = `
-            <audio controls src="/api/project/${projectId}/audio/${data.filename}?t=${Date.now()}"></audio>
-            <span class="voice-audio-duration">${data.duration_seconds || '?'}s</span>
-        `;
+        audioRow.innerHTML = voiceAudioRowHtml(projectId, segId, data, `?t=${Date.now()}`);
+        _voiceSilences[segId] = data.silences || [];
+        loadVoiceWaveform(segId, true);
 
-        logConsole(`✅ Audio for "${segId}": ${data.duration_seconds}s`, 'success');
+        logConsole(`✅ Audio for "${segId}": ${data.duration_seconds}s${data.cached ? ' ♻️ unchanged, from cache' : ''}`, 'success');
         updateVoiceTotalDuration();
     } catch (err) {
         btn.textContent = '🎙️ Retry';
@@ -1732,6 +1830,9 @@ async function generateChapterAudio(segId, segmentType, segIdx) {
     }
 }
 
+// Leaves one gunicorn thread (Procfile: --threads 4) free for the rest of the UI
+const VOICE_PARALLEL_SEGMENTS = 3;
+
 async function generateAllVoice() {
     if (!window._voiceSegments || window._voiceSegments.length === 0) {
         alert('No audio segments to generate. Make sure narration exists.');
@@ -1742,13 +1843,17 @@ async function generateAllVoice() {
     logConsole(`🎙️ Starting generation of ${segments.length} audio segments...`, 'info');
     showConsole();
 
-    for (let i = 0; i < segments.length; i++) {
-        const seg = segments[i];
-        logConsole(`⏳ [${i + 1}/${segments.length}] Generating: ${seg.title}...`, 'batch');
-        await generateChapterAudio(seg.id, seg.segmentType, i);
-        // Small delay between segments to avoid rate limiting
-        await new Promise(r => setTimeout(r, 500));
-    }
+    // A few segments in flight at once — the server caps concurrent ElevenLabs calls
+    let next = 0;
+    const worker = async () => {
+        while (next < segments.length) {
+            const i = next++;
+            const seg = segments[i];
+            logConsole(`⏳ [${i + 1}/${segments.length}] Generating: ${seg.title}...`, 'batch');
+            await generateChapterAudio(seg.id, seg.segmentType, i);
+        }
+    };
+    await Promise.all(Array.from({ length: Math.min(VOICE_PARALLEL_SEGMENTS, segments.length) }, worker));
 
     logConsole(`✅ All ${segments.length} audio segments processed!`, 'success');
 
@@ -1777,6 +1882,41 @@ function updateVoiceTotalDuration() {
     }
 }
 
+// Joins every generated segment into one track (frame copy, gaps, cue sheet) and downloads it
+async function buildEpisodeAudio() {
+    if (!currentProject) return;
+    const projectId = currentProject.metadata.id;
+    const btn = document.getElementById('btnEpisodeAudio');
+    btn.disabled = true;
+
+    try {
+        const res = await fetch(`/api/project/${projectId}/episode-audio`, { method: 'POST' });
+        const data = await res.json();
+        if (data.error) throw new Error(data.error);
+    } catch (err) {
+        btn.disabled = false;
+        logConsole(`❌ Episode track failed: ${err.message}`, 'error');
+        return;
+    }
+
+    startProgressStream(projectId, async () => {
+        btn.disabled = false;
+        const info = await (await fetch(`/api/project/${projectId}/episode-audio`)).json();
+        if (!info.file) return;
+        (info.cues || []).forEach(cue => {
+            const m = Math.floor(cue.start_seconds / 60);
+            const sec = (cue.start_seconds % 60).toFixed(1).padStart(4, '0');
+            logConsole(`  ${m}:${sec}  ${cue.title}`, 'info');
+        });
+        const a = document.createElement('a');
+        a.href = `/api/project/${projectId}/audio/${info.file}?t=${info.built_at}`;
+        a.download = `${currentProject.metadata.title || projectId}_narration.mp3`;
+        document.body.appendChild(a);
+        a.click();
+        a.remove();
+    });
+}
+
 async function downloadAllAudio() {
     if (!currentProject) return;
     const projectId = currentProject.metadata.id;
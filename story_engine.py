@@ -9,14 +9,22 @@ import re
 import base64
 import base64
 import time
+import asyncio
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pydantic import BaseModel, Field
 
 import diversity_tracker
+import encyclopedia
+import model_router
+import research_index
+import provider_clients
+import provider_loop
+import script_chunker
+import telemetry
+import tracing
 
 # Google GenAI SDK
-from google import genai
 from google.genai import types
 
 # Models
@@ -39,8 +47,6 @@ STORY_DNA_PATH = BASE_DIR / "docs" / "STORY_DNA.md"
 SHOW_BIBLE_PATH = BASE_DIR / "docs" / "SHOW_BIBLE.md"
 CONFIG_PATH = BASE_DIR / "config" / "style.json"
 
-_client = None
-
 
 def load_config():
     """Load show configuration."""
@@ -61,22 +67,15 @@ def load_show_bible():
 
 
 def init_client():
-    """Initialize the Google GenAI client."""
-    global _client
-    if _client is None:
-        api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY must be set")
-        _client = genai.Client(api_key=api_key)
-    return _client
+    """Return the shared Google GenAI client (see provider_clients)."""
+    return provider_clients.gemini()
 
 
 def generate_text(prompt, temperature=0.7, max_tokens=30000, model=None):
     """Generate text content with Gemini."""
-    client = init_client()
     model = model or GEMINI_MODEL
     
-    response = client.models.generate_content(
+    response = provider_clients.gemini_generate(
         model=model,
         contents=prompt,
         config=types.GenerateContentConfig(
@@ -155,11 +154,8 @@ def _repair_truncated_json(text):
         return None
 
 
-def generate_json(prompt, temperature=0.3, max_tokens=8000, model=None, response_schema=None):
-    """Generate JSON content with Gemini, forced JSON output."""
-    client = init_client()
-    model = model or GEMINI_MODEL
-    
+def _json_config(temperature, max_tokens, response_schema=None):
+    """GenerateContentConfig forcing JSON output."""
     config_kwargs = {
         "temperature": temperature,
         "max_output_tokens": max_tokens,
@@ -167,13 +163,35 @@ def generate_json(prompt, temperature=0.3, max_tokens=8000, model=None, response
     }
     if response_schema:
         config_kwargs["response_schema"] = response_schema
-        
-    response = client.models.generate_content(
+    return types.GenerateContentConfig(**config_kwargs)
+
+
+def generate_json(prompt, temperature=0.3, max_tokens=8000, model=None, response_schema=None):
+    """Generate JSON content with Gemini, forced JSON output."""
+    model = model or GEMINI_MODEL
+    
+    response = provider_clients.gemini_generate(
         model=model,
         contents=prompt,
-        config=types.GenerateContentConfig(**config_kwargs)
+        config=_json_config(temperature, max_tokens, response_schema)
     )
+    return _parse_json_response(response, prompt, model)
+
+
+async def generate_json_async(prompt, temperature=0.3, max_tokens=8000, model=None, response_schema=None):
+    """generate_json() as a coroutine for provider_loop."""
+    model = model or GEMINI_MODEL
     
+    response = await provider_clients.gemini_generate_async(
+        model=model,
+        contents=prompt,
+        config=_json_config(temperature, max_tokens, response_schema)
+    )
+    return _parse_json_response(response, prompt, model)
+
+
+def _parse_json_response(response, prompt, model):
+    """JSON body of a forced-JSON response, repairing truncation where possible."""
     text = response.text
     if text is None:
         # Debug: log the actual block reason
@@ -198,6 +216,7 @@ def generate_json(prompt, temperature=0.3, max_tokens=8000, model=None, response
             finish_reason = getattr(response.candidates[0], 'finish_reason', None)
             if finish_reason and str(finish_reason) not in ('STOP', 'FinishReason.STOP', '1'):
                 print(f"[generate_json] WARNING: finish_reason={finish_reason}, response may be truncated ({len(text)} chars)")
+                telemetry.count("gemini_truncated_responses_total", model=model)
     except Exception:
         pass
     
@@ -212,6 +231,7 @@ def generate_json(prompt, temperature=0.3, max_tokens=8000, model=None, response
         repaired = _repair_truncated_json(text)
         if repaired is not None:
             print(f"[generate_json] JSON repair successful! Salvaged {len(str(repaired))} chars")
+            telemetry.count("gemini_json_repairs_total", model=model)
             return repaired
         raise ValueError(f"JSON Parse Error: {e}\nRaw Text saved to failed_json.txt")
 
@@ -225,10 +245,9 @@ def generate_json_with_search(prompt, temperature=0.5, max_tokens=8000, model=No
     NOTE: response_mime_type="application/json" is NOT compatible with
     Google Search grounding, so we extract JSON manually from the response.
     """
-    client = init_client()
     model = model or GEMINI_MODEL
     
-    response = client.models.generate_content(
+    response = provider_clients.gemini_generate(
         model=model,
         contents=prompt,
         config=types.GenerateContentConfig(
@@ -254,6 +273,41 @@ def generate_json_with_search(prompt, temperature=0.5, max_tokens=8000, model=No
     return json.loads(text)
 
 
+def _image_config(config=None, aspect_ratio=None):
+    """GenerateContentConfig for a Nanobanana Pro image (aspect ratio from style config unless given)."""
+    if aspect_ratio is None:
+        cfg = config or load_config()
+        aspect_ratio = cfg.get("image_generation", {}).get("aspect_ratio", "3:2")
+    return types.GenerateContentConfig(
+        response_modalities=["Image"],
+        image_config=types.ImageConfig(
+            aspect_ratio=aspect_ratio,
+        ),
+    )
+
+
+def _save_image(response, output_path):
+    """Save the first image part of a generate_content() response to output_path."""
+    if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+        for part in response.candidates[0].content.parts:
+            if part.inline_data is not None:
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                image = part.as_image()
+                image.save(output_path)
+                return output_path
+    
+    raise Exception("No image generated — response contained no image parts")
+
+
+def _load_reference(ref_image_path):
+    """Reference image, fully read so the request can be built without touching disk."""
+    from PIL import Image as PILImage
+    
+    ref_img = PILImage.open(ref_image_path)
+    ref_img.load()
+    return ref_img
+
+
 def generate_image(prompt, output_path, config=None):
     """
     Generate an image using Nanobanana Pro (gemini-3-pro-image-preview).
@@ -268,32 +322,13 @@ def generate_image(prompt, output_path, config=None):
     Returns:
         Path to the saved image
     """
-    client = init_client()
-    cfg = config or load_config()
-    
-    aspect_ratio = cfg.get("image_generation", {}).get("aspect_ratio", "3:2")
-    
-    response = client.models.generate_content(
+    response = provider_clients.gemini_generate(
         model=IMAGE_MODEL,
         contents=[prompt],
-        config=types.GenerateContentConfig(
-            response_modalities=["Image"],
-            image_config=types.ImageConfig(
-                aspect_ratio=aspect_ratio,
-            ),
-        ),
+        config=_image_config(config),
+        hedge=True,
     )
-    
-    # Extract image from response parts
-    if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-        for part in response.candidates[0].content.parts:
-            if part.inline_data is not None:
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                image = part.as_image()
-                image.save(output_path)
-                return output_path
-    
-    raise Exception("No image generated — response contained no image parts")
+    return _save_image(response, output_path)
 
 
 def generate_image_with_ref(prompt, output_path, ref_image_path, config=None):
@@ -312,43 +347,40 @@ def generate_image_with_ref(prompt, output_path, ref_image_path, config=None):
     Returns:
         Path to the saved image
     """
-    from PIL import Image as PILImage
-    
-    client = init_client()
-    cfg = config or load_config()
-    
-    aspect_ratio = cfg.get("image_generation", {}).get("aspect_ratio", "3:2")
-    
-    # Load reference image
-    ref_img = PILImage.open(ref_image_path)
-    
     # Build contents with reference image + prompt
     contents = [
-        ref_img,
+        _load_reference(ref_image_path),
         prompt,
     ]
     
-    response = client.models.generate_content(
+    response = provider_clients.gemini_generate(
         model=IMAGE_MODEL,
         contents=contents,
-        config=types.GenerateContentConfig(
-            response_modalities=["Image"],
-            image_config=types.ImageConfig(
-                aspect_ratio=aspect_ratio,
-            ),
-        ),
+        config=_image_config(config),
+        hedge=True,
     )
+    return _save_image(response, output_path)
+
+
+async def generate_image_async(prompt, output_path, ref_image_path=None, config=None, aspect_ratio=None):
+    """
+    generate_image() / generate_image_with_ref() as a coroutine for provider_loop.
     
-    # Extract image from response parts
-    if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-        for part in response.candidates[0].content.parts:
-            if part.inline_data is not None:
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                image = part.as_image()
-                image.save(output_path)
-                return output_path
+    Reference loading and the PNG save run in a worker thread so the loop
+    keeps other requests moving while this one touches disk.
+    """
+    image_config = _image_config(config, aspect_ratio)
+    contents = [prompt]
+    if ref_image_path:
+        contents.insert(0, await asyncio.to_thread(_load_reference, ref_image_path))
     
-    raise Exception("No image generated — response contained no image parts")
+    response = await provider_clients.gemini_generate_async(
+        model=IMAGE_MODEL,
+        contents=contents,
+        config=image_config,
+        hedge=True,
+    )
+    return await asyncio.to_thread(_save_image, response, output_path)
 
 
 # =============================================================================
@@ -450,6 +482,13 @@ def validate_story(story):
 MAX_RETRIES = 2
 MIN_STORY_STRENGTH = 80
 
+# Offline research library (research_index.py) — passages injected into retries
+# and encyclopedia research before falling back to Google Search grounding
+RESEARCH_PASSAGES = 4
+# Story retries and encyclopedia research skip Google Search when the best
+# local passage matches at least this share of the query's terms
+RESEARCH_MIN_COVERAGE = 0.6
+
 
 def _build_story_prompt(story_dna, title, duration_minutes, episode_type, diversity_context="", retry_feedback=""):
     """Build the story generation prompt with all constraints."""
@@ -501,6 +540,44 @@ Return ONLY the JSON object. No markdown, no explanation."""
     return prompt
 
 
+def _sanitize_story(story, duration_minutes, episode_type):
+    """Fill nulls Gemini may return for nested objects and set the core fields."""
+    if not isinstance(story, dict):
+        raise ValueError(f"Story response is {type(story).__name__}, expected an object")
+    for field in ["character", "location", "construction", "timeline", "el_momento", "outcome"]:
+        if story.get(field) is None:
+            story[field] = {}
+    # character sub-objects
+    char = story.get("character", {})
+    if char.get("companion") is None:
+        char["companion"] = {}
+    if not isinstance(story.get("conflicts"), list):
+        story["conflicts"] = []
+    if not isinstance(story.get("narrative_arcs"), list):
+        story["narrative_arcs"] = []
+    
+    # Ensure core fields
+    story["duration_minutes"] = duration_minutes
+    story["episode_type"] = episode_type
+    return story
+
+
+def _story_passes(report, strength):
+    """(strict_pass, soft_pass) — all required checks, or 7+ checks, each with high strength."""
+    strict_pass = report["passed"] and strength >= MIN_STORY_STRENGTH
+    soft_pass = report["passed_count"] >= 7 and strength >= MIN_STORY_STRENGTH
+    return strict_pass, soft_pass
+
+
+def _story_check(story):
+    """model_router check: the story passes the quality gate."""
+    report = validate_story(story)
+    strength = story.get("story_strength", 0) or 0
+    if any(_story_passes(report, strength)):
+        return True, "passed"
+    return False, f"{report['passed_count']}/{report['total_checks']} checks, strength {strength}"
+
+
 def generate_story(title, duration_minutes=20, episode_type="build", progress_callback=None, enable_variants=False):
     """
     Generate a complete story with quality gate validation and diversity constraints.
@@ -535,13 +612,16 @@ def generate_story(title, duration_minutes=20, episode_type="build", progress_ca
             progress_callback(f"📊 {recs['total_episodes']} previous episodes found. Diversity constraints applied.", "info")
     
     retry_feedback = ""
+    use_local_research = False
     best_story = None
     best_report = None
     
     for attempt in range(1 + MAX_RETRIES):
         if progress_callback:
             if attempt == 0:
-                progress_callback("🧠 Generating story with Gemini 2.5 Pro...", "info")
+                progress_callback("🧠 Generating story with Gemini 2.5 Flash (Pro if it misses the quality gate)...", "info")
+            elif use_local_research:
+                progress_callback(f"🔄 Retry {attempt}/{MAX_RETRIES} — using offline research library + fixing issues...", "info")
             else:
                 progress_callback(f"🔄 Retry {attempt}/{MAX_RETRIES} — researching with Google Search + fixing issues...", "info")
         
@@ -549,10 +629,18 @@ def generate_story(title, duration_minutes=20, episode_type="build", progress_ca
         
         try:
             if attempt == 0:
-                # First attempt: standard generation
+                # First attempt: Flash, escalating to Pro only if the draft fails the quality gate
+                story = model_router.route(
+                    "story",
+                    lambda model: _sanitize_story(generate_json(prompt, temperature=0.7, max_tokens=8000, model=model),
+                                                  duration_minutes, episode_type),
+                    _story_check,
+                )
+            elif use_local_research:
+                # Retry grounded in the offline library: standard generation
                 story = generate_json(prompt, temperature=0.7, max_tokens=8000)
             else:
-                # Retries: use Google Search grounding to research real references
+                # Retries with no local passages: use Google Search grounding to research real references
                 story = generate_json_with_search(prompt, temperature=0.7, max_tokens=8000)
         except Exception as e:
             print(f"[Story] Generation attempt {attempt + 1} failed: {e}")
@@ -565,23 +653,7 @@ def generate_story(title, duration_minutes=20, episode_type="build", progress_ca
                 break
             raise
         
-        # Sanitize — Gemini may return null for nested objects
-        _obj_fields = ["character", "location", "construction", "timeline", "el_momento", "outcome"]
-        for field in _obj_fields:
-            if story.get(field) is None:
-                story[field] = {}
-        # character sub-objects
-        char = story.get("character", {})
-        if char.get("companion") is None:
-            char["companion"] = {}
-        if not isinstance(story.get("conflicts"), list):
-            story["conflicts"] = []
-        if not isinstance(story.get("narrative_arcs"), list):
-            story["narrative_arcs"] = []
-        
-        # Ensure core fields
-        story["duration_minutes"] = duration_minutes
-        story["episode_type"] = episode_type
+        story = _sanitize_story(story, duration_minutes, episode_type)
         
         # Run quality gate
         report = validate_story(story)
@@ -598,8 +670,7 @@ def generate_story(title, duration_minutes=20, episode_type="build", progress_ca
             )
         
         # Check if good enough — strict pass or soft pass (7+ checks with high strength)
-        strict_pass = report["passed"] and strength >= MIN_STORY_STRENGTH
-        soft_pass = report["passed_count"] >= 7 and strength >= MIN_STORY_STRENGTH
+        strict_pass, soft_pass = _story_passes(report, strength)
         
         if strict_pass or soft_pass:
             label = "PASSED" if strict_pass else f"ACCEPTED ({report['passed_count']}/{report['total_checks']})"
@@ -614,10 +685,39 @@ def generate_story(title, duration_minutes=20, episode_type="build", progress_ca
             best_story = story
             best_report = report
         
-        # Build retry feedback — instruct Gemini to research real references
+        # Build retry feedback — ground the retry in real references
         if attempt < MAX_RETRIES:
             failed_names = [f["name"] for f in report["failed"]]
-            retry_feedback = f"""\n\nCRITICAL: Your PREVIOUS story FAILED these quality checks: {', '.join(failed_names)}.
+            
+            # Offline research library first — milliseconds, no network
+            construction = (story.get("construction") or {}).get("type", "")
+            location_name = (story.get("location") or {}).get("name", "")
+            passages = research_index.search(f"{title} {construction} {location_name} {episode_type}", top_k=RESEARCH_PASSAGES)
+            # Any BM25 hit isn't enough — only a well-covered query skips Google Search
+            use_local_research = bool(passages) and passages[0].get("coverage", 0) >= RESEARCH_MIN_COVERAGE
+            
+            if use_local_research:
+                retry_feedback = f"""\n\nCRITICAL: Your PREVIOUS story FAILED these quality checks: {', '.join(failed_names)}.
+Story strength was {strength}/100 (minimum required: {MIN_STORY_STRENGTH}).
+
+REAL REFERENCE PASSAGES from survival literature (true accounts of wilderness building and survival):
+
+{research_index.format_passages(passages)}
+
+USE these passages to:
+- Ground the character, location and construction in REAL wilderness experience
+- Borrow authentic details (terrain, weather, materials, tools, the physical toll of the work)
+- Make the challenges of this episode type ({episode_type}) feel lived-in, not invented
+
+Use them to create a MORE AUTHENTIC, DETAILED story. Fix ALL failed checks.
+Do NOT copy the passages verbatim and do NOT repeat the same mistakes."""
+                if progress_callback:
+                    progress_callback(
+                        f"⚠️ Failed checks: {', '.join(failed_names)} — retrying with {len(passages)} local reference passages...",
+                        "error"
+                    )
+            else:
+                retry_feedback = f"""\n\nCRITICAL: Your PREVIOUS story FAILED these quality checks: {', '.join(failed_names)}.
 Story strength was {strength}/100 (minimum required: {MIN_STORY_STRENGTH}).
 
 You now have access to Google Search. USE IT to:
@@ -628,12 +728,12 @@ You now have access to Google Search. USE IT to:
 
 Use what you find to create a MORE AUTHENTIC, DETAILED story. Fix ALL failed checks.
 Do NOT repeat the same mistakes."""
-            
-            if progress_callback:
-                progress_callback(
-                    f"⚠️ Failed checks: {', '.join(failed_names)} — retrying with Google Search...",
-                    "error"
-                )
+                
+                if progress_callback:
+                    progress_callback(
+                        f"⚠️ Failed checks: {', '.join(failed_names)} — retrying with Google Search...",
+                        "error"
+                    )
     
     # Final report
     if progress_callback:
@@ -1164,9 +1264,7 @@ def generate_elements(elements_list, project_dir, progress_callback=None):
         shutil.rmtree(elements_dir)
     os.makedirs(elements_dir, exist_ok=True)
     
-    generated = []
-    
-    for i, element in enumerate(elements_list):
+    async def render(i, element):
         elem_id = element.get("id", f"element_{i+1}")
         label = element.get("label", f"Element {i+1}")
         
@@ -1181,8 +1279,8 @@ def generate_elements(elements_list, project_dir, progress_callback=None):
         frontal_prompt = element.get("frontal_prompt", element.get("description", ""))
         
         try:
-            # Force 16:9 aspect ratio — override config
-            _generate_element_image(frontal_prompt, image_path)
+            # Force 3:4 portrait — override config
+            await generate_image_async(frontal_prompt, image_path, aspect_ratio=ELEMENT_ASPECT_RATIO)
             if progress_callback:
                 progress_callback(f"  ✓ {filename}", "success")
         except Exception as e:
@@ -1190,7 +1288,7 @@ def generate_elements(elements_list, project_dir, progress_callback=None):
                 progress_callback(f"  ❌ {label} failed: {str(e)[:100]}", "error")
             filename = None  # Mark as failed but still save element data
         
-        generated.append({
+        return {
             "element_id": elem_id,
             "label": label,
             "category": element.get("category", "unknown"),
@@ -1198,7 +1296,12 @@ def generate_elements(elements_list, project_dir, progress_callback=None):
             "appears_in": element.get("appears_in", []),
             "frontal_prompt": frontal_prompt,
             "image_filename": filename
-        })
+        }
+    
+    # All elements in flight at once on the provider loop (the image model's limiter paces them)
+    generated = provider_loop.run_all(
+        (render(i, element) for i, element in enumerate(elements_list)), return_exceptions=False
+    )
     
     if progress_callback:
         success_count = sum(1 for e in generated if e.get("image_filename"))
@@ -1210,33 +1313,22 @@ def generate_elements(elements_list, project_dir, progress_callback=None):
     return generated
 
 
+ELEMENT_ASPECT_RATIO = "3:4"
+
+
 def _generate_element_image(prompt, output_path):
     """
     Generate a single element reference image in 3:4 PORTRAIT format for Kling.
     Uses Nanobanana Pro without any reference images.
     """
-    client = init_client()
     
-    response = client.models.generate_content(
+    response = provider_clients.gemini_generate(
         model=IMAGE_MODEL,
         contents=[prompt],
-        config=types.GenerateContentConfig(
-            response_modalities=["Image"],
-            image_config=types.ImageConfig(
-                aspect_ratio="3:4",
-            ),
-        ),
+        config=_image_config(aspect_ratio=ELEMENT_ASPECT_RATIO),
+        hedge=True,
     )
-    
-    if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-        for part in response.candidates[0].content.parts:
-            if part.inline_data is not None:
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                image = part.as_image()
-                image.save(output_path)
-                return output_path
-    
-    raise Exception("No image generated — response contained no image parts")
+    return _save_image(response, output_path)
 
 
 def regenerate_single_element(element, project_dir, progress_callback=None):
@@ -1313,8 +1405,7 @@ Return ONLY the new, complete image generation prompt as plain text. No markdown
 
     try:
         # We can just use the standard generate_content for a text response
-        client = init_client()
-        response = client.models.generate_content(
+        response = provider_clients.gemini_generate(
             model=GEMINI_MODEL_FLASH,
             contents=[system_prompt]
         )
@@ -1346,35 +1437,38 @@ Return ONLY the new, complete image generation prompt as plain text. No markdown
 
 def get_encyclopedia_dir(project_dir=None):
     """Returns the path to the encyclopedia directory."""
-    return os.path.join(os.path.dirname(__file__), "resources", "encyclopedia")
+    return str(encyclopedia.ENCYCLOPEDIA_DIR)
 
 def load_encyclopedia_rules():
-    """Loads all knowledge rules from the encyclopedia markdown files."""
-    enc_dir = get_encyclopedia_dir()
-    rules = {}
-    if os.path.exists(enc_dir):
-        import glob
-        for filepath in glob.glob(os.path.join(enc_dir, "*.md")):
-            topic = os.path.basename(filepath).replace(".md", "")
-            with open(filepath, "r", encoding="utf-8") as f:
-                rules[topic] = f.read()
-    return rules
+    """Loads all knowledge rules from the encyclopedia, keyed by topic (encyclopedia index)."""
+    return encyclopedia.load_guides()
 
-def audit_survival_knowledge(script_data, progress_callback=None):
-    """
-    Analyzes the script data to find required survival mechanics and audits them against 
-    the existing survival encyclopedia.
-    
-    Returns:
-        Dict with "confidence_score" (0-100), "known_topics", "missing_topics", and "report_text".
-    """
-    if progress_callback:
-        progress_callback("📚 Auditing required survival knowledge...", "info")
-        
-    rules = load_encyclopedia_rules()
-    known_topics_list = list(rules.keys())
-    
-    prompt = f"""You are a SURVIVAL MECHANICS AUDITOR for a video generator.
+# Script tokens per knowledge-audit call — longer scripts are split, never truncated
+AUDIT_CHUNK_TOKENS = 2000
+
+
+def _audit_section_text(section):
+    """One script section as the auditor sees it: header, stage directions, narration."""
+    if not isinstance(section, dict):
+        return str(section)
+    parts = [f"## {section['title']}"] if section.get("title") else []
+    parts += [f"[{sd}]" for sd in section.get("stage_directions", [])]
+    parts.append(section.get("clean_text", ""))
+    return "\n".join(p for p in parts if p)
+
+
+def _audit_chunks(script_data):
+    """The whole script as AUDIT_CHUNK_TOKENS-sized chunks, split on section boundaries first."""
+    if script_data.get("script"):
+        return script_chunker.split_text(script_data["script"], AUDIT_CHUNK_TOKENS)
+    if script_data.get("sections"):
+        return script_chunker.chunk_sections(script_data["sections"], AUDIT_CHUNK_TOKENS, _audit_section_text)
+    return script_chunker.split_text(json.dumps(script_data, ensure_ascii=False), AUDIT_CHUNK_TOKENS)
+
+
+def _audit_prompt(chunk, known_topics_list, part=1, parts=1):
+    part_note = f" (PART {part} OF {parts} — audit only this part)" if parts > 1 else ""
+    return f"""You are a SURVIVAL MECHANICS AUDITOR for a video generator.
 Your job is to read the provided episode script and identify all the *physical/mechanical survival processes* taking place.
 
 CRITICAL INSTRUCTION ON GRANULARITY & TOOLING:
@@ -1403,8 +1497,8 @@ You MUST return valid JSON. If you use quotes inside your strings, you MUST esca
 CURRENT ENCYCLOPEDIA TOPICS:
 {json.dumps(known_topics_list)}
 
-SCRIPT CONTENT:
-{script_data.get("script", str(script_data))[:4000]}
+SCRIPT CONTENT{part_note}:
+{chunk}
 
 Identify the core survival micro-mechanics in this script. For each mechanic:
 1. Is it a complex physical process that requires specific visual rules to look realistic? 
@@ -1429,9 +1523,62 @@ Return JSON in this format:
     ]
 }}
 """
+
+def _normalize_mechanic(name):
+    return re.sub(r"[^a-z0-9]+", " ", str(name).lower()).strip()
+
+
+def _reduce_mechanics(chunk_results):
+    """
+    Merge per-chunk required_mechanics into one deduplicated list.
+    
+    Mechanics match on their normalized name; a mechanic is known if any chunk
+    matched it to a topic. Order is first appearance in script order, so the
+    same chunk results always reduce to the same list.
+    """
+    merged = {}
+    for result in chunk_results:
+        for mechanic in result.get("required_mechanics", []) or []:
+            key = _normalize_mechanic(mechanic.get("name", ""))
+            if not key:
+                continue
+            entry = merged.setdefault(key, {"name": mechanic["name"], "is_known": False, "matching_topic": None})
+            if mechanic.get("is_known"):
+                entry["is_known"] = True
+                entry["matching_topic"] = entry["matching_topic"] or mechanic.get("matching_topic")
+    return list(merged.values())
+
+
+def audit_survival_knowledge(script_data, progress_callback=None):
+    """
+    Analyzes the script data to find required survival mechanics and audits them against 
+    the existing survival encyclopedia.
+    
+    The whole script is audited: it is split into AUDIT_CHUNK_TOKENS chunks on
+    section boundaries, every chunk is audited at once on provider_loop, and
+    the mechanics are merged and deduplicated.
+    
+    Returns:
+        Dict with "confidence_score" (0-100), "known_topics", "missing_topics", and "report_text".
+    """
+    if progress_callback:
+        progress_callback("📚 Auditing required survival knowledge...", "info")
+        
+    rules = load_encyclopedia_rules()
+    known_topics_list = list(rules.keys())
+    
+    chunks = _audit_chunks(script_data)
+    if progress_callback and len(chunks) > 1:
+        progress_callback(f"  📄 Script split into {len(chunks)} parts — auditing in parallel", "info")
+    
     try:
-        result = generate_json(prompt, temperature=0.2, max_tokens=8000, model=GEMINI_MODEL)
-        reqs = result.get("required_mechanics", [])
+        chunk_results = provider_loop.run_all(
+            (generate_json_async(_audit_prompt(chunk, known_topics_list, i + 1, len(chunks)),
+                                 temperature=0.2, max_tokens=8000, model=GEMINI_MODEL)
+             for i, chunk in enumerate(chunks)),
+            return_exceptions=False,
+        )
+        reqs = _reduce_mechanics(chunk_results)
         
         known = [r for r in reqs if r.get("is_known")]
         missing = [r for r in reqs if not r.get("is_known") and r.get("name")]
@@ -1454,25 +1601,17 @@ Return JSON in this format:
             progress_callback(f"❌ Audit failed: {str(e)}", "error")
         return {"confidence_score": 0, "known_topics": [], "missing_topics": ["Auditor Failed"], "report_text": str(e)}
 
-def auto_research_mechanics(missing_topics, progress_callback=None):
-    """
-    For each missing topic, uses Gemini with Google Search to research the mechanics 
-    and writes a new .md file into the resources/encyclopedia.
-    """
-    enc_dir = get_encyclopedia_dir()
-    os.makedirs(enc_dir, exist_ok=True)
-    
-    client = init_client()
-    results = []
-    
-    for topic in missing_topics:
-        if progress_callback:
-            progress_callback(f"🔍 Auto-researching missing topic: {topic}...", "batch")
-            
-        research_prompt = f"""You are a survival expert writing a technical guide for a video generation AI.
+def _research_prompt(topic, aliases, passages, use_grounding):
+    # Aliases are only alternate phrasings the script audit used — the guide still covers `topic` alone
+    also = f"\nThe script may also phrase this topic as: {'; '.join(aliases)}\n" if aliases else ""
+    if use_grounding:
+        source = f"Search Google for detailed, practical, physical step-by-step information on how `{topic}` is actually done in reality."
+    else:
+        source = f"Using the reference passages below and your own expertise, write detailed, practical, physical step-by-step information on how `{topic}` is actually done in reality."
+    prompt = f"""You are a survival expert writing a technical guide for a video generation AI.
 Topic: {topic}
-
-Search Google for detailed, practical, physical step-by-step information on how `{topic}` is actually done in reality.
+{also}
+{source}
 Focus on:
 1. The exact physical movements of the hands/body.
 2. The tools required and exactly how they are held.
@@ -1483,42 +1622,92 @@ Format your response as a detailed Markdown document. Use clear headings, bullet
 Do NOT wrap the entire response in ```markdown, just return the raw markdown text.
 Focus on realism and mechanical accuracy.
 """
-        try:
-            response = client.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=research_prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.4,
-                    max_output_tokens=8000,
-                    tools=[{"google_search": {}}],
-                )
-            )
-            
-            content = response.text.strip()
-            if content.startswith("```md"):
-                content = content[5:]
-            elif content.startswith("```markdown"):
-                content = content[11:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-            
-            # create filename
-            filename = topic.lower().replace(" ", "_").replace("/", "_").replace("\\", "_")[:40] + ".md"
-            filepath = os.path.join(enc_dir, filename)
-            
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(content)
-                
-            results.append({"topic": topic, "filename": filename, "status": "success"})
-            if progress_callback:
-                progress_callback(f"✅ Saved research for {topic} to {filename}", "success")
-                
-        except Exception as e:
-            if progress_callback:
-                progress_callback(f"❌ Research failed for {topic}: {str(e)}", "error")
-            results.append({"topic": topic, "error": str(e), "status": "failed"})
-            
+    if passages:
+        prompt += f"""
+REFERENCE PASSAGES from survival literature (first-hand accounts — use the physical details they describe):
+
+{research_index.format_passages(passages)}
+"""
+    return prompt
+
+
+def _strip_markdown_fence(content):
+    content = content.strip()
+    if content.startswith("```md"):
+        content = content[5:]
+    elif content.startswith("```markdown"):
+        content = content[11:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return content.strip()
+
+
+async def _research_topic_async(topic, aliases=(), progress_callback=None):
+    """Research one topic (and its aliases) and write its guide. Returns a result dict."""
+    try:
+        # Offline research library — real first-hand accounts, no network round-trip
+        passages = await asyncio.to_thread(research_index.search, topic, top_k=RESEARCH_PASSAGES)
+        use_grounding = not passages or passages[0].get("coverage", 0) < RESEARCH_MIN_COVERAGE
+        if progress_callback:
+            source = "Google Search + local library" if use_grounding else f"{len(passages)} local passages"
+            progress_callback(f"  📚 {topic}: {source}", "info")
+        
+        config_kwargs = {"temperature": 0.4, "max_output_tokens": 8000}
+        if use_grounding:
+            config_kwargs["tools"] = [{"google_search": {}}]
+        response = await provider_clients.gemini_generate_async(
+            model=GEMINI_MODEL,
+            contents=_research_prompt(topic, aliases, passages, use_grounding),
+            config=types.GenerateContentConfig(**config_kwargs)
+        )
+        content = _strip_markdown_fence(response.text or "")
+        if not content:
+            raise ValueError("empty research response")
+        filename = await asyncio.to_thread(encyclopedia.write_guide, topic, content, aliases)
+        if progress_callback:
+            progress_callback(f"✅ Saved research for {topic} to {filename}", "success")
+        return {"topic": topic, "aliases": list(aliases), "filename": filename, "status": "success"}
+    except Exception as e:
+        if progress_callback:
+            progress_callback(f"❌ Research failed for {topic}: {str(e)}", "error")
+        return {"topic": topic, "aliases": list(aliases), "error": str(e), "status": "failed"}
+
+
+def auto_research_mechanics(missing_topics, progress_callback=None):
+    """
+    Researches the missing topics and writes one encyclopedia guide per distinct topic.
+    
+    Before any call, topics are clustered against each other and against the
+    existing guides (encyclopedia.cluster_topics): near-duplicates share one
+    guide and topics the encyclopedia already covers are skipped. The rest are
+    researched at once on provider_loop, under the Pro model's rate limits.
+    Passages from the offline research library are injected first; Google
+    Search grounding is only used when the library has no close match.
+    
+    Returns:
+        List of {"topic", "filename", "status"} — status is "success",
+        "failed", "duplicate" (folded into another topic's guide) or
+        "covered" (an existing guide already matches)
+    """
+    clusters, covered = encyclopedia.cluster_topics(missing_topics)
+    results = [dict(c, status="covered") for c in covered]
+    if progress_callback:
+        for c in covered:
+            progress_callback(f"  📖 {c['topic']} — already covered by {c['filename']}", "info")
+        folded = sum(len(c["aliases"]) for c in clusters)
+        progress_callback(f"🔍 Auto-researching {len(clusters)} topic(s) in parallel "
+                          f"({len(covered)} already covered, {folded} near-duplicate(s) merged)...", "batch")
+    
+    researched = provider_loop.run_all(
+        _research_topic_async(c["topic"], c["aliases"], progress_callback) for c in clusters
+    )
+    for cluster, result in zip(clusters, researched):
+        if isinstance(result, BaseException):
+            result = {"topic": cluster["topic"], "error": str(result), "status": "failed"}
+        results.append(result)
+        for alias in cluster["aliases"]:
+            results.append({"topic": alias, "filename": result.get("filename"), "status": "duplicate",
+                            "merged_into": cluster["topic"]})
     return results
 
 # =============================================================================
@@ -1526,6 +1715,25 @@ Focus on realism and mechanical accuracy.
 # =============================================================================
 
 
+def _normalize_storyboard(result):
+    """Normalize scene_number to scene_num for internal engine processing."""
+    if not isinstance(result, dict):
+        raise ValueError(f"Cinematic analysis response is {type(result).__name__}, expected an object")
+    for scene in result.get("storyboard", []):
+        if "scene_number" in scene and "scene_num" not in scene:
+            scene["scene_num"] = scene.pop("scene_number")
+    return result
+
+
+def _storyboard_check(result, chapter_narration):
+    """model_router check: a non-empty storyboard with no validate_storyboard() errors."""
+    storyboard = result.get("storyboard") or []
+    if not storyboard:
+        return False, "empty storyboard"
+    validation = validate_storyboard(storyboard, chapter_narration)
+    return validation["valid"], validation["summary"]
+
+
 def cinematic_analyze_chapter(story, chapter_narration, chapter_index, elements, progress_callback=None):
     """
     Analyze a chapter's narration and produce a complete storyboard with bridge scenes.
@@ -1826,15 +2034,15 @@ Scan every scene's `action` field. If ANY of these appear, REWRITE the scene:
         if progress_callback:
             progress_callback("  ⏳ Running deep cinematic analysis...", "batch")
         
-        result = generate_json(prompt, temperature=0.4, max_tokens=15000)
+        # Flash first; Pro only if the storyboard fails validate_storyboard()
+        result = model_router.route(
+            "storyboard",
+            lambda model: _normalize_storyboard(generate_json(prompt, temperature=0.4, max_tokens=15000, model=model)),
+            lambda analysis: _storyboard_check(analysis, chapter_narration),
+        )
         
         storyboard = result.get("storyboard", [])
         
-        # Normalize scene_number to scene_num for internal engine processing
-        for scene in storyboard:
-            if "scene_number" in scene and "scene_num" not in scene:
-                scene["scene_num"] = scene.pop("scene_number")
-        
         if progress_callback:
             narrated = sum(1 for s in storyboard if s.get("type") == "narrated")
             bridges = sum(1 for s in storyboard if s.get("type") == "bridge")
@@ -2423,11 +2631,12 @@ def generate_frame_a_images(scenes, project_dir, progress_callback=None):
     os.makedirs(frames_dir, exist_ok=True)
     
     total = len(scenes)
-    for i, scene in enumerate(scenes):
+    
+    async def render(i, scene):
         scene_num = scene.get("number", i + 1)
         prompt = scene.get("frame_a_prompt", "")
         if not prompt:
-            continue
+            return
         
         filename = f"scene_{scene_num}_frame_a.png"
         image_path = os.path.join(frames_dir, filename)
@@ -2439,7 +2648,7 @@ def generate_frame_a_images(scenes, project_dir, progress_callback=None):
             )
         
         try:
-            _generate_element_image(prompt, image_path)
+            await generate_image_async(prompt, image_path, aspect_ratio=ELEMENT_ASPECT_RATIO)
             scene["frame_a_filename"] = filename
         except Exception as e:
             if progress_callback:
@@ -2449,6 +2658,8 @@ def generate_frame_a_images(scenes, project_dir, progress_callback=None):
                 )
             scene["frame_a_filename"] = None
     
+    provider_loop.run_all((render(i, scene) for i, scene in enumerate(scenes)), return_exceptions=False)
+    
     if progress_callback:
         generated = sum(1 for s in scenes if s.get("frame_a_filename"))
         progress_callback(
@@ -2490,6 +2701,20 @@ def regenerate_frame_a(scene, project_dir, progress_callback=None):
     
     return scene
 
+def _scene_batch_check(result, num_scenes):
+    """model_router check: the batch has the requested scenes, each with both prompts."""
+    scenes = result.get("scenes") if isinstance(result, dict) else None
+    if not scenes:
+        return False, "no scenes"
+    if len(scenes) < num_scenes:
+        return False, f"{len(scenes)}/{num_scenes} scenes"
+    incomplete = [i + 1 for i, s in enumerate(scenes)
+                  if not isinstance(s, dict) or not s.get("video_prompt") or not s.get("frame_a_prompt")]
+    if incomplete:
+        return False, f"scene(s) {incomplete} missing video_prompt/frame_a_prompt"
+    return True, "complete"
+
+
 def generate_scene_prompts(story, narration, elements, audio_durations=None, progress_callback=None):
     """
     Generate unified Scene Prompts from narration.
@@ -2640,7 +2865,11 @@ Return JSON:
 }}"""
 
         try:
-            result = generate_json(prompt, temperature=0.5, max_tokens=8000)
+            result = model_router.route(
+                "scene_batch",
+                lambda model: generate_json(prompt, temperature=0.5, max_tokens=8000, model=model),
+                lambda batch: _scene_batch_check(batch, num_scenes),
+            )
             batch_scenes = result.get("scenes", [])
             
             for s in batch_scenes:
@@ -2702,6 +2931,38 @@ def generate_video_prompt(scene_row, scene_state, elements, story, is_presenter=
     Returns:
         Dict with 'video_prompt', 'metadata', and image references
     """
+    prompt = _video_prompt_request(scene_row, scene_state, elements, story, is_presenter)
+    try:
+        result = generate_json(prompt, temperature=0.5, max_tokens=4000, model=GEMINI_MODEL_FLASH)
+        return result
+    except Exception as e:
+        return _video_prompt_failed(scene_row, e, progress_callback)
+
+
+async def generate_video_prompt_async(scene_row, scene_state, elements, story, is_presenter=False, progress_callback=None):
+    """generate_video_prompt() as a coroutine, so a chapter's scenes are written concurrently on provider_loop."""
+    # Building the request reads the encyclopedia from disk — keep that off the loop
+    prompt = await asyncio.to_thread(_video_prompt_request, scene_row, scene_state, elements, story, is_presenter)
+    try:
+        return await generate_json_async(prompt, temperature=0.5, max_tokens=4000, model=GEMINI_MODEL_FLASH)
+    except Exception as e:
+        return _video_prompt_failed(scene_row, e, progress_callback)
+
+
+def _video_prompt_failed(scene_row, error, progress_callback=None):
+    """Placeholder prompt for a scene whose prompt request failed (kept so the scene can be regenerated)."""
+    if progress_callback:
+        progress_callback(f"⚠️ Prompt generation failed for scene {scene_row.get('scene_num')}: {error}", "error")
+    return {
+        "video_prompt": f"No music. [FAILED — regenerate this scene]. 4K.",
+        "scene_type": scene_row.get("type", "narrated"),
+        "elements_used": scene_row.get("elements", []),
+        "error": str(error)
+    }
+
+
+def _video_prompt_request(scene_row, scene_state, elements, story, is_presenter=False):
+    """The Kling prompt-writing request for one scene (see generate_video_prompt)."""
     char = story.get("character", {})
     loc = story.get("location", {})
     
@@ -2846,18 +3107,7 @@ Return JSON:
     "camera_shots": ["Description of each camera angle/movement"]
 }}"""
 
-    try:
-        result = generate_json(prompt, temperature=0.5, max_tokens=4000, model=GEMINI_MODEL_FLASH)
-        return result
-    except Exception as e:
-        if progress_callback:
-            progress_callback(f"⚠️ Prompt generation failed for scene {scene_row.get('scene_num')}: {e}", "error")
-        return {
-            "video_prompt": f"No music. [FAILED — regenerate this scene]. 4K.",
-            "scene_type": scene_type,
-            "elements_used": scene_elements,
-            "error": str(e)
-        }
+    return prompt
 
 
 # =============================================================================
@@ -2900,9 +3150,10 @@ def generate_chapter_production(story, chapter_narration, chapter_index, element
     if progress_callback:
         progress_callback("📋 STEP 1/4: Cinematic Analysis...", "info")
     
-    analysis = cinematic_analyze_chapter(
-        story, chapter_narration, chapter_index, elements, progress_callback
-    )
+    with tracing.span("cinematic_analysis", chapter=chapter_index + 1):
+        analysis = cinematic_analyze_chapter(
+            story, chapter_narration, chapter_index, elements, progress_callback
+        )
     storyboard = analysis.get("storyboard", [])
     
     if not storyboard:
@@ -2912,7 +3163,8 @@ def generate_chapter_production(story, chapter_narration, chapter_index, element
     if progress_callback:
         progress_callback("🔍 VALIDATION: Checking storyboard quality...", "info")
     
-    validation = validate_storyboard(storyboard, chapter_narration, progress_callback)
+    with tracing.span("validate_storyboard", scenes=len(storyboard)):
+        validation = validate_storyboard(storyboard, chapter_narration, progress_callback)
     analysis["validation"] = validation
     
     if not validation["valid"]:
@@ -2935,40 +3187,43 @@ def generate_chapter_production(story, chapter_narration, chapter_index, element
     all_states = []
     image_prompts = []
     
-    for i, scene_row in enumerate(storyboard):
-        # Evolve state
-        new_state = evolve_scene_state(state, scene_row, progress_callback)
+    with tracing.span("state_tracking", scenes=len(storyboard)):
+        for i, scene_row in enumerate(storyboard):
+            with tracing.span("scene_state", scene_num=scene_row.get("scene_num")) as sp:
+                # Evolve state
+                new_state = evolve_scene_state(state, scene_row, progress_callback)
         
-        # Evaluate location diff
-        if i == 0:
-            # First scene always needs an image
-            diff = {"needs_new_image": True, "triggers": ["first_scene_in_chapter"]}
-        else:
-            diff = evaluate_location_diff(new_state, state)
+                # Evaluate location diff
+                if i == 0:
+                    # First scene always needs an image
+                    diff = {"needs_new_image": True, "triggers": ["first_scene_in_chapter"]}
+                else:
+                    diff = evaluate_location_diff(new_state, state)
         
-        # Generate location image prompt if needed
-        if diff["needs_new_image"]:
-            img_prompt = generate_location_image_prompt(
-                new_state, state if i > 0 else None, diff
-            )
-            new_state["location_image"] = img_prompt["output_filename"]
-            image_prompts.append({
-                "scene_num": scene_row.get("scene_num"),
-                "image_prompt": img_prompt,
-                "triggers": diff["triggers"]
-            })
-            if progress_callback:
-                progress_callback(
-                    f"  🖼️ Scene {scene_row['scene_num']}: NEW image → {img_prompt['output_filename']} "
-                    f"({'from ref' if img_prompt['use_reference'] else 'standalone'})",
-                    "batch"
-                )
-        else:
-            # Reuse previous image
-            new_state["location_image"] = state.get("location_image")
+                # Generate location image prompt if needed
+                if diff["needs_new_image"]:
+                    img_prompt = generate_location_image_prompt(
+                        new_state, state if i > 0 else None, diff
+                    )
+                    new_state["location_image"] = img_prompt["output_filename"]
+                    image_prompts.append({
+                        "scene_num": scene_row.get("scene_num"),
+                        "image_prompt": img_prompt,
+                        "triggers": diff["triggers"]
+                    })
+                    if progress_callback:
+                        progress_callback(
+                            f"  🖼️ Scene {scene_row['scene_num']}: NEW image → {img_prompt['output_filename']} "
+                            f"({'from ref' if img_prompt['use_reference'] else 'standalone'})",
+                            "batch"
+                        )
+                else:
+                    # Reuse previous image
+                    new_state["location_image"] = state.get("location_image")
         
-        all_states.append(new_state)
-        state = new_state  # Pass forward
+                all_states.append(new_state)
+                state = new_state  # Pass forward
+                sp.set(new_image=diff["needs_new_image"])
     
     if progress_callback:
         new_images = len(image_prompts)
@@ -2984,33 +3239,47 @@ def generate_chapter_production(story, chapter_narration, chapter_index, element
     locations_dir = os.path.join(project_dir, "locations")
     os.makedirs(locations_dir, exist_ok=True)
     
-    generated_images = []
-    for img_data in image_prompts:
+    async def render(img_data, upstream):
         img_prompt = img_data["image_prompt"]
         output_path = os.path.join(locations_dir, img_prompt["output_filename"])
         
-        try:
-            if img_prompt["use_reference"] and img_prompt["reference_image"]:
-                ref_path = os.path.join(locations_dir, img_prompt["reference_image"])
-                if os.path.exists(ref_path):
-                    generate_image_with_ref(
-                        img_prompt["prompt"], output_path, ref_path
+        # An image built on an earlier image from this chapter waits for it (success or failure)
+        if upstream is not None:
+            await asyncio.wait([upstream])
+        
+        with tracing.span("location_image", scene_num=img_data.get("scene_num")):
+            try:
+                ref_path = None
+                if img_prompt["use_reference"] and img_prompt["reference_image"]:
+                    ref_path = os.path.join(locations_dir, img_prompt["reference_image"])
+                    if not os.path.exists(ref_path):
+                        # Reference doesn't exist yet, generate standalone
+                        ref_path = None
+                await generate_image_async(img_prompt["prompt"], output_path, ref_image_path=ref_path)
+                
+                if progress_callback:
+                    progress_callback(f"  ✓ {img_prompt['output_filename']}", "success")
+                return img_prompt["output_filename"]
+            except Exception as e:
+                if progress_callback:
+                    progress_callback(
+                        f"  ⚠️ {img_prompt['output_filename']} failed: {str(e)[:100]} — prompt saved for manual generation",
+                        "error"
                     )
-                else:
-                    # Reference doesn't exist yet, generate standalone
-                    generate_image(img_prompt["prompt"], output_path)
-            else:
-                generate_image(img_prompt["prompt"], output_path)
-            
-            generated_images.append(img_prompt["output_filename"])
-            if progress_callback:
-                progress_callback(f"  ✓ {img_prompt['output_filename']}", "success")
-        except Exception as e:
-            if progress_callback:
-                progress_callback(
-                    f"  ⚠️ {img_prompt['output_filename']} failed: {str(e)[:100]} — prompt saved for manual generation",
-                    "error"
-                )
+    
+    async def render_all():
+        # Independent images run concurrently; reference chains stay in order
+        tasks = []
+        by_filename = {}
+        for img_data in image_prompts:
+            upstream = by_filename.get(img_data["image_prompt"].get("reference_image"))
+            task = asyncio.ensure_future(render(img_data, upstream))
+            tasks.append(task)
+            by_filename[img_data["image_prompt"]["output_filename"]] = task
+        return await asyncio.gather(*tasks)
+    
+    with tracing.span("location_images", images=len(image_prompts)):
+        generated_images = [name for name in provider_loop.run(render_all()) if name]
     
     if progress_callback:
         progress_callback(f"✅ {len(generated_images)}/{len(image_prompts)} images generated", "success")
@@ -3021,27 +3290,36 @@ def generate_chapter_production(story, chapter_narration, chapter_index, element
     if progress_callback:
         progress_callback(f"✍️ STEP 4/4: Generating {len(storyboard)} video prompts...", "info")
     
-    all_prompts = []
-    for i, scene_row in enumerate(storyboard):
-        scene_state = all_states[i]
-        
-        prompt_result = generate_video_prompt(
-            scene_row, scene_state, elements, story,
-            is_presenter=False, progress_callback=progress_callback
+    done = 0
+    
+    async def write(i, scene_row):
+        nonlocal done
+        with tracing.span("video_prompt", scene_num=scene_row.get("scene_num")):
+            scene_state = all_states[i]
+            
+            prompt_result = await generate_video_prompt_async(
+                scene_row, scene_state, elements, story,
+                is_presenter=False, progress_callback=progress_callback
+            )
+            
+            # Merge storyboard metadata into prompt result
+            prompt_result["scene_num"] = scene_row.get("scene_num")
+            prompt_result["type"] = scene_row.get("type")
+            prompt_result["action"] = scene_row.get("action")
+            prompt_result["narration_excerpt"] = scene_row.get("narration_excerpt")
+            prompt_result["location_image"] = scene_state.get("location_image")
+            prompt_result["bridge_reason"] = scene_row.get("bridge_reason")
+        
+        done += 1
+        if progress_callback and done % 3 == 0:
+            progress_callback(f"  ... {done}/{len(storyboard)} prompts done", "batch")
+        return prompt_result
+    
+    # Every scene's prompt in flight at once; results come back in storyboard order
+    with tracing.span("video_prompts", scenes=len(storyboard)):
+        all_prompts = provider_loop.run_all(
+            (write(i, scene_row) for i, scene_row in enumerate(storyboard)), return_exceptions=False
         )
-        
-        # Merge storyboard metadata into prompt result
-        prompt_result["scene_num"] = scene_row.get("scene_num")
-        prompt_result["type"] = scene_row.get("type")
-        prompt_result["action"] = scene_row.get("action")
-        prompt_result["narration_excerpt"] = scene_row.get("narration_excerpt")
-        prompt_result["location_image"] = scene_state.get("location_image")
-        prompt_result["bridge_reason"] = scene_row.get("bridge_reason")
-        
-        all_prompts.append(prompt_result)
-        
-        if progress_callback and (i + 1) % 3 == 0:
-            progress_callback(f"  ... {i + 1}/{len(storyboard)} prompts done", "batch")
     
     # =========================================================================
     # BONUS: Presenter Break Scenes (if break_text provided)
@@ -3087,16 +3365,17 @@ def generate_chapter_production(story, chapter_narration, chapter_index, element
                 "tools": []
             }
             
-            prompt_result = generate_video_prompt(
-                break_scene_row, last_state, elements, story,
-                is_presenter=True, progress_callback=progress_callback
-            )
-            prompt_result["scene_num"] = break_scene_row["scene_num"]
-            prompt_result["type"] = "presenter"
-            prompt_result["narration_excerpt"] = part["narration"]
-            prompt_result["location_image"] = last_state.get("location_image")
+            with tracing.span("video_prompt", scene_num=break_scene_row["scene_num"], presenter=True):
+                prompt_result = generate_video_prompt(
+                    break_scene_row, last_state, elements, story,
+                    is_presenter=True, progress_callback=progress_callback
+                )
+                prompt_result["scene_num"] = break_scene_row["scene_num"]
+                prompt_result["type"] = "presenter"
+                prompt_result["narration_excerpt"] = part["narration"]
+                prompt_result["location_image"] = last_state.get("location_image")
             
-            all_prompts.append(prompt_result)
+                all_prompts.append(prompt_result)
         
         if progress_callback:
             progress_callback(f"✅ {num_break_scenes} presenter break scene(s) added", "success")
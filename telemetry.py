@@ -0,0 +1,425 @@
+"""
+The Last Shelter — Provider Call Telemetry
+
+Every provider call that goes through rate_limiter.call() is recorded here,
+tagged with:
+
+    project   — the project the work belongs to
+    stage     — the pipeline stage (the Flask endpoint that started the work)
+    function  — the pipeline function that asked for the call
+                (cinematic_analyze_chapter, evolve_scene_state, ...)
+
+Project and stage ride along in contextvars: app.py sets them per request,
+and background jobs / worker pools inherit them via propagate(). The function
+is found by walking the stack past the generic wrappers (generate_json,
+gemini_generate, ...), so no call site has to pass it.
+
+Kept per label set:
+- Cumulative latency histograms and counters (calls, retries, queue wait,
+  tokens, images, characters, video seconds, estimated USD) — exported in
+  Prometheus text format at GET /metrics
+- A rolling 15-minute window of latencies for p50/p95 at a glance
+- Gauges with their high-water marks (HTTP requests in flight, which is
+  how close the gunicorn thread pool is to saturation)
+
+Per project, each call is appended to <project>/telemetry.jsonl so the cost
+summary survives restarts. Prices live in config/pricing.json.
+"""
+import sys
+import json
+import time
+import functools
+import threading
+import contextvars
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+PRICING_PATH = Path(__file__).parent / "config" / "pricing.json"
+TELEMETRY_FILENAME = "telemetry.jsonl"
+
+# Latency histogram buckets (seconds) — Gemini text is seconds, Kling renders minutes
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120, 300, 600)
+ROLLING_WINDOW_SECONDS = 900
+ROLLING_MAX_SAMPLES = 20_000
+
+# Frames skipped when looking for the pipeline function behind a call
+_WRAPPER_MODULES = ("telemetry", "tracing", "rate_limiter", "provider_clients", "provider_loop", "model_router", "hedging", "batch_mode", "contextlib", "threading",
+                    "concurrent.futures.thread", "asyncio.events", "asyncio.base_events", "asyncio.tasks")
+_WRAPPER_FUNCTIONS = {
+    "generate_text", "generate_json", "generate_json_with_search", "generate_image", "generate_image_with_ref",
+    "generate_audio_segment", "generate_audio_segment_cached", "synthesize", "submit_request", "post",
+    "submit_video_generation", "generate_json_async", "generate_image_async", "generate_audio_segment_async",
+    "generate_audio_segment_cached_async", "enhance_narration_async", "check_status_async",
+}
+
+# Usage fields accepted by record()
+USAGE_FIELDS = ("input_tokens", "output_tokens", "images", "characters", "video_seconds")
+
+_project = contextvars.ContextVar("telemetry_project", default=None)
+_stage = contextvars.ContextVar("telemetry_stage", default=None)
+_function = contextvars.ContextVar("telemetry_function", default=None)
+
+_lock = threading.Lock()
+_file_lock = threading.Lock()
+_histograms = {}                     # labels -> {"buckets": [...], "sum", "count"}
+_counters = defaultdict(float)       # (metric, labels) -> value
+_gauges = defaultdict(float)         # (metric, labels) -> value
+_gauge_peaks = defaultdict(float)    # (metric, labels) -> highest value seen
+_rolling = deque(maxlen=ROLLING_MAX_SAMPLES)   # (time, provider, function, latency, ok)
+_projects_dir = None
+_pricing = None
+
+
+def configure(projects_dir):
+    """Persist per-project call records under projects_dir/<project>/telemetry.jsonl."""
+    global _projects_dir
+    _projects_dir = Path(projects_dir)
+
+
+# =============================================================================
+# CONTEXT
+# =============================================================================
+
+def set_context(project=None, stage=None):
+    """Tag everything this thread does from now on (request threads are reused, so both are always set)."""
+    _project.set(project)
+    _stage.set(stage)
+
+
+@contextmanager
+def context(project=None, stage=None):
+    """Temporarily tag calls with a project and/or stage; unset values are inherited."""
+    tokens = []
+    if project is not None:
+        tokens.append((_project, _project.set(project)))
+    if stage is not None:
+        tokens.append((_stage, _stage.set(stage)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current():
+    return {"project": _project.get(), "stage": _stage.get()}
+
+
+def propagate(fn):
+    """
+    Wrap fn so it runs with the caller's project/stage — for threading.Thread
+    targets and executor submits, which start with an empty context.
+    """
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
+
+
+@contextmanager
+def attribute(function=None):
+    """
+    Attribute calls made in this block to `function` (default: the caller) when
+    no pipeline function is on their own stack — for work handed to another
+    task or to provider_loop, which starts without the caller's frames.
+    """
+    token = _function.set(function or caller_function())
+    try:
+        yield
+    finally:
+        _function.reset(token)
+
+
+def caller_function():
+    """Name of the innermost pipeline function on the stack that isn't a generic wrapper."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        code = frame.f_code
+        name = getattr(code, "co_qualname", code.co_name).replace(".<locals>", "")
+        short = name.rsplit(".", 1)[-1]
+        if module not in _WRAPPER_MODULES and short not in _WRAPPER_FUNCTIONS and not short.startswith("<"):
+            return name
+        frame = frame.f_back
+    return _function.get() or "unknown"
+
+
+# =============================================================================
+# PRICING
+# =============================================================================
+
+def _load_pricing():
+    global _pricing
+    if _pricing is None:
+        try:
+            with open(PRICING_PATH) as f:
+                _pricing = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[Telemetry] No usable {PRICING_PATH.name} ({e}) — costs will read 0")
+            _pricing = {}
+    return _pricing
+
+
+def estimate_cost(provider, usage):
+    """Estimated USD for one call from config/pricing.json (0 for unpriced providers)."""
+    price = _load_pricing().get(provider) or {}
+    return (
+        usage.get("input_tokens", 0) / 1e6 * price.get("input_per_million", 0)
+        + usage.get("output_tokens", 0) / 1e6 * price.get("output_per_million", 0)
+        + usage.get("images", 0) * price.get("per_image", 0)
+        + usage.get("characters", 0) / 1000 * price.get("per_1k_characters", 0)
+        + usage.get("video_seconds", 0) * price.get("per_video_second", 0)
+    )
+
+
+# =============================================================================
+# RECORDING
+# =============================================================================
+
+def record(provider, latency, ok=True, retries=0, queue_seconds=0.0, usage=None, error=None):
+    """
+    Record one provider call (called by rate_limiter.call once retries are settled).
+
+    Args:
+        provider: Limiter key — model ID, "elevenlabs", "fal"
+        latency: Seconds the final attempt took
+        ok: False if the call failed after every retry
+        retries: Attempts beyond the first
+        queue_seconds: Time spent waiting on the rate limiter
+        usage: Dict of USAGE_FIELDS reported by the provider
+        error: Exception type name for failed calls
+    """
+    usage = {k: v for k, v in (usage or {}).items() if k in USAGE_FIELDS and v}
+    project, stage = _project.get(), _stage.get()
+    function = caller_function()
+    cost = estimate_cost(provider, usage)
+    labels = (provider, stage or "", function, "ok" if ok else "error")
+
+    with _lock:
+        hist = _histograms.get(labels)
+        if hist is None:
+            hist = _histograms[labels] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += latency
+        hist["count"] += 1
+
+        _counters[("provider_retries_total", labels)] += retries
+        _counters[("provider_queue_seconds_total", labels)] += queue_seconds
+        for field, value in usage.items():
+            _counters[(f"provider_{field}_total", labels)] += value
+        if cost:
+            _counters[("provider_cost_usd_total", labels)] += cost
+        _rolling.append((time.time(), provider, function, latency, ok))
+
+    if project and _projects_dir is not None and (_projects_dir / project).is_dir():
+        entry = {
+            "t": round(time.time(), 3), "provider": provider, "stage": stage, "function": function,
+            "ok": ok, "latency": round(latency, 3), "retries": retries,
+            "queue_seconds": round(queue_seconds, 3), "cost_usd": round(cost, 6), **usage,
+        }
+        if error:
+            entry["error"] = error
+        try:
+            with _file_lock, open(_projects_dir / project / TELEMETRY_FILENAME, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"[Telemetry] Could not write {project}/{TELEMETRY_FILENAME}: {e}")
+
+
+def count(metric, value=1, **labels):
+    """Bump a free-form counter (e.g. truncated responses), tagged with the current stage."""
+    key = (metric, tuple(sorted({"stage": _stage.get() or "", **labels}.items())))
+    with _lock:
+        _counters[key] += value
+
+
+def gauge_add(metric, delta, **labels):
+    """Move a gauge up or down (e.g. requests in flight). Returns the new value."""
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _gauges[key] += delta
+        _gauge_peaks[key] = max(_gauge_peaks[key], _gauges[key])
+        return _gauges[key]
+
+
+def gauges():
+    """Current value and peak of every gauge, labels flattened into the name: {"metric{k=v}": {...}}."""
+    with _lock:
+        items = [(key, _gauges[key], _gauge_peaks[key]) for key in _gauges]
+    return {f"{metric}{_label_text(labels) if labels else ''}": {"value": value, "peak": peak}
+            for (metric, labels), value, peak in sorted(items)}
+
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+_CALL_LABELS = ("provider", "stage", "function", "outcome")
+
+
+def _label_text(pairs):
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+
+
+def prometheus_text():
+    """All metrics in Prometheus text exposition format."""
+    with _lock:
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                      for k, v in _histograms.items()}
+        counters = dict(_counters)
+        gauge_values = [(key, _gauges[key], _gauge_peaks[key]) for key in _gauges]
+
+    lines = [
+        "# HELP provider_call_seconds Provider call latency (final attempt)",
+        "# TYPE provider_call_seconds histogram",
+    ]
+    for labels, hist in sorted(histograms.items()):
+        pairs = list(zip(_CALL_LABELS, labels))
+        for bound, n in zip(LATENCY_BUCKETS, hist["buckets"]):
+            lines.append(f"provider_call_seconds_bucket{_label_text(pairs + [('le', bound)])} {n}")
+        lines.append(f"provider_call_seconds_bucket{_label_text(pairs + [('le', '+Inf')])} {hist['count']}")
+        lines.append(f"provider_call_seconds_sum{_label_text(pairs)} {hist['sum']:.6f}")
+        lines.append(f"provider_call_seconds_count{_label_text(pairs)} {hist['count']}")
+
+    by_metric = defaultdict(list)
+    for (metric, labels), value in counters.items():
+        by_metric[metric].append((labels, value))
+    for metric in sorted(by_metric):
+        lines.append(f"# TYPE {metric} counter")
+        for labels, value in sorted(by_metric[metric]):
+            pairs = labels if labels and isinstance(labels[0], tuple) else list(zip(_CALL_LABELS, labels))
+            lines.append(f"{metric}{_label_text(pairs)} {_format(value)}")
+
+    by_gauge = defaultdict(list)
+    for (metric, labels), value, peak in gauge_values:
+        by_gauge[metric].append((labels, value, peak))
+    for metric in sorted(by_gauge):
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(f"{metric}{_label_text(labels)} {_format(value)}" for labels, value, _ in sorted(by_gauge[metric]))
+        lines.append(f"# TYPE {metric}_peak gauge")
+        lines.extend(f"{metric}_peak{_label_text(labels)} {_format(peak)}" for labels, _, peak in sorted(by_gauge[metric]))
+    return "\n".join(lines) + "\n"
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def latency_percentile(provider, q, window=ROLLING_WINDOW_SECONDS, min_samples=1):
+    """Latency percentile of a provider's successful calls over the last `window` seconds (None if too few)."""
+    cutoff = time.time() - window
+    with _lock:
+        latencies = [s[3] for s in _rolling if s[0] >= cutoff and s[1] == provider and s[4]]
+    if len(latencies) < max(1, min_samples):
+        return None
+    return _percentile(latencies, q)
+
+
+def rolling_summary(window=ROLLING_WINDOW_SECONDS):
+    """Latency p50/p95/max and error counts per provider + function over the last `window` seconds."""
+    cutoff = time.time() - window
+    with _lock:
+        samples = [s for s in _rolling if s[0] >= cutoff]
+    groups = defaultdict(list)
+    for _, provider, function, latency, ok in samples:
+        groups[(provider, function)].append((latency, ok))
+    summary = []
+    for (provider, function), calls in sorted(groups.items()):
+        latencies = [latency for latency, _ in calls]
+        summary.append({
+            "provider": provider,
+            "function": function,
+            "calls": len(calls),
+            "errors": sum(1 for _, ok in calls if not ok),
+            "p50": round(_percentile(latencies, 0.5), 3),
+            "p95": round(_percentile(latencies, 0.95), 3),
+            "max": round(max(latencies), 3),
+        })
+    return {"window_seconds": window, "calls": summary}
+
+
+def project_costs(project_dir):
+    """
+    Cost/usage summary of a project from its telemetry.jsonl.
+
+    Returns:
+        Dict with totals and breakdowns by stage, function and provider
+    """
+    path = Path(project_dir) / TELEMETRY_FILENAME
+
+    def bucket():
+        return {"calls": 0, "errors": 0, "retries": 0, "latency_seconds": 0.0, "cost_usd": 0.0,
+                **{field: 0 for field in USAGE_FIELDS}}
+
+    total = bucket()
+    breakdowns = {"by_stage": defaultdict(bucket), "by_function": defaultdict(bucket),
+                  "by_provider": defaultdict(bucket)}
+    first = last = None
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue        # partial line from a crash mid-write
+                first = first or entry.get("t")
+                last = entry.get("t", last)
+                targets = [total,
+                           breakdowns["by_stage"][entry.get("stage") or "unknown"],
+                           breakdowns["by_function"][entry.get("function") or "unknown"],
+                           breakdowns["by_provider"][entry.get("provider") or "unknown"]]
+                for target in targets:
+                    target["calls"] += 1
+                    target["errors"] += 0 if entry.get("ok", True) else 1
+                    target["retries"] += entry.get("retries", 0)
+                    target["latency_seconds"] += entry.get("latency", 0)
+                    target["cost_usd"] += entry.get("cost_usd", 0)
+                    for field in USAGE_FIELDS:
+                        target[field] += entry.get(field, 0)
+
+    def rounded(b):
+        return {k: round(v, 4) if isinstance(v, float) else v for k, v in b.items()}
+
+    result = {"total": rounded(total), "first_call": first, "last_call": last}
+    for name, groups in breakdowns.items():
+        result[name] = {k: rounded(v) for k, v in sorted(groups.items(), key=lambda kv: -kv[1]["cost_usd"])}
+    return result
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import tempfile
+    import rate_limiter
+    import telemetry        # the instance rate_limiter records into (not __main__)
+
+    def cinematic_analyze_chapter():
+        return rate_limiter.call("gemini-2.5-pro", lambda: time.sleep(0.05) or "ok",
+                                 meter=lambda _: {"input_tokens": 12000, "output_tokens": 3000})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        telemetry.configure(tmp)
+        (Path(tmp) / "demo").mkdir()
+        with telemetry.context(project="demo", stage="cinematic"):
+            threads = [threading.Thread(target=telemetry.propagate(cinematic_analyze_chapter)) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        print(telemetry.prometheus_text())
+        print(json.dumps(telemetry.rolling_summary(), indent=2))
+        print(json.dumps(telemetry.project_costs(Path(tmp) / "demo")["total"], indent=2))
@@ -0,0 +1,347 @@
+"""
+The Last Shelter — Job Trace Spans
+
+Structured timing for background jobs (chapter production, prompt writing,
+element generation, ...). Each job collects nested spans:
+
+    job                         the whole background worker
+      stage / step              e.g. "state_tracking", "location_images"
+        scene                   one storyboard scene
+          provider call         every rate_limiter.call(), with retries,
+                                queue wait, tokens and the asking function
+
+and writes them when it ends to <project>/traces/<job_id>.json in Chrome
+trace format — open it in chrome://tracing or https://ui.perfetto.dev, or
+fetch it from GET /api/project/<id>/jobs/<job_id>/trace. Spans on worker
+pool threads — and in each asyncio task on provider_loop — show up as their
+own rows, so overlap (and the lack of it) is visible at a glance.
+
+The current job and span ride along in contextvars, so they follow
+telemetry.propagate() into threads and executor pools. Outside a job every
+span() is a no-op.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+
+import telemetry
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+TRACES_DIRNAME = "traces"
+# Oldest traces beyond this many per project are deleted
+MAX_TRACES_PER_PROJECT = 50
+# Guard against runaway loops filling memory
+MAX_SPANS_PER_JOB = 20_000
+
+_job = contextvars.ContextVar("tracing_job", default=None)
+_span = contextvars.ContextVar("tracing_span", default=None)
+_track = contextvars.ContextVar("tracing_track", default=None)
+
+_projects_dir = None
+
+
+def configure(projects_dir):
+    """Write job traces under projects_dir/<project>/traces/."""
+    global _projects_dir
+    _projects_dir = Path(projects_dir)
+
+
+# =============================================================================
+# SPANS
+# =============================================================================
+
+def _current_track():
+    """(key, row name) of the timeline row for spans started here: the thread, or the asyncio task on it."""
+    pinned = _track.get()
+    if pinned is not None:
+        return pinned
+    thread = threading.current_thread()
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is None:
+        return (thread.ident,), thread.name
+    # Coroutines on one loop thread overlap — each task gets its own row
+    return (thread.ident, id(task)), f"{thread.name} · {task.get_name()}"
+
+
+@contextmanager
+def track():
+    """
+    Keep spans recorded in this block — and in contexts copied inside it — on
+    the caller's row, for work another task finishes on the caller's behalf
+    (batch_mode records each request's span from the batch job's task).
+    """
+    token = _track.set(_current_track())
+    try:
+        yield
+    finally:
+        _track.reset(token)
+
+
+class Span:
+    """One timed piece of work. Attributes can be added while it runs with set()."""
+
+    __slots__ = ("id", "name", "cat", "attrs", "start", "track", "parent")
+
+    def __init__(self, name, cat, attrs, start=None, parent=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.cat = cat
+        self.attrs = attrs
+        self.start = time.perf_counter() if start is None else start
+        self.track = _current_track()
+        self.parent = parent
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class _NoSpan:
+    """Stand-in yielded by span() outside a job."""
+
+    def set(self, **attrs):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Job:
+    """Spans collected for one background job."""
+
+    def __init__(self, job_id, name, project):
+        self.id = job_id
+        self.name = name
+        self.project = project
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._events = []
+        self._threads = {}           # track key (thread ident[, task id]) -> (tid, name)
+        self.dropped = 0
+
+    def _tid(self, track):
+        key, name = track
+        tid = self._threads.get(key)
+        if tid is None:
+            tid = self._threads[key] = (len(self._threads) + 1, name)
+        return tid[0]
+
+    def add(self, span, end):
+        with self._lock:
+            if len(self._events) >= MAX_SPANS_PER_JOB:
+                self.dropped += 1
+                return
+            args = {k: v for k, v in span.attrs.items() if v is not None}
+            if span.parent:
+                args["parent"] = span.parent
+            self._events.append({
+                "name": span.name, "cat": span.cat, "ph": "X", "pid": 1, "tid": self._tid(span.track),
+                "ts": round((span.start - self.origin) * 1e6), "dur": round((end - span.start) * 1e6),
+                "id": span.id, "args": args,
+            })
+
+    def chrome_trace(self, duration):
+        """The job as a Chrome trace-event document."""
+        with self._lock:
+            events = sorted(self._events, key=lambda e: (e["ts"], -e["dur"]))
+            threads = sorted(self._threads.values())
+        provider = [e for e in events if e["cat"] == "provider"]
+        meta = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"{self.name} ({self.id})"}}]
+        meta += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                 for tid, name in threads]
+        return {
+            "traceEvents": meta + events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "job_id": self.id,
+                "name": self.name,
+                "project": self.project,
+                "started_at": round(self.started_at, 3),
+                "duration_ms": round(duration * 1000, 1),
+                "spans": len(events),
+                "dropped_spans": self.dropped,
+                "provider_calls": len(provider),
+                "provider_ms": round(sum(e["dur"] for e in provider) / 1000, 1),
+                "threads": len(threads),
+            },
+        }
+
+
+@contextmanager
+def span(name, cat="pipeline", **attrs):
+    """
+    Time a block as a child of the current span.
+
+    Usage:
+        with tracing.span("scene", scene_num=4) as s:
+            ...
+            s.set(new_image=True)
+    """
+    job = _job.get()
+    if job is None:
+        yield _NO_SPAN
+        return
+    s = Span(name, cat, attrs, parent=getattr(_span.get(), "id", None))
+    token = _span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _span.reset(token)
+        job.add(s, time.perf_counter())
+
+
+def record_span(name, start, cat="provider", **attrs):
+    """Add an already-finished span that began at perf_counter() time `start` and ends now."""
+    job = _job.get()
+    if job is None:
+        return
+    attrs.setdefault("function", telemetry.caller_function())
+    job.add(Span(name, cat, attrs, start=start, parent=getattr(_span.get(), "id", None)), time.perf_counter())
+
+
+# =============================================================================
+# JOBS
+# =============================================================================
+
+def new_job_id(name):
+    """Sortable by start time: 20261019-154909123-generate_prompts-e1d6a7."""
+    now = time.time()
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{name}-{uuid.uuid4().hex[:6]}"
+
+
+def job(fn, name=None):
+    """
+    Wrap a background job target so its spans are collected and written when it ends.
+
+    The job id and project are fixed when the wrapper is made (in the request
+    thread, where telemetry knows the project and stage); the id is on
+    the returned function as .job_id.
+    """
+    context = telemetry.current()
+    name = name or context["stage"] or fn.__name__
+    job_id = new_job_id(name)
+    project = context["project"]
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        current = Job(job_id, name, project)
+        job_token = _job.set(current)
+        root = Span(name, "job", {"project": project})
+        span_token = _span.set(root)
+        try:
+            return fn(*args, **kwargs)
+        except BaseException as e:
+            root.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            _span.reset(span_token)
+            _job.reset(job_token)
+            end = time.perf_counter()
+            current.add(root, end)
+            _write(current, current.chrome_trace(end - current.origin))
+    run.job_id = job_id
+    return run
+
+
+def _traces_dir(project):
+    if not project or _projects_dir is None or not (_projects_dir / project).is_dir():
+        return None
+    return _projects_dir / project / TRACES_DIRNAME
+
+
+def _write(job_obj, trace):
+    traces_dir = _traces_dir(job_obj.project)
+    if traces_dir is None:
+        return
+    try:
+        traces_dir.mkdir(exist_ok=True)
+        tmp = traces_dir / f".{job_obj.id}.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(trace, f, ensure_ascii=False)
+        os.replace(tmp, traces_dir / f"{job_obj.id}.json")
+        for old in sorted(traces_dir.glob("*.json"))[:-MAX_TRACES_PER_PROJECT]:
+            old.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"[Tracing] Could not write trace {job_obj.id}: {e}")
+
+
+def list_jobs(project):
+    """Summaries (otherData) of a project's stored traces, newest first."""
+    traces_dir = _traces_dir(project)
+    if traces_dir is None or not traces_dir.exists():
+        return []
+    jobs = []
+    for path in sorted(traces_dir.glob("*.json"), reverse=True):
+        try:
+            with open(path) as f:
+                jobs.append(json.load(f).get("otherData") or {"job_id": path.stem})
+        except (OSError, ValueError):
+            continue
+    return jobs
+
+
+def trace_path(project, job_id):
+    """Path of a stored trace, or None. `job_id` may be "latest"."""
+    traces_dir = _traces_dir(project)
+    if traces_dir is None or not traces_dir.exists():
+        return None
+    if job_id == "latest":
+        paths = sorted(traces_dir.glob("*.json"))
+        return paths[-1] if paths else None
+    path = traces_dir / f"{Path(job_id).name}.json"
+    return path if path.exists() else None
+
+
+# Quick test when run directly
+if __name__ == "__main__":
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import provider_loop
+    import tracing
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "demo").mkdir()
+        tracing.configure(tmp)
+
+        def worker():
+            with tracing.span("analysis"):
+                time.sleep(0.05)
+                tracing.record_span("gemini-2.5-pro", time.perf_counter() - 0.04, output_tokens=900)
+            with tracing.span("scenes") as s, ThreadPoolExecutor(3) as pool:
+                def scene(n):
+                    with tracing.span("scene", scene_num=n):
+                        time.sleep(0.02 * n)
+                list(pool.map(telemetry.propagate(scene), range(1, 5)))
+                s.set(count=4)
+            with tracing.span("location_images"):
+                async def image(n):
+                    with tracing.span("location", location_num=n):
+                        began = time.perf_counter()
+                        await asyncio.sleep(0.02 * n)
+                        tracing.record_span("gemini-2.5-flash-image", began, images=1)
+                provider_loop.run_all([image(n) for n in range(1, 5)])
+
+        with telemetry.context(project="demo", stage="demo_job"):
+            run = tracing.job(worker)
+        threading.Thread(target=telemetry.propagate(run)).start()
+        time.sleep(0.5)
+        print(json.dumps(tracing.list_jobs("demo"), indent=2))
+        with open(tracing.trace_path("demo", "latest")) as f:
+            for event in sorted(json.load(f)["traceEvents"], key=lambda e: (e.get("tid", 0), e.get("ts", 0))):
+                print(event.get("tid"), event["name"], event.get("ts"), event.get("dur"), event.get("args"))
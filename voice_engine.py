@@ -9,13 +9,30 @@ Pipeline:
 1. enhance_narration_for_tts() — Gemini adds audio tags + expressive punctuation
 2. generate_audio_segment() — ElevenLabs v3 TTS for a single segment
 3. generate_all_audio() — Full pipeline: intro → phases → breaks → close
+   (every segment is a coroutine on provider_loop; synthesis runs under
+   ELEVENLABS_MAX_CONCURRENCY)
+
+Each step has an *_async twin used by the fan-out on provider_loop.
+
+Both steps are cached per project under audio/cache/ (see AudioCache):
+unchanged segments cost neither a Gemini call nor an ElevenLabs call.
 """
 import os
 import json
-import time
+import queue
+import asyncio
+import shutil
+import hashlib
+import tempfile
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
 
+import provider_clients
+import provider_loop
+import rate_limiter
+from audio_utils import write_mp3_stream, ensure_peaks
+
 load_dotenv()
 
 # =============================================================================
@@ -25,6 +42,13 @@ load_dotenv()
 ELEVENLABS_MODEL = "eleven_v3"
 ELEVENLABS_OUTPUT_FORMAT = "mp3_44100_128"
 DEFAULT_SPEED = 0.70
+DEFAULT_STABILITY = 0.5
+
+# Concurrent ElevenLabs requests allowed by the plan (Creator: 5, Pro: 10).
+# Enforced process-wide by rate_limiter's "elevenlabs" key (an "elevenlabs"
+# entry in config/rate_limits.json takes precedence).
+ELEVENLABS_MAX_CONCURRENCY = int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", "3"))
+
 
 # Gemini model for enhancing narration with audio tags
 GEMINI_MODEL_FLASH = "gemini-2.5-flash"
@@ -115,6 +139,40 @@ TYPE_INSTRUCTIONS = {
 }
 
 
+def _enhance_request(text, segment_type, tension_level):
+    """Prompt + config for the Gemini Flash audio-tag pass."""
+    from google.genai import types
+    
+    type_instructions = TYPE_INSTRUCTIONS.get(segment_type, TYPE_INSTRUCTIONS["narration"])
+    
+    prompt = ENHANCE_PROMPT.format(
+        segment_type=segment_type.upper(),
+        tension=tension_level,
+        type_specific_instructions=type_instructions,
+        text=text,
+    )
+    config = types.GenerateContentConfig(
+        temperature=0.4,
+        max_output_tokens=4000,
+    )
+    return [prompt], config
+
+
+def _clean_enhanced(enhanced):
+    enhanced = enhanced.strip()
+    
+    # Clean up any markdown wrapping that Gemini might add
+    if enhanced.startswith("```"):
+        lines = enhanced.split("\n")
+        enhanced = "\n".join(lines[1:-1] if lines[-1].strip() == "```" else lines[1:])
+    
+    # Strip quotes if wrapped
+    if enhanced.startswith('"') and enhanced.endswith('"'):
+        enhanced = enhanced[1:-1]
+    
+    return enhanced
+
+
 def enhance_narration_for_tts(text, segment_type="narration", tension_level=50):
     """
     Use Gemini Flash to inject ElevenLabs v3 audio tags into narration text.
@@ -127,41 +185,22 @@ def enhance_narration_for_tts(text, segment_type="narration", tension_level=50):
     Returns:
         Enhanced text with audio tags and expressive punctuation
     """
-    from google import genai
-    from google.genai import types
-    
-    client = genai.Client()
-    
-    type_instructions = TYPE_INSTRUCTIONS.get(segment_type, TYPE_INSTRUCTIONS["narration"])
-    
-    prompt = ENHANCE_PROMPT.format(
-        segment_type=segment_type.upper(),
-        tension=tension_level,
-        type_specific_instructions=type_instructions,
-        text=text,
-    )
+    contents, config = _enhance_request(text, segment_type, tension_level)
+    try:
+        response = provider_clients.gemini_generate(model=GEMINI_MODEL_FLASH, contents=contents, config=config)
+        return _clean_enhanced(response.text)
     
+    except Exception as e:
+        print(f"[Voice Engine] Enhancement failed, using original text: {e}")
+        return text
+
+
+async def enhance_narration_async(text, segment_type="narration", tension_level=50):
+    """enhance_narration_for_tts() as a coroutine for provider_loop."""
+    contents, config = _enhance_request(text, segment_type, tension_level)
     try:
-        response = client.models.generate_content(
-            model=GEMINI_MODEL_FLASH,
-            contents=[prompt],
-            config=types.GenerateContentConfig(
-                temperature=0.4,
-                max_output_tokens=4000,
-            ),
-        )
-        enhanced = response.text.strip()
-        
-        # Clean up any markdown wrapping that Gemini might add
-        if enhanced.startswith("```"):
-            lines = enhanced.split("\n")
-            enhanced = "\n".join(lines[1:-1] if lines[-1].strip() == "```" else lines[1:])
-        
-        # Strip quotes if wrapped
-        if enhanced.startswith('"') and enhanced.endswith('"'):
-            enhanced = enhanced[1:-1]
-        
-        return enhanced
+        response = await provider_clients.gemini_generate_async(model=GEMINI_MODEL_FLASH, contents=contents, config=config)
+        return _clean_enhanced(response.text)
     
     except Exception as e:
         print(f"[Voice Engine] Enhancement failed, using original text: {e}")
@@ -172,37 +211,15 @@ def enhance_narration_for_tts(text, segment_type="narration", tension_level=50):
 # GENERATE AUDIO — ElevenLabs v3 TTS
 # =============================================================================
 
-def generate_audio_segment(text, voice_id, output_path, previous_request_ids=None, speed=None):
-    """
-    Generate a single audio segment using ElevenLabs v3.
-    
-    Args:
-        text: Text to convert (should be pre-enhanced with audio tags)
-        voice_id: ElevenLabs voice ID
-        output_path: Where to save the MP3 file
-        previous_request_ids: List of previous request IDs for continuity stitching
-        speed: Speech speed (0.7-1.2, default 1.0)
-    
-    Returns:
-        Dict with path, duration_seconds, file_size
-    """
-    from elevenlabs.client import ElevenLabs
+def _tts_kwargs(text, voice_id, previous_request_ids=None, speed=None, model=None, stability=None):
+    """text_to_speech.convert() arguments for one segment."""
     from elevenlabs.types import VoiceSettings
     
-    api_key = os.getenv("ELEVENLABS_API_KEY")
-    if not api_key:
-        raise ValueError("ELEVENLABS_API_KEY not set in environment")
-    
-    client = ElevenLabs(api_key=api_key)
-    
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
     # Voice settings — tuned via A/B testing
     # v3 stability: 0.0 (Creative), 0.5 (Natural), 1.0 (Robust)
     # Natural = best balance of expressiveness + clarity for narration
     voice_settings = VoiceSettings(
-        stability=0.5,
+        stability=DEFAULT_STABILITY if stability is None else stability,
         speed=speed or DEFAULT_SPEED,
     )
     
@@ -210,7 +227,7 @@ def generate_audio_segment(text, voice_id, output_path, previous_request_ids=Non
     kwargs = {
         "text": text,
         "voice_id": voice_id,
-        "model_id": ELEVENLABS_MODEL,
+        "model_id": model or ELEVENLABS_MODEL,
         "output_format": ELEVENLABS_OUTPUT_FORMAT,
         "voice_settings": voice_settings,
     }
@@ -218,78 +235,383 @@ def generate_audio_segment(text, voice_id, output_path, previous_request_ids=Non
     if previous_request_ids:
         kwargs["previous_request_ids"] = previous_request_ids[-3:]  # Max 3
     
-    # Generate audio (returns iterator of bytes)
-    audio_iterator = client.text_to_speech.convert(**kwargs)
+    return kwargs
+
+
+def generate_audio_segment(text, voice_id, output_path, previous_request_ids=None, speed=None,
+                           model=None, stability=None):
+    """
+    Generate a single audio segment using ElevenLabs v3.
     
-    # Collect all chunks and write to file
-    audio_bytes = b""
-    for chunk in audio_iterator:
-        audio_bytes += chunk
+    Args:
+        text: Text to convert (should be pre-enhanced with audio tags)
+        voice_id: ElevenLabs voice ID
+        output_path: Where to save the MP3 file
+        previous_request_ids: List of previous request IDs for continuity stitching
+        speed: Speech speed (0.7-1.2, default 1.0)
+        model: ElevenLabs model ID (default ELEVENLABS_MODEL)
+        stability: Voice stability 0.0-1.0 (default DEFAULT_STABILITY)
     
-    with open(output_path, "wb") as f:
-        f.write(audio_bytes)
+    Returns:
+        Dict with path, duration_seconds (exact, from the MP3 frames), file_size,
+        request_id, silences (pauses with byte offsets), peaks (.peaks waveform file info)
+    """
+    client = provider_clients.elevenlabs()
+    kwargs = _tts_kwargs(text, voice_id, previous_request_ids, speed, model, stability)
+    
+    # Generate audio (returns iterator of bytes) — the "elevenlabs" rate limiter
+    # caps in-flight requests and retries 429s / dropped streams
+    def synthesize():
+        raw_client = getattr(client.text_to_speech, "with_raw_response", None)
+        if raw_client is not None:
+            # Raw response exposes the request-id header needed for continuity stitching
+            with raw_client.convert(**kwargs) as response:
+                return response.headers.get("request-id"), write_mp3_stream(response.data, output_path)
+        return None, write_mp3_stream(client.text_to_speech.convert(**kwargs), output_path)
+    
+    request_id, scan = rate_limiter.call(
+        "elevenlabs", synthesize, defaults={"concurrency": ELEVENLABS_MAX_CONCURRENCY},
+        meter=lambda _: {"characters": len(text)},
+    )
     
-    # Estimate duration from file size (MP3 128kbps ≈ 16KB/s)
-    file_size = os.path.getsize(output_path)
-    duration_seconds = round(file_size / 16000, 1)
+    # Chunks were streamed to disk and the frame headers counted on the way
+    return _segment_result(output_path, request_id, scan, ensure_peaks(output_path))
+
+
+async def generate_audio_segment_async(text, voice_id, output_path, previous_request_ids=None, speed=None,
+                                       model=None, stability=None):
+    """
+    generate_audio_segment() as a coroutine for provider_loop (AsyncElevenLabs).
     
+    Chunks are handed to a writer thread as they arrive, so the MP3 is
+    streamed to disk (and its frames scanned) with flat memory; the peaks
+    file is built in a worker thread once the file is in place.
+    """
+    client = provider_clients.elevenlabs_async()
+    kwargs = _tts_kwargs(text, voice_id, previous_request_ids, speed, model, stability)
+    
+    async def synthesize():
+        chunks = queue.Queue()
+        writer = asyncio.ensure_future(asyncio.to_thread(write_mp3_stream, _drain(chunks), output_path))
+        try:
+            async with client.text_to_speech.with_raw_response.convert(**kwargs) as response:
+                async for chunk in response.data:
+                    chunks.put(chunk)
+                request_id = response.headers.get("request-id")
+        except BaseException:
+            # The writer drops its .part file; wait so a retry never races it
+            chunks.put(_STREAM_ABORTED)
+            await asyncio.wait({writer})
+            raise
+        chunks.put(None)
+        return request_id, await writer
+    
+    request_id, scan = await rate_limiter.call_async(
+        "elevenlabs", synthesize, defaults={"concurrency": ELEVENLABS_MAX_CONCURRENCY},
+        meter=lambda _: {"characters": len(text)},
+    )
+    
+    return _segment_result(output_path, request_id, scan, await asyncio.to_thread(ensure_peaks, output_path))
+
+
+_STREAM_ABORTED = object()
+
+
+def _drain(chunks):
+    """Chunks from a queue.Queue until None; raises if the stream was aborted."""
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        if chunk is _STREAM_ABORTED:
+            raise ConnectionError("audio stream aborted")
+        yield chunk
+
+
+def _segment_result(output_path, request_id, scan, peaks):
     return {
         "path": output_path,
-        "duration_seconds": duration_seconds,
-        "file_size": file_size,
+        "duration_seconds": scan["duration_seconds"],
+        "file_size": scan["file_size"],
+        "request_id": request_id,
+        "silences": scan["silences"],
+        "sha256": scan["sha256"],
+        "peaks": peaks,
     }
 
 
+# =============================================================================
+# AUDIO CACHE — enhanced text + content-addressed MP3 blobs
+# =============================================================================
+
+def _cache_key(*parts):
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Two-level per-project cache under audio/cache/:
+    
+        enhanced.json   (text, segment_type, tension, enhance model) -> enhanced text
+        synth.json      (enhanced text, voice, model, speed, stability, continuity ids)
+                        -> {sha256, duration_seconds, silences, request_id, file_size}
+        blobs/<sha256>.mp3   MP3 bytes, stored once per distinct content
+    
+    Thread-safe within the process (index files are updated under one lock per cache dir).
+    """
+    
+    _locks = {}
+    _locks_guard = threading.Lock()
+    
+    def __init__(self, audio_dir):
+        self.dir = os.path.join(audio_dir, "cache")
+        self.blob_dir = os.path.join(self.dir, "blobs")
+        with AudioCache._locks_guard:
+            self._lock = AudioCache._locks.setdefault(os.path.abspath(self.dir), threading.Lock())
+    
+    def _load(self, name):
+        path = os.path.join(self.dir, name)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+    
+    def _store(self, name, key, value):
+        with self._lock:
+            os.makedirs(self.dir, exist_ok=True)
+            index = self._load(name)
+            index[key] = value
+            path = os.path.join(self.dir, name)
+            with open(path + ".tmp", "w") as f:
+                json.dump(index, f, indent=2, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+    
+    # --- Level 1: enhancement ---
+    
+    def enhanced_text(self, text, segment_type, tension):
+        return self._load("enhanced.json").get(_cache_key(text, segment_type, round(tension, 1), GEMINI_MODEL_FLASH))
+    
+    def put_enhanced_text(self, text, segment_type, tension, enhanced):
+        self._store("enhanced.json", _cache_key(text, segment_type, round(tension, 1), GEMINI_MODEL_FLASH), enhanced)
+    
+    # --- Level 2: synthesis ---
+    
+    @staticmethod
+    def synth_key(enhanced, voice_id, model, speed, stability, previous_request_ids=None):
+        return _cache_key(enhanced, voice_id, model or ELEVENLABS_MODEL,
+                          round(float(speed or DEFAULT_SPEED), 3),
+                          round(float(DEFAULT_STABILITY if stability is None else stability), 3),
+                          ELEVENLABS_OUTPUT_FORMAT, list(previous_request_ids or [])[-3:])
+    
+    def restore(self, key, output_path):
+        """Copy the cached MP3 for key to output_path. Returns the cached entry or None."""
+        entry = self._load("synth.json").get(key)
+        if not entry:
+            return None
+        blob = os.path.join(self.blob_dir, f"{entry['sha256']}.mp3")
+        if not os.path.exists(blob):
+            return None
+        directory = os.path.dirname(output_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".mp3.part")
+        os.close(fd)
+        shutil.copyfile(blob, tmp_path)
+        os.replace(tmp_path, output_path)
+        return dict(entry, path=output_path)
+    
+    def put(self, key, output_path, result):
+        """Store a freshly synthesized segment (blob + index entry)."""
+        os.makedirs(self.blob_dir, exist_ok=True)
+        blob = os.path.join(self.blob_dir, f"{result['sha256']}.mp3")
+        if not os.path.exists(blob):
+            shutil.copyfile(output_path, blob + ".tmp")
+            os.replace(blob + ".tmp", blob)
+        self._store("synth.json", key, {
+            "sha256": result["sha256"],
+            "duration_seconds": result["duration_seconds"],
+            "file_size": result["file_size"],
+            "silences": result.get("silences", []),
+            "request_id": result.get("request_id"),
+        })
+
+
+def enhance_narration_cached(text, segment_type, tension_level, audio_dir, force=False):
+    """
+    enhance_narration_for_tts() behind the project's AudioCache.
+    
+    Returns:
+        (enhanced_text, cache_hit)
+    """
+    cache = AudioCache(audio_dir)
+    if not force:
+        cached = cache.enhanced_text(text, segment_type, tension_level)
+        if cached:
+            return cached, True
+    enhanced = enhance_narration_for_tts(text, segment_type, tension_level)
+    # The original text comes back when enhancement fails — don't pin that
+    if enhanced != text:
+        cache.put_enhanced_text(text, segment_type, tension_level, enhanced)
+    return enhanced, False
+
+
+def generate_audio_segment_cached(text, voice_id, output_path, audio_dir, previous_request_ids=None,
+                                  speed=None, model=None, stability=None, force=False):
+    """
+    generate_audio_segment() behind the project's AudioCache.
+    
+    Returns:
+        Same dict as generate_audio_segment() plus "cached": bool
+    """
+    cache = AudioCache(audio_dir)
+    key = cache.synth_key(text, voice_id, model, speed, stability, previous_request_ids)
+    if not force:
+        entry = cache.restore(key, output_path)
+        if entry:
+            return dict(entry, cached=True, peaks=ensure_peaks(output_path))
+    result = generate_audio_segment(
+        text, voice_id, output_path,
+        previous_request_ids=previous_request_ids, speed=speed, model=model, stability=stability,
+    )
+    cache.put(key, output_path, result)
+    return dict(result, cached=False)
+
+
+async def enhance_narration_cached_async(text, segment_type, tension_level, audio_dir, force=False):
+    """enhance_narration_cached() as a coroutine (cache reads and writes run in a worker thread)."""
+    cache = AudioCache(audio_dir)
+    if not force:
+        cached = await asyncio.to_thread(cache.enhanced_text, text, segment_type, tension_level)
+        if cached:
+            return cached, True
+    enhanced = await enhance_narration_async(text, segment_type, tension_level)
+    if enhanced != text:
+        await asyncio.to_thread(cache.put_enhanced_text, text, segment_type, tension_level, enhanced)
+    return enhanced, False
+
+
+async def generate_audio_segment_cached_async(text, voice_id, output_path, audio_dir, previous_request_ids=None,
+                                              speed=None, model=None, stability=None, force=False):
+    """generate_audio_segment_cached() as a coroutine (cache reads and writes run in a worker thread)."""
+    cache = AudioCache(audio_dir)
+    key = cache.synth_key(text, voice_id, model, speed, stability, previous_request_ids)
+    if not force:
+        entry = await asyncio.to_thread(cache.restore, key, output_path)
+        if entry:
+            return dict(entry, cached=True, peaks=await asyncio.to_thread(ensure_peaks, output_path))
+    result = await generate_audio_segment_async(
+        text, voice_id, output_path,
+        previous_request_ids=previous_request_ids, speed=speed, model=model, stability=stability,
+    )
+    await asyncio.to_thread(cache.put, key, output_path, result)
+    return dict(result, cached=False)
+
+
 # =============================================================================
 # FULL PIPELINE — Generate all audio from narration
 # =============================================================================
 
-def generate_all_audio(narration, project_dir, voice_id, progress_callback=None):
+def generate_all_audio(narration, project_dir, voice_id, progress_callback=None, continuity=None,
+                       speed=None, model=None, stability=None, force=False):
     """
     Generate all audio segments from complete narration data.
     
-    Processes in order: intro → (phase + break pairs) → close.
-    Uses previous_request_ids for continuity between consecutive segments.
+    Segments are laid out in order: intro → (phase + break pairs) → close.
+    Every segment is enhanced concurrently and handed to ElevenLabs as soon as
+    its enhancement is done; synthesis is capped at ELEVENLABS_MAX_CONCURRENCY.
     
     Args:
         narration: Complete narration dict (from generate_narration())
         project_dir: Project directory path
         voice_id: ElevenLabs voice ID
         progress_callback: Optional callback(message, type)
+        continuity: Optional set of segment types (e.g. {"narration"}) to stitch with
+                    previous_request_ids. Only those segments wait on their predecessor
+                    of the same type; everything else synthesizes in parallel.
+        speed, model, stability: ElevenLabs settings (defaults as generate_audio_segment)
+        force: Bypass the audio cache and regenerate every segment
     
     Returns:
         Dict with segments list and audio_manifest
     """
     audio_dir = os.path.join(project_dir, "audio")
     os.makedirs(audio_dir, exist_ok=True)
+    continuity = set(continuity or ())
     
-    segments = []
-    total_segments = 1 + len(narration.get("phases", [])) + len(narration.get("breaks", [])) + 1
-    current = 0
+    # === LAY OUT SEGMENTS (manifest order) ===
+    jobs = []
+    
+    intro = narration.get("intro", {})
+    if intro.get("text"):
+        jobs.append((intro["text"], "intro", "intro.mp3", 40))
     
-    def gen_segment(text, segment_type, filename, tension=50):
-        nonlocal current
-        current += 1
+    phases = narration.get("phases", [])
+    breaks = narration.get("breaks", [])
+    
+    for i, phase in enumerate(phases):
+        phase_text = phase.get("narration", "")
+        if not phase_text or phase_text.startswith("[Narration for"):
+            continue
         
-        if progress_callback:
-            progress_callback(
-                f"🔊 [{current}/{total_segments}] Generating {segment_type}: {filename}...",
-                "batch"
-            )
+        # Estimate tension from position in story
+        tension = min(95, 20 + (i / max(1, len(phases) - 1)) * 70)
+        jobs.append((phase_text, "narration", f"phase_{i+1}.mp3", tension))
+        
+        # Insert break after this phase if one exists
+        if i < len(breaks):
+            break_text = breaks[i].get("text", "")
+            if break_text:
+                jobs.append((break_text, "break", f"break_{i+1}.mp3", 85))
+    
+    close = narration.get("close", {})
+    if close.get("text"):
+        close_text = close["text"]
+        # Append teaser if exists
+        teaser = close.get("teaser", "")
+        if teaser:
+            close_text += f" {teaser}"
+        jobs.append((close_text, "close", "close.mp3", 25))
+    
+    total_segments = len(jobs)
+    
+    # Continuity chains: each stitched segment depends on the previous one of its type
+    depends_on = {}
+    last_of_type = {}
+    for index, (_, segment_type, _, _) in enumerate(jobs):
+        if segment_type in continuity:
+            if segment_type in last_of_type:
+                depends_on[index] = last_of_type[segment_type]
+            last_of_type[segment_type] = index
+    
+    done_count = 0
+    tasks = {}
+    
+    async def gen_segment(index, text, segment_type, filename, tension):
+        nonlocal done_count
         
-        # Step 1: Enhance text with audio tags
-        enhanced_text = enhance_narration_for_tts(text, segment_type, tension)
+        # Step 1: Enhance text with audio tags (cached per source text)
+        enhanced_text, enhance_hit = await enhance_narration_cached_async(text, segment_type, tension, audio_dir, force=force)
         
-        if progress_callback:
+        if progress_callback and not enhance_hit:
             # Show a preview of the enhancement
             tag_count = enhanced_text.count("[")
-            progress_callback(f"  ✨ Enhanced: {tag_count} audio tags added", "info")
+            progress_callback(f"  ✨ {filename} enhanced: {tag_count} audio tags added", "info")
         
-        # Step 2: Generate audio
-        output_path = os.path.join(audio_dir, filename)
+        # Step 2: Wait for the continuity predecessor (earlier job, already running)
+        previous_ids = None
+        if index in depends_on:
+            predecessor = await tasks[depends_on[index]]
+            if predecessor.get("request_id"):
+                previous_ids = [predecessor["request_id"]]
         
-        result = generate_audio_segment(
-            enhanced_text, voice_id, output_path,
+        # Step 3: Generate audio (cached per enhanced text + voice settings)
+        output_path = os.path.join(audio_dir, filename)
+        result = await generate_audio_segment_cached_async(
+            enhanced_text, voice_id, output_path, audio_dir,
+            previous_request_ids=previous_ids,
+            speed=speed, model=model, stability=stability, force=force,
         )
         
         segment_data = {
@@ -299,61 +621,47 @@ def generate_all_audio(narration, project_dir, voice_id, progress_callback=None)
             "enhanced_text": enhanced_text,
             "duration_seconds": result["duration_seconds"],
             "file_size": result["file_size"],
+            "request_id": result.get("request_id"),
+            "silences": result.get("silences", []),
+            "peaks": result.get("peaks"),
+            "cached": result.get("cached", False),
         }
-        segments.append(segment_data)
         
+        done_count += 1
         if progress_callback:
+            source = " ♻️ cached" if result.get("cached") else ""
             progress_callback(
-                f"  ✅ {filename}: {result['duration_seconds']}s ({result['file_size'] // 1024}KB)",
+                f"  ✅ [{done_count}/{total_segments}] {filename}: {result['duration_seconds']}s ({result['file_size'] // 1024}KB){source}",
                 "success"
             )
         
-        # Rate limiting — be respectful to API
-        time.sleep(0.5)
-        
         return segment_data
     
-    # === INTRO ===
-    intro = narration.get("intro", {})
-    if intro.get("text"):
-        gen_segment(intro["text"], "intro", "intro.mp3", tension=40)
-    
-    # === PHASES + BREAKS (interleaved) ===
-    phases = narration.get("phases", [])
-    breaks = narration.get("breaks", [])
+    if progress_callback:
+        progress_callback(
+            f"🔊 Generating {total_segments} segments "
+            f"({ELEVENLABS_MAX_CONCURRENCY} concurrent ElevenLabs requests)...",
+            "batch"
+        )
     
-    for i, phase in enumerate(phases):
-        phase_text = phase.get("narration", "")
-        if not phase_text or phase_text.startswith("[Narration for"):
-            continue
-        
-        phase_name = phase.get("phase_name", f"phase_{i+1}")
-        # Estimate tension from position in story
-        tension = min(95, 20 + (i / max(1, len(phases) - 1)) * 70)
-        
-        gen_segment(phase_text, "narration", f"phase_{i+1}.mp3", tension=tension)
-        
-        # Insert break after this phase if one exists
-        if i < len(breaks):
-            break_text = breaks[i].get("text", "")
-            if break_text:
-                gen_segment(break_text, "break", f"break_{i+1}.mp3", tension=85)
+    # Every segment is a task on the provider loop; continuity segments await their predecessor's task
+    async def gen_all():
+        for index, job in enumerate(jobs):
+            tasks[index] = asyncio.ensure_future(gen_segment(index, *job))
+        try:
+            return await asyncio.gather(*tasks.values())
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            raise
     
-    # === CLOSE ===
-    close = narration.get("close", {})
-    if close.get("text"):
-        close_text = close["text"]
-        # Append teaser if exists
-        teaser = close.get("teaser", "")
-        if teaser:
-            close_text += f" {teaser}"
-        gen_segment(close_text, "close", "close.mp3", tension=25)
+    segments = provider_loop.run(gen_all())
     
     # === SAVE MANIFEST ===
     total_duration = sum(s["duration_seconds"] for s in segments)
     manifest = {
         "voice_id": voice_id,
-        "model": ELEVENLABS_MODEL,
+        "model": model or ELEVENLABS_MODEL,
         "total_segments": len(segments),
         "total_duration_seconds": round(total_duration, 2),
         "total_duration_formatted": f"{int(total_duration // 60)}m {int(total_duration % 60)}s",
@@ -0,0 +1,233 @@
+"""
+The Last Shelter — fal.ai Completion Webhooks
+
+fal's queue API can POST the result to a URL when a request finishes
+(`?fal_webhook=<url>` on submit). This module is the bridge between that
+callback (received by app.py at /api/fal/webhook) and whatever is waiting
+on the request ID — the render orchestrator or fal_client.wait_for_completion.
+
+Enable by setting FAL_WEBHOOK_URL to the public URL of /api/fal/webhook.
+Without it every caller polls as before.
+
+Signatures:
+- Real fal callbacks are ED25519-signed (X-Fal-Webhook-* headers, keys from
+  fal's JWKS). Verification needs the `cryptography` package; without it
+  webhooks stay off (with a startup warning) and every caller polls.
+- A local stand-in signs with HMAC-SHA256 using FAL_WEBHOOK_SECRET:
+      python webhooks.py simulate <request_id> <video_url>
+"""
+import os
+import json
+import time
+import hmac
+import base64
+import hashlib
+import threading
+
+import provider_clients
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    from cryptography.exceptions import InvalidSignature
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+FAL_WEBHOOK_URL = os.environ.get("FAL_WEBHOOK_URL", "")
+FAL_WEBHOOK_SECRET = os.environ.get("FAL_WEBHOOK_SECRET", "")
+FAL_JWKS_URL = "https://rest.alpha.fal.ai/.well-known/jwks.json"
+JWKS_CACHE_SECONDS = 24 * 3600
+
+# Reject callbacks whose timestamp is further than this from now (replay protection)
+SIGNATURE_MAX_SKEW = 300
+# With webhooks on, only start polling a request this long after submission
+WEBHOOK_POLL_FALLBACK = 900
+# Callbacks that arrive before anyone registered the request ID are kept this long
+EARLY_DELIVERY_TTL = 3600
+
+_lock = threading.Lock()
+_activity = threading.Condition(_lock)   # notified on every delivery
+_results = {}                            # request_id -> {"status", "payload", "error", "received_at"}
+_jwks = {"keys": [], "fetched_at": 0}
+
+if FAL_WEBHOOK_URL and not CRYPTOGRAPHY_AVAILABLE:
+    # Every real callback would fail verification and renders would sit out WEBHOOK_POLL_FALLBACK
+    print("[Webhooks] ⚠️ FAL_WEBHOOK_URL is set but 'cryptography' is not installed — "
+          "fal signatures can't be verified, webhooks disabled (polling instead)")
+
+
+def enabled():
+    """True when fal is told to call us back (and its signed callbacks can be verified)."""
+    return bool(FAL_WEBHOOK_URL) and CRYPTOGRAPHY_AVAILABLE
+
+
+def webhook_url():
+    return FAL_WEBHOOK_URL if enabled() else None
+
+
+# =============================================================================
+# SIGNATURE VERIFICATION
+# =============================================================================
+
+def _fal_public_keys():
+    """Raw ED25519 public keys from fal's JWKS (cached)."""
+    if time.time() - _jwks["fetched_at"] > JWKS_CACHE_SECONDS or not _jwks["keys"]:
+        response = provider_clients.http().get(FAL_JWKS_URL, timeout=10)
+        response.raise_for_status()
+        keys = []
+        for key in response.json().get("keys", []):
+            x = key.get("x", "")
+            keys.append(base64.urlsafe_b64decode(x + "=" * (-len(x) % 4)))
+        _jwks.update(keys=keys, fetched_at=time.time())
+    return _jwks["keys"]
+
+
+def _verify_ed25519(headers, body):
+    if not CRYPTOGRAPHY_AVAILABLE:
+        print("[Webhooks] 'cryptography' not installed — cannot verify fal signatures")
+        return False
+
+    message = "\n".join([
+        headers.get("X-Fal-Webhook-Request-Id", ""),
+        headers.get("X-Fal-Webhook-User-Id", ""),
+        headers.get("X-Fal-Webhook-Timestamp", ""),
+        hashlib.sha256(body).hexdigest(),
+    ]).encode("utf-8")
+    try:
+        signature = bytes.fromhex(headers.get("X-Fal-Webhook-Signature", ""))
+    except ValueError:
+        return False
+
+    for raw_key in _fal_public_keys():
+        try:
+            Ed25519PublicKey.from_public_bytes(raw_key).verify(signature, message)
+            return True
+        except InvalidSignature:
+            continue
+    return False
+
+
+def hmac_signature(timestamp, body, secret=None):
+    """Stand-in signature: hex HMAC-SHA256 of '<timestamp>.<body>'."""
+    secret = (secret or FAL_WEBHOOK_SECRET).encode("utf-8")
+    return hmac.new(secret, f"{timestamp}.".encode("utf-8") + body, hashlib.sha256).hexdigest()
+
+
+def verify_request(headers, body):
+    """
+    Check a callback's signature and timestamp.
+
+    Args:
+        headers: Request headers (case-insensitive mapping, e.g. flask request.headers)
+        body: Raw request body bytes
+
+    Returns:
+        True if the callback is authentic and fresh
+    """
+    timestamp = headers.get("X-Fal-Webhook-Timestamp", "")
+    try:
+        if abs(time.time() - int(timestamp)) > SIGNATURE_MAX_SKEW:
+            return False
+    except ValueError:
+        return False
+
+    local_signature = headers.get("X-Webhook-Signature", "")
+    if local_signature:
+        if not FAL_WEBHOOK_SECRET:
+            return False
+        expected = "sha256=" + hmac_signature(timestamp, body)
+        return hmac.compare_digest(local_signature, expected)
+
+    try:
+        return _verify_ed25519(headers, body)
+    except Exception as e:
+        print(f"[Webhooks] Signature check failed: {e}")
+        return False
+
+
+# =============================================================================
+# DELIVERY REGISTRY
+# =============================================================================
+
+def deliver(payload):
+    """
+    Record a verified callback and wake everyone waiting.
+
+    fal payload: {"request_id", "status": "OK" | "ERROR", "payload": {...result}, "error"}
+    """
+    request_id = payload.get("request_id") or payload.get("gateway_request_id")
+    if not request_id:
+        return None
+    with _activity:
+        now = time.time()
+        for stale in [k for k, v in _results.items() if now - v["received_at"] > EARLY_DELIVERY_TTL]:
+            del _results[stale]
+        _results[request_id] = {
+            "status": "COMPLETED" if payload.get("status") == "OK" else "FAILED",
+            "payload": payload.get("payload") or {},
+            "error": payload.get("error") or payload.get("payload_error"),
+            "received_at": now,
+        }
+        _activity.notify_all()
+    print(f"[Webhooks] {request_id}: {_results[request_id]['status']}")
+    return request_id
+
+
+def result(request_id, consume=True):
+    """The delivered result for a request ID, or None if no callback arrived yet."""
+    with _lock:
+        return _results.pop(request_id, None) if consume else _results.get(request_id)
+
+
+def wait_any(timeout):
+    """Block until any callback arrives or timeout passes."""
+    with _activity:
+        _activity.wait(timeout)
+
+
+def wait_for(request_id, timeout):
+    """Block until the callback for request_id arrives. Returns the result or None on timeout."""
+    deadline = time.time() + timeout
+    with _activity:
+        while request_id not in _results:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            _activity.wait(remaining)
+        return _results.pop(request_id)
+
+
+# =============================================================================
+# LOCAL STAND-IN
+# =============================================================================
+
+def simulate(request_id, video_url, url="http://localhost:5000/api/fal/webhook", status="OK", file_size=0):
+    """POST an HMAC-signed, fal-shaped completion callback to a running app."""
+    body = json.dumps({
+        "request_id": request_id,
+        "gateway_request_id": request_id,
+        "status": status,
+        "payload": {"video": {"url": video_url, "file_size": file_size}} if status == "OK" else None,
+        "error": None if status == "OK" else "Simulated failure",
+    }).encode("utf-8")
+    timestamp = str(int(time.time()))
+    response = provider_clients.http().post(url, data=body, headers={
+        "Content-Type": "application/json",
+        "X-Fal-Webhook-Request-Id": request_id,
+        "X-Fal-Webhook-Timestamp": timestamp,
+        "X-Webhook-Signature": "sha256=" + hmac_signature(timestamp, body),
+    })
+    return response.status_code, response.text
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 4 and sys.argv[1] == "simulate":
+        target = sys.argv[4] if len(sys.argv) > 4 else "http://localhost:5000/api/fal/webhook"
+        print(simulate(sys.argv[2], sys.argv[3], url=target))
+    else:
+        print("Usage: FAL_WEBHOOK_SECRET=... python webhooks.py simulate <request_id> <video_url> [webhook_url]")